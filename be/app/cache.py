@@ -1,32 +1,805 @@
 import json
 import logging
-from typing import Any, Optional
+import os
+import secrets
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
 
-from .rq_conn import redis_conn
+from .rq_conn import get_async_redis, redis_conn
 
 logger = logging.getLogger(__name__)
 
+# ==========================================================
+# Codec: serialize + nén giá trị lưu Redis
+# ==========================================================
+# Giá trị lưu = header 3 byte (_FRAME_V1, codec id, compression id) + body. Header
+# ghi theo từng giá trị nên đổi CACHE_CODEC / CACHE_COMPRESSION không làm hỏng
+# entry cũ: đọc luôn theo header, không theo cấu hình hiện tại. Entry JSON thô
+# trước khi có header vẫn đọc được (JSON không bao giờ bắt đầu bằng byte 0xC1).
+#   - CACHE_CODEC: orjson (mặc định, fallback json nếu chưa cài) | msgpack | json
+#   - CACHE_COMPRESSION: zstd (mặc định) | lz4 | none – chỉ nén body ≥ CACHE_COMPRESS_MIN_BYTES
+# Decimal → float (giống FastAPI trả response), datetime/date → ISO string.
+CODEC = os.getenv("CACHE_CODEC", "orjson").lower()
+COMPRESSION = os.getenv("CACHE_COMPRESSION", "zstd").lower()
+COMPRESS_MIN_BYTES = int(os.getenv("CACHE_COMPRESS_MIN_BYTES", "4096"))
+_FRAME_V1 = 0xC1
+_CODEC_JSON = 1  # orjson và json ghi cùng định dạng → chung id
+_CODEC_MSGPACK = 2
+_COMPRESS_NONE = 0
+_COMPRESS_ZSTD = 1
+_COMPRESS_LZ4 = 2
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    return str(obj)
+
+
+class _Codec:
+    def __init__(self, codec_id: int, dumps: Callable[[Any], bytes], loads: Callable[[bytes], Any]) -> None:
+        self.id = codec_id
+        self.dumps = dumps
+        self.loads = loads
+
+
+def _json_codec() -> _Codec:
+    try:
+        import orjson
+
+        opts = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        return _Codec(_CODEC_JSON, lambda v: orjson.dumps(v, default=_default, option=opts), orjson.loads)
+    except ImportError:
+        return _Codec(
+            _CODEC_JSON,
+            lambda v: json.dumps(v, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+            json.loads,
+        )
+
+
+def _msgpack_codec() -> _Codec:
+    import msgpack
+
+    return _Codec(
+        _CODEC_MSGPACK,
+        lambda v: msgpack.packb(v, default=_default, use_bin_type=True),
+        lambda b: msgpack.unpackb(b, raw=False, strict_map_key=False),
+    )
+
+
+class _Compressor:
+    def __init__(self, compression_id: int, compress: Callable[[bytes], bytes], decompress: Callable[[bytes], bytes]) -> None:
+        self.id = compression_id
+        self.compress = compress
+        self.decompress = decompress
+
+
+def _zstd() -> _Compressor:
+    import zstandard
+
+    # ZstdCompressor không thread-safe → mỗi lần gọi tạo mới (rẻ so với payload ≥ 4KB)
+    return _Compressor(
+        _COMPRESS_ZSTD,
+        lambda b: zstandard.ZstdCompressor(level=3).compress(b),
+        lambda b: zstandard.ZstdDecompressor().decompress(b),
+    )
+
+
+def _lz4() -> _Compressor:
+    import lz4.frame
+
+    return _Compressor(_COMPRESS_LZ4, lz4.frame.compress, lz4.frame.decompress)
+
+
+_CODEC_FACTORIES: Dict[int, Callable[[], _Codec]] = {_CODEC_JSON: _json_codec, _CODEC_MSGPACK: _msgpack_codec}
+_COMPRESSOR_FACTORIES: Dict[int, Callable[[], _Compressor]] = {_COMPRESS_ZSTD: _zstd, _COMPRESS_LZ4: _lz4}
+_CODEC_NAMES = {"orjson": _CODEC_JSON, "json": _CODEC_JSON, "msgpack": _CODEC_MSGPACK}
+_COMPRESSION_NAMES = {"zstd": _COMPRESS_ZSTD, "lz4": _COMPRESS_LZ4, "none": _COMPRESS_NONE}
+_CODECS: Dict[int, _Codec] = {}
+_COMPRESSORS: Dict[int, _Compressor] = {}
+
+
+def _codec(codec_id: int) -> _Codec:
+    codec = _CODECS.get(codec_id)
+    if codec is None:
+        codec = _CODECS[codec_id] = _CODEC_FACTORIES[codec_id]()
+    return codec
+
+
+def _compressor(compression_id: int) -> _Compressor:
+    compressor = _COMPRESSORS.get(compression_id)
+    if compressor is None:
+        compressor = _COMPRESSORS[compression_id] = _COMPRESSOR_FACTORIES[compression_id]()
+    return compressor
+
+
+def _resolve_writer(codec_name: str, compression_name: str) -> Tuple[_Codec, Optional[_Compressor]]:
+    """Codec/compressor dùng để ghi; thư viện chưa cài → lùi về JSON / không nén."""
+    try:
+        codec = _codec(_CODEC_NAMES[codec_name])
+    except (KeyError, ImportError) as exc:
+        logger.warning("cache codec %r unavailable (%s), using json", codec_name, exc)
+        codec = _codec(_CODEC_JSON)
+    compressor = None
+    compression_id = _COMPRESSION_NAMES.get(compression_name, _COMPRESS_NONE)
+    if compression_id != _COMPRESS_NONE:
+        try:
+            compressor = _compressor(compression_id)
+        except ImportError as exc:
+            logger.warning("cache compression %r unavailable (%s), storing uncompressed", compression_name, exc)
+    return codec, compressor
+
+
+_WRITER: Optional[Tuple[_Codec, Optional[_Compressor]]] = None
+
+
+def _writer() -> Tuple[_Codec, Optional[_Compressor]]:
+    global _WRITER
+    if _WRITER is None:
+        _WRITER = _resolve_writer(CODEC, COMPRESSION)
+    return _WRITER
+
+
+def encode(value: Any) -> Tuple[bytes, bytes]:
+    """(raw lưu Redis, body chưa nén)."""
+    codec, compressor = _writer()
+    body = codec.dumps(value)
+    if compressor is not None and len(body) >= COMPRESS_MIN_BYTES:
+        return bytes((_FRAME_V1, codec.id, compressor.id)) + compressor.compress(body), body
+    return bytes((_FRAME_V1, codec.id, _COMPRESS_NONE)) + body, body
+
+
+def _decode(raw: bytes) -> Tuple[Any, int]:
+    """(giá trị, số byte body chưa nén – dùng tính dung lượng tier local)."""
+    if not raw or raw[0] != _FRAME_V1:
+        return json.loads(raw), len(raw)  # entry ghi trước khi có header
+    body = raw[3:]
+    if raw[2] != _COMPRESS_NONE:
+        body = _compressor(raw[2]).decompress(body)
+    return _codec(raw[1]).loads(body), len(body)
+
+
+def decode(raw: bytes) -> Any:
+    return _decode(raw)[0]
+
+
+# ==========================================================
+# Tag: entry cache gắn tag (product:<id>, category:<id>, catalog...)
+# ==========================================================
+# Lúc set, entry lưu kèm version hiện tại của từng tag; lúc get, version tag
+# đổi (invalidate_tags đã đổi) → coi như miss. Invalidate O(số tag), không cần
+# SCAN/DEL key.
+#
+# Version là số ngẫu nhiên (không phải counter INCR): key version có TTL nên
+# Redis volatile-lru có thể evict nó bất cứ lúc nào; counter sẽ đếm lại từ 0 và
+# lặp lại version mà entry cũ đã stamp (ABA → entry stale hợp lệ trở lại). Ở đây
+# tag chưa có version được khởi tạo ngẫu nhiên lúc stamp, invalidate ghi số ngẫu
+# nhiên mới, và version vắng mặt (0) không khớp stamp nào → bị evict chỉ gây miss.
+CATALOG_TAG = "catalog"
+TAG_VERSION_TTL = 7 * 24 * 3600
+# Key version của tag = _VERSION_PREFIX + _TAG_VERSION_PREFIX + tag ("ver:tag:<tag>")
+_VERSION_PREFIX = "ver:"
+_TAG_VERSION_PREFIX = "tag:"
+_ENVELOPE = "__tags__"
+
+# ==========================================================
+# Tier 1: LRU in-process trước Redis (object đã decode)
+# ==========================================================
+# Hit local không tốn network lẫn decode. Mọi set/delete/invalidate_tags được
+# publish lên _INVALIDATE_CHANNEL, process khác bỏ entry local tương ứng. Pub/sub
+# không đảm bảo giao (mất kết nối...) nên:
+#   - tier local chỉ phục vụ khi listener đang subscribe, mất kết nối → xoá sạch
+#   - entry local sống tối đa LOCAL_TTL_SECONDS (chặn trên độ trễ nếu lọt message)
+# Object trả về từ tier local dùng chung giữa các request: caller không được sửa.
+LOCAL_MAX_BYTES = int(os.getenv("CACHE_LOCAL_MAX_BYTES", str(64 * 1024 * 1024)))
+LOCAL_MAX_ENTRY_BYTES = LOCAL_MAX_BYTES // 8
+LOCAL_TTL_SECONDS = float(os.getenv("CACHE_LOCAL_TTL_SECONDS", "30"))
+_INVALIDATE_CHANNEL = "cache:invalidate"
+_ORIGIN = uuid.uuid4().hex
+
+
+class _LocalTier:
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[float, Any, int, Tuple[str, ...]]]" = OrderedDict()
+        self._by_tag: Dict[str, Set[str]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+            if entry[0] <= time.monotonic():
+                self._pop(key)
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def put(self, key: str, value: Any, size: int, ttl: float, tags: Iterable[str] = ()) -> None:
+        if size > LOCAL_MAX_ENTRY_BYTES or ttl <= 0:
+            self.drop(key)
+            return
+        tags = tuple(tags)
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (time.monotonic() + ttl, value, size, tags)
+            self._bytes += size
+            for tag in tags:
+                self._by_tag.setdefault(tag, set()).add(key)
+            while self._bytes > self.max_bytes and self._entries:
+                self._pop(next(iter(self._entries)))
+
+    def drop(self, key: str) -> None:
+        with self._lock:
+            self._pop(key)
+
+    def drop_tags(self, tags: Iterable[str]) -> None:
+        with self._lock:
+            for tag in tags:
+                for key in list(self._by_tag.get(tag, ())):
+                    self._pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_tag.clear()
+            self._bytes = 0
+
+    def _pop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry[2]
+        for tag in entry[3]:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+_LOCAL = _LocalTier(LOCAL_MAX_BYTES)
+_LISTENING = threading.Event()
+_LISTENER_PID: Optional[int] = None
+_LISTENER_LOCK = threading.Lock()
+
+
+def _origin() -> str:
+    # Process con fork ra thừa hưởng _ORIGIN của cha → thêm pid để phân biệt
+    return f"{_ORIGIN}:{os.getpid()}"
+
+
+def _handle_invalidation(data: bytes) -> None:
+    msg = json.loads(data)
+    if msg.get("o") == _origin():
+        return
+    for key in msg.get("k") or ():
+        _LOCAL.drop(key)
+    if msg.get("t"):
+        _LOCAL.drop_tags(msg["t"])
+
+
+def _listen() -> None:
+    backoff = 1.0
+    while True:
+        pubsub = None
+        try:
+            pubsub = redis_conn.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(_INVALIDATE_CHANNEL)
+            _LOCAL.clear()
+            _LISTENING.set()
+            backoff = 1.0
+            for msg in pubsub.listen():
+                if msg.get("type") == "message":
+                    _handle_invalidation(msg["data"])
+        except Exception as exc:
+            logger.debug("cache invalidation listener error: %s", exc)
+        finally:
+            # Có thể đã lọt message trong lúc mất kết nối → không tin tier local nữa
+            _LISTENING.clear()
+            _LOCAL.clear()
+            if pubsub is not None:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+        time.sleep(backoff)
+        backoff = min(backoff * 2, 30.0)
+
+
+def _local_enabled() -> bool:
+    global _LISTENER_PID
+    if LOCAL_MAX_BYTES <= 0:
+        return False
+    pid = os.getpid()
+    if _LISTENER_PID != pid:
+        # Lần đầu, hoặc process con fork ra (RQ job): thread listener không đi theo fork
+        with _LISTENER_LOCK:
+            if _LISTENER_PID != pid:
+                _LISTENING.clear()
+                _LOCAL.clear()
+                threading.Thread(target=_listen, name="cache-invalidation", daemon=True).start()
+                _LISTENER_PID = pid
+    return _LISTENING.is_set()
+
+
+def _invalidation_message(keys: Iterable[str], tags: Iterable[str]) -> str:
+    return json.dumps({"o": _origin(), "k": list(keys), "t": list(tags)})
+
+
+def _publish(keys: Iterable[str] = (), tags: Iterable[str] = ()) -> None:
+    try:
+        redis_conn.publish(_INVALIDATE_CHANNEL, _invalidation_message(keys, tags))
+    except Exception as exc:
+        logger.debug("cache error on publish invalidation: %s", exc)
+
+
+def local_stats() -> Dict[str, int]:
+    return {**_LOCAL.stats(), "listening": int(_LISTENING.is_set())}
+
+
+def product_tag(product_id: int) -> str:
+    return f"product:{int(product_id)}"
+
+
+def category_tag(category_id: int) -> str:
+    return f"category:{int(category_id)}"
+
+
+def _new_tag_version() -> int:
+    return secrets.randbits(62) + 1  # ≠ 0 (version vắng mặt)
+
+
+def _tag_versions(tags: Iterable[str], create: bool = False) -> Dict[str, int]:
+    """Version hiện tại của tags (0 = chưa có). create=True (lúc stamp): tag chưa có
+    version được khởi tạo ngẫu nhiên (SET NX), để stamp không bao giờ là 0."""
+    tags = list(tags)
+    names = [_VERSION_PREFIX + _TAG_VERSION_PREFIX + t for t in tags]
+    raws = redis_conn.mget(names)
+    missing = [i for i, raw in enumerate(raws) if raw is None] if create else []
+    if missing:
+        pipe = redis_conn.pipeline(transaction=False)
+        for i in missing:
+            pipe.set(names[i], _new_tag_version(), nx=True, ex=TAG_VERSION_TTL)
+        pipe.mget([names[i] for i in missing])
+        *_, created = pipe.execute()
+        for i, raw in zip(missing, created):
+            raws[i] = raw
+    return {t: int(raw or 0) for t, raw in zip(tags, raws)}
+
+
+def _unwrap(raw: bytes) -> Tuple[Any, Dict[str, int], float, int]:
+    """raw Redis → (value, tag version đã stamp, fresh_until, size). fresh_until = inf nếu không có hạn "tươi"."""
+    value, size = _decode(raw)
+    if isinstance(value, dict) and _ENVELOPE in value:
+        fresh_until = float(value.get(_FRESH_UNTIL) or float("inf"))
+        return value["value"], value[_ENVELOPE] or {}, fresh_until, size
+    return value, {}, float("inf"), size
+
+
+def _remember(key: str, value: Any, fresh_until: float, size: int, pttl: Optional[int], tags: Iterable[str]) -> None:
+    # Tier local chỉ giữ bản còn tươi; bản stale luôn đi qua Redis + lock
+    now = time.time()
+    if fresh_until <= now:
+        return
+    ttl = min(LOCAL_TTL_SECONDS, fresh_until - now)
+    if pttl is not None and pttl >= 0:
+        ttl = min(ttl, pttl / 1000.0)
+    _LOCAL.put(key, (value, fresh_until), size, ttl, list(tags))
+
+
+def _read(key: str) -> Tuple[bool, Any, float]:
+    """(found, value, fresh_until). fresh_until = inf với entry không có hạn "tươi"."""
+    use_local = _local_enabled()
+    if use_local:
+        found, entry = _LOCAL.get(key)
+        if found:
+            logger.debug("cache hit (local): %s", key)
+            return True, entry[0], entry[1]
+    try:
+        pipe = redis_conn.pipeline(transaction=False)
+        pipe.get(key)
+        pipe.pttl(key)
+        raw, pttl = pipe.execute()
+        if raw is None:
+            logger.debug("cache miss: %s", key)
+            return False, None, 0.0
+        value, stamped, fresh_until, size = _unwrap(raw)
+        if stamped and _tag_versions(stamped) != stamped:
+            logger.debug("cache stale (tag invalidated): %s", key)
+            redis_conn.delete(key)
+            return False, None, 0.0
+        if use_local:
+            _remember(key, value, fresh_until, size, pttl, stamped)
+        logger.debug("cache hit: %s", key)
+        return True, value, fresh_until
+    except Exception as exc:
+        logger.debug("cache error on get %s: %s", key, exc)
+        return False, None, 0.0
+
+
+def _pack(value: Any, stamped: Optional[Dict[str, int]], fresh_until: Optional[float]) -> Tuple[bytes, bytes, bool]:
+    """(raw, body chưa nén, có bọc envelope không)."""
+    if not stamped and fresh_until is None:
+        return (*encode(value), False)
+    stored = {_ENVELOPE: stamped or {}, "value": value}
+    if fresh_until is not None:
+        stored[_FRESH_UNTIL] = fresh_until
+    return (*encode(stored), True)
+
+
+def _keep_local(
+    key: str,
+    raw: bytes,
+    body: bytes,
+    wrapped: bool,
+    ttl_seconds: int,
+    stamped: Optional[Dict[str, int]],
+    fresh_until: Optional[float],
+    verified: bool = False,
+) -> None:
+    # Tag bị invalidate giữa lúc stamp và lúc ghi (get_or_compute: trong lúc compute)
+    # thì drop_tags đã chạy trước put → entry stale sẽ nằm ở tier local tới hết TTL.
+    # Đọc lại version sau khi ghi Redis: invalidate xảy ra sau lần đọc này sẽ drop
+    # entry vừa put, trước đó thì version lệch và không put.
+    if stamped and not verified:
+        try:
+            if _tag_versions(stamped) != stamped:
+                logger.debug("cache skip local (tag invalidated): %s", key)
+                return
+        except Exception as exc:
+            logger.debug("cache error on verify tags %s: %s", key, exc)
+            return
+    # Lưu bản đã qua codec (Decimal → float...) để hit local giống hệt hit Redis
+    decoded = _codec(raw[1]).loads(body)
+    if wrapped:
+        decoded = decoded["value"]
+    until = fresh_until if fresh_until is not None else float("inf")
+    ttl = min(LOCAL_TTL_SECONDS, ttl_seconds, until - time.time())
+    _LOCAL.put(key, (decoded, until), len(body), ttl, list(stamped or ()))
+
+
+def _write(
+    key: str,
+    value: Any,
+    ttl_seconds: int,
+    stamped: Optional[Dict[str, int]] = None,
+    fresh_until: Optional[float] = None,
+) -> None:
+    try:
+        raw, body, wrapped = _pack(value, stamped, fresh_until)
+        redis_conn.setex(key, ttl_seconds, raw)
+        logger.debug("cache set: %s ttl=%s tags=%s", key, ttl_seconds, list(stamped or ()))
+    except Exception as exc:
+        logger.debug("cache error on set %s: %s", key, exc)
+        _LOCAL.drop(key)
+        return
+    _publish(keys=[key])
+    if _local_enabled():
+        _keep_local(key, raw, body, wrapped, ttl_seconds, stamped, fresh_until)
+
 
 def get_json(key: str) -> Optional[Any]:
+    found, value, fresh_until = _read(key)
+    if not found or fresh_until <= time.time():
+        return None
+    return value
+
+
+def set_json(key: str, value: Any, ttl_seconds: int, tags: Iterable[str] = ()) -> None:
+    tags = list(dict.fromkeys(tags))
+    try:
+        stamped = _tag_versions(tags, create=True) if tags else None
+    except Exception as exc:
+        logger.debug("cache error on set %s: %s", key, exc)
+        return
+    _write(key, value, ttl_seconds, stamped)
+
+
+# ==========================================================
+# Multi-get / multi-set: 1 round trip cho cả danh sách key
+# ==========================================================
+# Dùng khi hydrate danh sách theo entry per-item (vd cache:risk:<pid>): MGET +
+# 1 MGET version cho hợp mọi tag, thay vì get_json/set_json từng key trong vòng lặp.
+def get_many(keys: Iterable[str]) -> Dict[str, Any]:
+    """key → giá trị cho các key có trong cache và còn tươi; key vắng mặt = miss."""
+    keys = list(dict.fromkeys(keys))
+    out: Dict[str, Any] = {}
+    now = time.time()
+    use_local = _local_enabled()
+    remote: List[str] = []
+    for key in keys:
+        if use_local:
+            found, entry = _LOCAL.get(key)
+            if found:
+                if entry[1] > now:
+                    out[key] = entry[0]
+                continue
+        remote.append(key)
+    if not remote:
+        return out
+
+    try:
+        pipe = redis_conn.pipeline(transaction=False)
+        pipe.mget(remote)
+        for key in remote:
+            pipe.pttl(key)
+        raws, *pttls = pipe.execute()
+        entries = {}
+        all_tags: Set[str] = set()
+        for key, raw, pttl in zip(remote, raws, pttls):
+            if raw is None:
+                continue
+            value, stamped, fresh_until, size = _unwrap(raw)
+            entries[key] = (value, stamped, fresh_until, size, pttl)
+            all_tags.update(stamped)
+        versions = _tag_versions(all_tags) if all_tags else {}
+        invalidated = []
+        for key, (value, stamped, fresh_until, size, pttl) in entries.items():
+            if any(versions.get(t) != v for t, v in stamped.items()):
+                invalidated.append(key)
+                continue
+            if fresh_until <= now:
+                continue
+            out[key] = value
+            if use_local:
+                _remember(key, value, fresh_until, size, pttl, stamped)
+        if invalidated:
+            redis_conn.delete(*invalidated)
+        logger.debug("cache get_many: %s/%s hit", len(out), len(keys))
+    except Exception as exc:
+        logger.debug("cache error on get_many (%s keys): %s", len(remote), exc)
+    return out
+
+
+def set_many(
+    values: Dict[str, Any],
+    ttl_seconds: int,
+    tags: Optional[Dict[str, Iterable[str]]] = None,
+) -> None:
+    """Ghi nhiều key trong 1 pipeline. tags: key → tag của riêng key đó."""
+    if not values:
+        return
+    tags_of = {key: list(dict.fromkeys((tags or {}).get(key, ()))) for key in values}
+    try:
+        all_tags = {t for key_tags in tags_of.values() for t in key_tags}
+        versions = _tag_versions(all_tags, create=True) if all_tags else {}
+        pipe = redis_conn.pipeline(transaction=False)
+        packed = {}
+        for key, value in values.items():
+            stamped = {t: versions[t] for t in tags_of[key]}
+            packed[key] = (*_pack(value, stamped, None), stamped)
+            pipe.setex(key, ttl_seconds, packed[key][0])
+        pipe.execute()
+        logger.debug("cache set_many: %s keys ttl=%s", len(values), ttl_seconds)
+    except Exception as exc:
+        logger.debug("cache error on set_many (%s keys): %s", len(values), exc)
+        for key in values:
+            _LOCAL.drop(key)
+        return
+    _publish(keys=list(values))
+    if _local_enabled():
+        try:
+            current = _tag_versions(all_tags) if all_tags else {}
+        except Exception as exc:
+            logger.debug("cache error on verify tags (set_many): %s", exc)
+            return
+        for key, (raw, body, wrapped, stamped) in packed.items():
+            # 1 MGET cho cả batch thay vì mỗi key tự kiểm tra
+            if all(current.get(t) == v for t, v in stamped.items()):
+                _keep_local(key, raw, body, wrapped, ttl_seconds, stamped, None, verified=True)
+
+
+# ==========================================================
+# Async API: cho route async def (client redis.asyncio, không chặn event loop)
+# ==========================================================
+# Cùng định dạng lưu, tag và tier local với bản sync → key ghi bằng set_json đọc
+# được bằng aget_json và ngược lại.
+async def _atag_versions(client: Any, tags: Iterable[str], create: bool = False) -> Dict[str, int]:
+    tags = list(tags)
+    names = [_VERSION_PREFIX + _TAG_VERSION_PREFIX + t for t in tags]
+    raws = await client.mget(names)
+    missing = [i for i, raw in enumerate(raws) if raw is None] if create else []
+    if missing:
+        pipe = client.pipeline(transaction=False)
+        for i in missing:
+            pipe.set(names[i], _new_tag_version(), nx=True, ex=TAG_VERSION_TTL)
+        pipe.mget([names[i] for i in missing])
+        *_, created = await pipe.execute()
+        for i, raw in zip(missing, created):
+            raws[i] = raw
+    return {t: int(raw or 0) for t, raw in zip(tags, raws)}
+
+
+async def aget_json(key: str) -> Optional[Any]:
+    use_local = _local_enabled()
+    if use_local:
+        found, entry = _LOCAL.get(key)
+        if found:
+            logger.debug("cache hit (local): %s", key)
+            return entry[0] if entry[1] > time.time() else None
     try:
-        raw = redis_conn.get(key)
+        client = get_async_redis()
+        pipe = client.pipeline(transaction=False)
+        pipe.get(key)
+        pipe.pttl(key)
+        raw, pttl = await pipe.execute()
         if raw is None:
             logger.debug("cache miss: %s", key)
             return None
+        value, stamped, fresh_until, size = _unwrap(raw)
+        if stamped and await _atag_versions(client, stamped) != stamped:
+            logger.debug("cache stale (tag invalidated): %s", key)
+            await client.delete(key)
+            return None
+        if fresh_until <= time.time():
+            return None
+        if use_local:
+            _remember(key, value, fresh_until, size, pttl, stamped)
         logger.debug("cache hit: %s", key)
-        return json.loads(raw)
+        return value
     except Exception as exc:
         logger.debug("cache error on get %s: %s", key, exc)
         return None
 
 
-def set_json(key: str, value: Any, ttl_seconds: int) -> None:
+async def aset_json(key: str, value: Any, ttl_seconds: int, tags: Iterable[str] = ()) -> None:
+    tags = list(dict.fromkeys(tags))
     try:
-        # default=str giúp serialize Decimal/UUID/etc thay vì lỗi
-        redis_conn.setex(key, ttl_seconds, json.dumps(value, default=str))
-        logger.debug("cache set: %s ttl=%s", key, ttl_seconds)
+        client = get_async_redis()
+        stamped = await _atag_versions(client, tags, create=True) if tags else None
+        raw, body, wrapped = _pack(value, stamped, None)
+        await client.setex(key, ttl_seconds, raw)
+        logger.debug("cache set: %s ttl=%s tags=%s", key, ttl_seconds, tags)
     except Exception as exc:
         logger.debug("cache error on set %s: %s", key, exc)
+        _LOCAL.drop(key)
+        return
+    try:
+        await client.publish(_INVALIDATE_CHANNEL, _invalidation_message([key], ()))
+    except Exception as exc:
+        logger.debug("cache error on publish invalidation: %s", exc)
+    if _local_enabled():
+        if stamped:
+            try:
+                if await _atag_versions(client, stamped) != stamped:
+                    return
+            except Exception as exc:
+                logger.debug("cache error on verify tags %s: %s", key, exc)
+                return
+        _keep_local(key, raw, body, wrapped, ttl_seconds, stamped, None, verified=True)
+
+
+# ==========================================================
+# get_or_compute: single-flight + stale-while-revalidate + negative cache
+# ==========================================================
+# Entry sống ttl + stale_ttl trong Redis nhưng chỉ "tươi" trong ttl giây. Hết tươi:
+# đúng 1 caller lấy được lock (SET NX) và tính lại, các caller khác trả bản cũ
+# ngay. Chưa có bản nào: caller không có lock chờ tối đa LOCK_WAIT_SECONDS để
+# holder ghi xong thay vì cùng đập vào SQL Server.
+# fn trả None = "không có" (vd sản phẩm không tồn tại) → cache negative_ttl giây;
+# [] / {} là kết quả bình thường, cache đủ ttl.
+LOCK_TTL_SECONDS = 30
+LOCK_WAIT_SECONDS = 5.0
+NEGATIVE_TTL_SECONDS = 60
+_LOCK_PREFIX = "lock:"
+_FRESH_UNTIL = "__fresh__"
+_NO_LOCK = ""  # Redis lỗi: tính trực tiếp, không lock
+_RELEASE_SCRIPT = (
+    "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+)
+
+
+def _acquire(key: str) -> Optional[str]:
+    token = uuid.uuid4().hex
+    try:
+        if redis_conn.set(_LOCK_PREFIX + key, token, nx=True, ex=LOCK_TTL_SECONDS):
+            return token
+        return None
+    except Exception as exc:
+        logger.debug("cache error on lock %s: %s", key, exc)
+        return _NO_LOCK
+
+
+def _release(key: str, token: str) -> None:
+    try:
+        redis_conn.eval(_RELEASE_SCRIPT, 1, _LOCK_PREFIX + key, token)
+    except Exception as exc:
+        logger.debug("cache error on unlock %s: %s", key, exc)
+
+
+def get_or_compute(
+    key: str,
+    fn: Callable[[], Any],
+    ttl: int,
+    stale_ttl: int = 0,
+    tags: Union[Iterable[str], Callable[[Any], Iterable[str]]] = (),
+    negative_ttl: int = NEGATIVE_TTL_SECONDS,
+) -> Any:
+    """Giá trị cache của key, tính bằng fn() khi thiếu/hết tươi (xem chú thích ở trên).
+
+    tags: list tag, hoặc hàm nhận kết quả trả list tag (khi tag phụ thuộc kết quả).
+    """
+    found, value, fresh_until = _read(key)
+    if found and fresh_until > time.time():
+        return value
+
+    token = _acquire(key)
+    if token is None:
+        if found:
+            logger.debug("cache stale served while another worker recomputes: %s", key)
+            return value
+        deadline = time.monotonic() + LOCK_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            found, value, _ = _read(key)
+            if found:
+                return value
+        logger.debug("cache wait timed out, computing without lock: %s", key)
+
+    try:
+        # Đọc version tag TRƯỚC khi tính: ghi xảy ra trong lúc tính sẽ làm entry này stale
+        static_tags = None if callable(tags) else list(dict.fromkeys(tags))
+        try:
+            stamped = _tag_versions(static_tags, create=True) if static_tags else {}
+        except Exception as exc:
+            logger.debug("cache error on tag versions %s: %s", key, exc)
+            stamped = None
+
+        value = fn()
+
+        if callable(tags):
+            try:
+                stamped = _tag_versions(list(dict.fromkeys(tags(value))), create=True)
+            except Exception as exc:
+                logger.debug("cache error on tag versions %s: %s", key, exc)
+                stamped = None
+        if stamped is None:
+            return value
+        if value is None:
+            if negative_ttl > 0:
+                _write(key, None, negative_ttl, stamped, fresh_until=time.time() + negative_ttl)
+        else:
+            _write(key, value, ttl + stale_ttl, stamped, fresh_until=time.time() + ttl)
+        return value
+    finally:
+        if token:
+            _release(key, token)
+
+
+def invalidate_tags(tags: Iterable[str]) -> None:
+    """Gọi sau khi commit ghi dữ liệu: mọi entry gắn một trong các tag này hết hiệu lực."""
+    tags = list(dict.fromkeys(tags))
+    if not tags:
+        return
+    try:
+        # Version mới ngẫu nhiên (không INCR) – xem ghi chú ở phần Tag
+        pipe = redis_conn.pipeline(transaction=False)
+        for t in tags:
+            pipe.set(_VERSION_PREFIX + _TAG_VERSION_PREFIX + t, _new_tag_version(), ex=TAG_VERSION_TTL)
+        pipe.execute()
+        logger.debug("cache invalidate tags: %s", tags)
+    except Exception as exc:
+        logger.debug("cache error on invalidate tags %s: %s", tags, exc)
+    _LOCAL.drop_tags(tags)
+    _publish(tags=tags)
 
 
 def delete(key: str) -> None:
@@ -35,3 +808,5 @@ def delete(key: str) -> None:
         logger.debug("cache delete: %s", key)
     except Exception as exc:
         logger.debug("cache error on delete %s: %s", key, exc)
+    _LOCAL.drop(key)
+    _publish(keys=[key])
@@ -10,6 +10,7 @@ from ..models.search_history import Search_History
 from ..models.search_history_products import Search_History_Products
 from ..models.favorites import Favorites
 from ..models.user_reviews import User_Reviews
+from . import products as product_crud
 from datetime import timezone
 
 def get_user_statistics(db: Session, active_days: int = 30) -> Dict[str, int]:
@@ -113,7 +114,10 @@ def purge_inactive_products(db: Session, months: int = 3, dry_run: bool = True)
     if dry_run:
         return int(count)
 
+    rows = stale.with_entities(Products.Product_ID, Products.Category_ID).all()
     stale.delete(synchronize_session=False)
     db.commit()
+    product_ids = [pid for pid, _ in rows]
+    product_crud.invalidate_product_caches(db, product_ids, {cid for _, cid in rows})
     return int(count)
 
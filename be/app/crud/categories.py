@@ -1,8 +1,10 @@
-from typing import Optional, Sequence, Dict, Any
+from typing import Optional, Sequence, Dict, Any, List
 
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from ..models.categories import Categories
+from ..services import category_index
 
 
 def get_by_id(db: Session, category_id: int) -> Optional[Categories]:
@@ -22,10 +24,14 @@ def list_categories(db: Session, skip: int = 0, limit: int = 100) -> Sequence[Ca
 
 
 def create_category(db: Session, data: Dict[str, Any]) -> Categories:
+    data = dict(data)
+    if "Parent_ID" not in data:
+        data["Parent_ID"] = get_or_create_parent(db, source=data.get("Source") or "Tiki", names=parent_names(data))
     category = Categories(**data)
     db.add(category)
     db.commit()
     db.refresh(category)
+    category_index.mark_inserted(category)
     return category
 
 
@@ -48,9 +54,11 @@ def update_category(db: Session, category: Categories, data: Dict[str, Any]) ->
         })
         category.Category_Path = updated["Category_Path"]
         category.Level_Count = updated["Level_Count"]
+        category.Parent_ID = get_or_create_parent(db, source=updated["Source"], names=parent_names(updated))
     db.add(category)
     db.commit()
     db.refresh(category)
+    category_index.mark_changed()
     return category
 
 
@@ -77,6 +85,74 @@ def ensure_path_fields(d: Dict[str, Any]) -> Dict[str, Any]:
     return d
 
 
+def parent_names(d: Dict[str, Any]) -> List[str]:
+    """Tên các level của danh mục cha (bỏ level cuối); [] với danh mục cấp 1."""
+    parts = [normalize_name(d.get(f"Category_Lv{n}")) for n in range(1, 6)]
+    return [p for p in parts if p][:-1]
+
+
+def get_or_create_parent(db: Session, *, source: str, names: Sequence[str]) -> Optional[int]:
+    """Category_ID của danh mục có path = names (tạo nếu chưa có, kèm các cha của nó)."""
+    if not names:
+        return None
+    path = " > ".join(names)
+    existing = get_by_source_path(db, source=source, category_path=path)
+    if existing:
+        return existing.Category_ID
+    data = ensure_path_fields({"Source": source, **{f"Category_Lv{i}": name for i, name in enumerate(names, start=1)}})
+    try:
+        return create_category(db, data).Category_ID
+    except IntegrityError:
+        # Worker khác vừa tạo cùng danh mục cha
+        db.rollback()
+        existing = get_by_source_path(db, source=source, category_path=path)
+        if existing:
+            return existing.Category_ID
+        raise
+
+
+def get_ancestors(db: Session, category: Categories) -> List[Categories]:
+    """Chuỗi cha từ cấp 1 tới cha trực tiếp (tối đa 4 lookup theo khoá chính)."""
+    chain: List[Categories] = []
+    parent_id = category.Parent_ID
+    while parent_id is not None and len(chain) < 5:
+        parent = get_by_id(db, parent_id)
+        if parent is None:
+            break
+        chain.append(parent)
+        parent_id = parent.Parent_ID
+    return chain[::-1]
+
+
+def get_descendants(
+    db: Session,
+    category_ids: Sequence[int],
+    *,
+    include_self: bool = False,
+    limit: Optional[int] = None,
+) -> List[Categories]:
+    """Mọi danh mục con cháu của category_ids (CTE đệ quy theo Parent_ID), sắp theo path."""
+    ids = [int(c) for c in category_ids]
+    if not ids:
+        return []
+    tree = (
+        db.query(Categories.Category_ID)
+        .filter(Categories.Category_ID.in_(ids) if include_self else Categories.Parent_ID.in_(ids))
+        .cte(name="subtree", recursive=True)
+    )
+    tree = tree.union_all(
+        db.query(Categories.Category_ID).filter(Categories.Parent_ID == tree.c.Category_ID)
+    )
+    query = (
+        db.query(Categories)
+        .join(tree, Categories.Category_ID == tree.c.Category_ID)
+        .order_by(Categories.Category_Path.asc())
+    )
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+
 def list_categories_advanced(
     db: Session,
     *,
@@ -139,15 +215,30 @@ def rebuild_is_leaf_flags(db: Session, source: Optional[str] = None) -> int:
 
 
 def search_tree_prefix(db: Session, *, source: str, prefix: str, limit: int = 50) -> Sequence[Categories]:
-    """Find categories whose path starts with given prefix (case-insensitive)."""
-    like = f"{prefix}%"
-    return (
-        db.query(Categories)
-        .filter(Categories.Source == (source or "Tiki"), Categories.Category_Path.ilike(like))
-        .order_by(Categories.Category_Path.asc())
-        .limit(limit)
-        .all()
-    )
+    """Find categories whose path starts with given prefix (case-insensitive).
+
+    Các level đã gõ đủ ("A > B > ") tra thẳng theo path; chỉ level đang gõ dở so
+    LIKE trên tên, giới hạn trong con của cha đó (Parent_ID), rồi lấy con cháu.
+    """
+    source = source or "Tiki"
+    segments = [normalize_name(p) for p in prefix.split(">")]
+    complete, partial = segments[:-1], segments[-1]
+    if not all(complete) or len(complete) >= 5:
+        return []
+
+    query = db.query(Categories.Category_ID).filter(Categories.Source == source)
+    if complete:
+        parent = get_by_source_path(db, source=source, category_path=" > ".join(complete))
+        if parent is None:
+            return []
+        query = query.filter(Categories.Parent_ID == parent.Category_ID)
+    else:
+        query = query.filter(Categories.Parent_ID.is_(None), Categories.Level_Count == 1)
+    if partial:
+        level_col = getattr(Categories, f"Category_Lv{len(complete) + 1}")
+        query = query.filter(level_col.ilike(f"{partial}%"))
+    starts = [cid for (cid,) in query.all()]
+    return get_descendants(db, starts, include_self=True, limit=limit)
 
 
 def stats_by_level(db: Session, source: Optional[str] = None) -> Dict[int, int]:
@@ -216,8 +307,4 @@ def get_children(db: Session, category_id: int):
     if not parent:
         return None
 
-    return db.query(Categories).filter(
-        Categories.Source == parent.Source,
-        Categories.Category_Path.like(parent.Category_Path + " >%"),
-        Categories.Level_Count == parent.Level_Count + 1
-    ).all()
+    return db.query(Categories).filter(Categories.Parent_ID == parent.Category_ID).all()
@@ -0,0 +1,89 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from ..models.category_stats import Category_Stats
+from ..models.products import Products
+# module (không phải tên): crud.products import services.category_tree → vòng import
+from . import products as product_crud
+
+STAT_FIELDS = (
+    "Product_Count", "Active_Count", "Price_Sum", "Price_Count", "Rating_Sum", "Rating_Count",
+    "Positive_Count", "Neutral_Count", "Negative_Count",
+)
+
+
+def aggregate(db: Session, category_ids: Optional[Sequence[int]] = None) -> Dict[int, Dict[str, float]]:
+    """Category_ID → tổng hợp sản phẩm thuộc trực tiếp danh mục (1 GROUP BY / 1000 id)."""
+    active = Products.Is_Active == True
+    positive, negative = product_crud.sentiment_predicates()
+
+    def count_if(cond):
+        return func.sum(case((cond, 1), else_=0))
+
+    def sum_if(cond, col):
+        return func.sum(case((cond, col), else_=0))
+
+    query = db.query(
+        Products.Category_ID,
+        func.count(Products.Product_ID),
+        count_if(active),
+        sum_if(active & Products.Price.isnot(None), Products.Price),
+        count_if(active & Products.Price.isnot(None)),
+        sum_if(active & Products.Avg_Rating.isnot(None), Products.Avg_Rating),
+        count_if(active & Products.Avg_Rating.isnot(None)),
+        count_if(active & positive),
+        count_if(active & ~positive & ~negative),
+        count_if(active & negative),
+    ).group_by(Products.Category_ID)
+
+    if category_ids is None:
+        chunks: List[Optional[List[int]]] = [None]
+    else:
+        ids = sorted({int(c) for c in category_ids})
+        # SQL Server giới hạn ~2100 tham số / câu lệnh
+        chunks = [ids[i:i + 1000] for i in range(0, len(ids), 1000)]
+    out: Dict[int, Dict[str, float]] = {}
+    for chunk in chunks:
+        q = query if chunk is None else query.filter(Products.Category_ID.in_(chunk))
+        for cid, *values in q.all():
+            out[int(cid)] = {f: float(v or 0) if f.endswith("_Sum") else int(v or 0) for f, v in zip(STAT_FIELDS, values)}
+    return out
+
+
+def replace(db: Session, stats: Dict[int, Dict[str, float]], category_ids: Optional[Sequence[int]] = None) -> int:
+    """Ghi stats cho các danh mục trong category_ids (None = toàn bộ); danh mục không còn
+    sản phẩm thì xoá dòng. Không commit. Trả về số dòng ghi."""
+    existing_query = db.query(Category_Stats.Category_ID)
+    if category_ids is None:
+        existing = {int(cid) for (cid,) in existing_query.all()}
+        scope = existing | set(stats)
+    else:
+        scope = {int(c) for c in category_ids}
+        existing = set()
+        ids = sorted(scope)
+        for i in range(0, len(ids), 1000):
+            existing.update(
+                int(cid) for (cid,) in existing_query.filter(Category_Stats.Category_ID.in_(ids[i:i + 1000])).all()
+            )
+
+    now = datetime.utcnow()
+    updates = [{"Category_ID": cid, **stats[cid], "Updated_At": now} for cid in scope if cid in stats and cid in existing]
+    inserts = [{"Category_ID": cid, **stats[cid], "Updated_At": now} for cid in scope if cid in stats and cid not in existing]
+    removed = sorted(cid for cid in existing if cid not in stats)
+    if updates:
+        db.bulk_update_mappings(Category_Stats, updates)
+    if inserts:
+        db.bulk_insert_mappings(Category_Stats, inserts)
+    for i in range(0, len(removed), 1000):
+        db.query(Category_Stats).filter(
+            Category_Stats.Category_ID.in_(removed[i:i + 1000])
+        ).delete(synchronize_session=False)
+    return len(updates) + len(inserts)
+
+
+def all_rows(db: Session) -> Dict[int, Dict[str, float]]:
+    rows = db.query(Category_Stats.Category_ID, *[getattr(Category_Stats, f) for f in STAT_FIELDS]).all()
+    return {int(cid): dict(zip(STAT_FIELDS, values)) for cid, *values in rows}
@@ -0,0 +1,81 @@
+from datetime import datetime
+from typing import Any, Dict, Sequence
+
+from sqlalchemy.orm import Session
+
+from ..models.product_embeddings import Product_Embeddings
+
+
+def get_hashes(db: Session, product_ids: Sequence[int], model_key: str) -> Dict[int, str]:
+    """Product_ID → Text_Hash của vector đang lưu cho model này (bỏ qua vector model khác)."""
+    out: Dict[int, str] = {}
+    ids = list(product_ids)
+    # SQL Server giới hạn ~2100 tham số / câu lệnh
+    for i in range(0, len(ids), 1000):
+        rows = (
+            db.query(Product_Embeddings.Product_ID, Product_Embeddings.Text_Hash)
+            .filter(
+                Product_Embeddings.Product_ID.in_(ids[i:i + 1000]),
+                Product_Embeddings.Model_Key == model_key,
+            )
+            .all()
+        )
+        out.update({int(pid): h for pid, h in rows})
+    return out
+
+
+def upsert_many(db: Session, rows: Sequence[Dict[str, Any]]) -> None:
+    """rows: Product_ID, Model_Key, Text_Hash, Vector, Scale. Không commit."""
+    if not rows:
+        return
+    now = datetime.utcnow()
+    ids = [r["Product_ID"] for r in rows]
+    existing = set()
+    for i in range(0, len(ids), 1000):
+        existing.update(
+            pid for (pid,) in db.query(Product_Embeddings.Product_ID)
+            .filter(Product_Embeddings.Product_ID.in_(ids[i:i + 1000]))
+            .all()
+        )
+    inserts = [{**r, "Updated_At": now} for r in rows if r["Product_ID"] not in existing]
+    updates = [{**r, "Updated_At": now} for r in rows if r["Product_ID"] in existing]
+    if inserts:
+        db.bulk_insert_mappings(Product_Embeddings, inserts)
+    if updates:
+        db.bulk_update_mappings(Product_Embeddings, updates)
+
+
+def count_for_model(db: Session, model_key: str) -> int:
+    return db.query(Product_Embeddings).filter(Product_Embeddings.Model_Key == model_key).count()
+
+
+def page_for_model(db: Session, model_key: str, *, after_id: int = 0, limit: int = 5000):
+    """Keyset page (Product_ID, Vector, Scale, Updated_At) tăng dần theo Product_ID."""
+    return (
+        db.query(
+            Product_Embeddings.Product_ID,
+            Product_Embeddings.Vector,
+            Product_Embeddings.Scale,
+            Product_Embeddings.Updated_At,
+        )
+        .filter(Product_Embeddings.Model_Key == model_key, Product_Embeddings.Product_ID > after_id)
+        .order_by(Product_Embeddings.Product_ID)
+        .limit(limit)
+        .all()
+    )
+
+
+def changed_after(db: Session, model_key: str, since: datetime, *, limit: int):
+    """Vector ghi sau mốc since (dùng cho delta của index in-process)."""
+    return (
+        db.query(
+            Product_Embeddings.Product_ID,
+            Product_Embeddings.Vector,
+            Product_Embeddings.Scale,
+            Product_Embeddings.Updated_At,
+        )
+        .filter(Product_Embeddings.Model_Key == model_key, Product_Embeddings.Updated_At > since)
+        .order_by(Product_Embeddings.Updated_At)
+        .limit(limit)
+        .all()
+    )
@@ -1,4 +1,6 @@
-from typing import Optional, Sequence, Dict, Any
+import bisect
+import hashlib
+from typing import Optional, Sequence, Dict, Any, List
 from datetime import datetime, timedelta
 
 from sqlalchemy.orm import Session
@@ -6,10 +8,47 @@ from sqlalchemy import desc
 from sqlalchemy.exc import IntegrityError
 
 from ..models.products import Products
-from app.models.categories import Categories
 from app.models.search_history_products import Search_History_Products
+from app.services import category_index, category_tree, search_index, semantic_index
+
+from sqlalchemy import and_, bindparam, case, or_, func, literal_column, text, tuple_
+
+from app.cache import category_tag, get_json, invalidate_tags, product_tag, set_json
+from app.utils.cursor import decode_cursor, encode_cursor
+
+def invalidate_product_caches(
+    db: Session,
+    product_ids: Sequence[Optional[int]],
+    category_ids: Optional[Sequence[Optional[int]]] = None,
+    *,
+    product_feed: bool = True,
+) -> None:
+    """Gọi sau khi commit MỌI ghi Products (kể cả sentiment, Is_Active, giá):
+    - đẩy Product_ID lên change feed (search_index.mark_dirty: search, autocomplete,
+      embeddings); product_feed=False cho ghi chỉ đổi sentiment (không ảnh hưởng các
+      index đó, và job bulk sẽ làm tràn feed)
+    - đánh dấu danh mục cần tính lại Category_Stats (cả danh mục cũ khi sản phẩm đổi/xoá)
+    - invalidate tag cache của sản phẩm, danh mục và mọi phạm vi lọc (catalog, lvN:tên)
+
+    category_ids=None → tra Category_ID hiện tại của các sản phẩm (truyền vào khi
+    danh mục vừa đổi để invalidate cả danh mục cũ).
+    """
+    ids = [int(pid) for pid in product_ids if pid is not None]
+    if category_ids is None:
+        category_ids = [
+            cid for (cid,) in db.query(Products.Category_ID)
+            .filter(_id_in(Products.Product_ID, ids))
+            .distinct()
+            .all()
+        ] if ids else []
+    cids = [int(cid) for cid in category_ids if cid is not None]
+    if product_feed:
+        search_index.mark_dirty(ids)
+    category_tree.mark_stats_dirty(cids)
+    tags = [product_tag(pid) for pid in ids] + [category_tag(cid) for cid in cids]
+    tags += [category_index.cache_tag(scope) for scope in category_index.scope_tags(db, cids)]
+    invalidate_tags(tags)
 
-from sqlalchemy import or_, func, literal_column, text
 
 def get_by_id(db: Session, product_id: int) -> Optional[Products]:
     return db.query(Products).filter(Products.Product_ID == product_id).first()
@@ -28,21 +67,26 @@ def create_product(db: Session, data: Dict[str, Any]) -> Products:
     db.add(product)
     db.commit()
     db.refresh(product)
+    invalidate_product_caches(db, [product.Product_ID], [product.Category_ID])
     return product
 
 
 def update_product(db: Session, product: Products, data: Dict[str, Any]) -> Products:
+    old_category_id = product.Category_ID
     for k, v in data.items():
         setattr(product, k, v)
     db.add(product)
     db.commit()
     db.refresh(product)
+    invalidate_product_caches(db, [product.Product_ID], [old_category_id, product.Category_ID])
     return product
 
 
 def delete_product(db: Session, product: Products) -> None:
+    product_id, category_id = product.Product_ID, product.Category_ID
     db.delete(product)
     db.commit()
+    invalidate_product_caches(db, [product_id], [category_id])
 
 
 def get_products_by_category(db: Session, category_id: int, limit: int = 20, skip: int = 0) -> Sequence[Products]:
@@ -80,6 +124,7 @@ def create_or_update_by_external_id(db: Session, data: dict):
     )
 
     if existing:
+        old_category_id = existing.Category_ID
         # ✅ Cập nhật chỉ các field hợp lệ (tránh lỗi key không tồn tại trong model)
         for key, value in data.items():
             if hasattr(existing, key):
@@ -87,6 +132,7 @@ def create_or_update_by_external_id(db: Session, data: dict):
         try:
             db.commit()
             db.refresh(existing)
+            invalidate_product_caches(db, [existing.Product_ID], [old_category_id, existing.Category_ID])
             return existing
         except IntegrityError:
             db.rollback()
@@ -103,6 +149,7 @@ def create_or_update_by_external_id(db: Session, data: dict):
     try:
         db.commit()
         db.refresh(new_product)
+        invalidate_product_caches(db, [new_product.Product_ID], [new_product.Category_ID])
         return new_product
     except IntegrityError:
         # Another worker may have inserted the same External_ID+Source concurrently.
@@ -118,6 +165,7 @@ def create_or_update_by_external_id(db: Session, data: dict):
                     setattr(existing, key, value)
             db.commit()
             db.refresh(existing)
+            invalidate_product_caches(db, [existing.Product_ID], [existing.Category_ID])
             return existing
         raise
 
@@ -129,8 +177,114 @@ def update_sentiment(db: Session, external_id: int, score: Optional[float], labe
     product.Sentiment_Score = score
     product.Sentiment_Label = label
     db.commit()
+    invalidate_product_caches(db, [product.Product_ID], [product.Category_ID], product_feed=False)
     return product
 
+def apply_sentiment_delta(
+    db: Session,
+    product_id: int,
+    *,
+    delta_sum: float,
+    delta_count: int,
+    label_fn,
+    fallback_score: Optional[float] = None,
+) -> Optional[float]:
+    """Cộng delta vào Sentiment_Sum/Count (atomic trên DB) rồi tính lại score + label.
+
+    Không còn review có text → dùng fallback_score (score suy từ Rating) nếu có.
+    Không commit: caller commit cùng transaction với Reviews_Cache.
+    """
+    db.query(Products).filter(Products.Product_ID == product_id).update(
+        {
+            Products.Sentiment_Sum: func.coalesce(Products.Sentiment_Sum, 0) + delta_sum,
+            Products.Sentiment_Count: func.coalesce(Products.Sentiment_Count, 0) + delta_count,
+        },
+        synchronize_session=False,
+    )
+    row = (
+        db.query(Products.Sentiment_Sum, Products.Sentiment_Count)
+        .filter(Products.Product_ID == product_id)
+        .first()
+    )
+    if not row:
+        return None
+    total, count = row
+    score = (float(total) / count) if count else fallback_score
+    label = label_fn(score) if score is not None else None
+    db.query(Products).filter(Products.Product_ID == product_id).update(
+        {Products.Sentiment_Score: score, Products.Sentiment_Label: label},
+        synchronize_session=False,
+    )
+    return score
+
+
+_APPLY_SENTIMENT_DELTA_SQL = text("""
+UPDATE p SET
+    Sentiment_Sum = v.total,
+    Sentiment_Count = v.cnt,
+    Sentiment_Score = sc.score,
+    Sentiment_Label = CASE
+        WHEN sc.score IS NULL THEN NULL
+        WHEN sc.score >= :positive_min THEN 'positive'
+        WHEN sc.score >= :neutral_min THEN 'neutral'
+        ELSE 'negative'
+    END
+FROM Products p
+CROSS APPLY (
+    SELECT COALESCE(p.Sentiment_Sum, 0) + :delta_sum AS total,
+           COALESCE(p.Sentiment_Count, 0) + :delta_count AS cnt
+) v
+CROSS APPLY (
+    SELECT CASE WHEN v.cnt > 0 THEN v.total / v.cnt ELSE :fallback END AS score
+) sc
+WHERE p.Product_ID = :product_id
+""")
+
+
+def apply_sentiment_deltas(
+    db: Session,
+    rows: Sequence[Dict[str, Any]],
+    *,
+    positive_min: float,
+    neutral_min: float,
+) -> None:
+    """Bản set-based của apply_sentiment_delta: 1 executemany UPDATE cộng delta và
+    tính score + label ngay trên DB (không ghi giá trị tuyệt đối đọc từ trước, nên
+    delta của job khác ghi xen giữa không bị đè). Không commit.
+
+    rows: {Product_ID, delta_sum, delta_count, fallback} – fallback là score suy từ
+    Rating khi không còn review có text.
+    """
+    if not rows:
+        return
+    db.execute(_APPLY_SENTIMENT_DELTA_SQL, [
+        {
+            "product_id": int(r["Product_ID"]),
+            "delta_sum": float(r["delta_sum"]),
+            "delta_count": int(r["delta_count"]),
+            "fallback": r.get("fallback"),
+            "positive_min": positive_min,
+            "neutral_min": neutral_min,
+        }
+        for r in rows
+    ])
+
+
+def list_tiki_products_after(db: Session, *, after_id: int = 0, limit: int = 200) -> Sequence[Products]:
+    """Keyset page sản phẩm Tiki theo Product_ID (không OFFSET) cho job chạy hàng loạt."""
+    return (
+        db.query(Products)
+        .filter(
+            Products.Product_ID > after_id,
+            Products.Source == "Tiki",
+            Products.External_ID.isnot(None),
+        )
+        .order_by(Products.Product_ID)
+        .limit(limit)
+        .all()
+    )
+
+
 # =========================================================
 # BỔ SUNG CÁC HÀM THIẾU ĐỂ ROUTES KHÔNG LỖI
 # =========================================================
@@ -153,8 +307,10 @@ def delete(db: Session, product_id: int) -> bool:
     product = db.query(Products).filter(Products.Product_ID == product_id).first()
     if not product:
         return False
+    category_id = product.Category_ID
     db.delete(product)
     db.commit()
+    invalidate_product_caches(db, [product_id], [category_id])
     return True
 
 
@@ -178,23 +334,22 @@ def get_products_by_category_and_filters(
     limit: int = 20,
     is_vietnam_origin=False, is_vietnam_brand=False,
     positive_over=None,
+    cursor: Optional[str] = None,
+    exact_total: bool = False,
+    active_only: bool = False,
 ):
-    query = (
-        db.query(Products)
-        .join(Categories, Products.Category_ID == Categories.Category_ID)
+    count_key = _count_cache_key(
+        "category", lv1, lv2, lv3, lv4, lv5, min_price, max_price, brand, min_rating,
+        is_vietnam_origin, is_vietnam_brand, positive_over, active_only,
     )
+    query = db.query(Products)
 
-    # --- CATEGORY FILTER ---
-    if lv5:
-        query = query.filter(Categories.Category_Lv5 == lv5)
-    elif lv4:
-        query = query.filter(Categories.Category_Lv4 == lv4)
-    elif lv3:
-        query = query.filter(Categories.Category_Lv3 == lv3)
-    elif lv2:
-        query = query.filter(Categories.Category_Lv2 == lv2)
-    elif lv1:
-        query = query.filter(Categories.Category_Lv1 == lv1)
+    # --- CATEGORY FILTER (tên lv → Category_ID qua category index, không join) ---
+    category_ids = category_index.resolve_ids(db, lv1, lv2, lv3, lv4, lv5)
+    if category_ids is not None:
+        if not category_ids:
+            return [], 0, None
+        query = query.filter(_id_in(Products.Category_ID, category_ids))
 
     # --- PRICE ---
     if min_price is not None:
@@ -221,36 +376,21 @@ def get_products_by_category_and_filters(
     if positive_over is not None:
         query = query.filter(Products.Positive_Percent >= positive_over)
 
+    # --- ĐANG BÁN (listing public) ---
+    if active_only:
+        query = query.filter(Products.Is_Active == True)
+
     # --- AI SMART SCORE (DEFAULT SORT) ---
-    score_expr = (
-        (func.coalesce(Products.Sentiment_Score, 0) * 0.4)
-        + (func.coalesce(Products.Avg_Rating, 0) * 0.3)
-        + (func.log(func.coalesce(Products.Review_Count, 0) + 1) * 0.2)
-        + (func.coalesce(Products.Positive_Percent, 0) * 0.1)
+    # Cột persisted + index (Category_ID, Is_Active, Smart_Score) → không sort toàn bộ
+    score_expr = Products.Smart_Score
+
+    # --- SORT + PAGE ---
+    return _paginate(
+        query, sort, score_expr,
+        skip=skip, limit=limit, cursor=cursor,
+        count_key=count_key, exact_total=exact_total,
     )
 
-    # --- SORT ---
-    if not sort:
-        query = query.order_by(score_expr.desc())
-    else:
-        if sort == "price_asc":
-            query = query.order_by(Products.Price.asc())
-        elif sort == "price_desc":
-            query = query.order_by(Products.Price.desc())
-        elif sort == "rating_desc":
-            query = query.order_by(Products.Avg_Rating.desc())
-        elif sort == "review_desc":
-            query = query.order_by(Products.Review_Count.desc())
-        elif sort == "positive_desc":
-            query = query.order_by(Products.Positive_Percent.desc())
-        else:
-            query = query.order_by(score_expr.desc())  # fallback
-
-    total = query.count()
-    items = query.offset(skip).limit(limit).all()
-
-    return items, total
-
 def search_products_by_keyword_and_filters(
     db: Session,
     keyword: Optional[str] = None,
@@ -268,35 +408,28 @@ def search_products_by_keyword_and_filters(
     sort: Optional[str] = None,
     is_vietnam_origin: bool = False,
     is_vietnam_brand: bool = False,
-    positive_over: Optional[int] = None
+    positive_over: Optional[int] = None,
+    cursor: Optional[str] = None,
+    exact_total: bool = False,
+    active_only: bool = False,
+    mode: str = "keyword",
 ):
     query = db.query(Products)
 
-    # Join categories only when needed to avoid unnecessary cost
-    if any([lv1, lv2, lv3, lv4, lv5]):
-        query = query.join(Categories, Products.Category_ID == Categories.Category_ID)
-
-    # --- CATEGORY FILTER ---
-    if lv5:
-        query = query.filter(Categories.Category_Lv5 == lv5)
-    elif lv4:
-        query = query.filter(Categories.Category_Lv4 == lv4)
-    elif lv3:
-        query = query.filter(Categories.Category_Lv3 == lv3)
-    elif lv2:
-        query = query.filter(Categories.Category_Lv2 == lv2)
-    elif lv1:
-        query = query.filter(Categories.Category_Lv1 == lv1)
-
-    # --- SEARCH ---
+    # --- CATEGORY FILTER (tên lv → Category_ID qua category index, không join) ---
+    category_ids = category_index.resolve_ids(db, lv1, lv2, lv3, lv4, lv5)
+    if category_ids is not None:
+        if not category_ids:
+            return [], 0, None
+        query = query.filter(_id_in(Products.Category_ID, category_ids))
+
+    # --- SEARCH (keyword: inverted index bỏ dấu; semantic/hybrid: vector index) ---
+    text_scores: Dict[int, float] = {}
     if keyword:
-        kw = f"%{keyword.lower()}%"
-        query = query.filter(
-            or_(
-                func.lower(Products.Product_Name).like(kw),
-                func.lower(Products.Brand).like(kw),
-            )
-        )
+        text_scores = _candidate_scores(db, keyword, mode)
+        if not text_scores:
+            return [], 0, None
+        query = query.filter(_match_filter(text_scores))
 
     # --- FILTERS ---
     if brand:
@@ -321,36 +454,222 @@ def search_products_by_keyword_and_filters(
     if positive_over is not None:
         query = query.filter(Products.Positive_Percent >= positive_over)
 
+    if active_only:
+        query = query.filter(Products.Is_Active == True)
+
     # --- SCORE ---
-    score_expr = (
-        (func.coalesce(Products.Sentiment_Score, 0) * 0.4)
-        + (func.coalesce(Products.Avg_Rating, 0) * 0.3)
-        + (func.log(func.coalesce(Products.Review_Count, 0) + 1) * 0.2)
-        + (func.coalesce(Products.Positive_Percent, 0) * 0.1)
-    )
+    score_expr = Products.Smart_Score
 
     # --- SORT ---
-    if not sort:
-        query = query.order_by(score_expr.desc())
+    if text_scores and sort not in _EXPLICIT_SORTS:
+        # Mặc định: BM25 trộn smart score, xếp trong Python trên tập ứng viên đã lọc
+        return _page_by_blended_score(
+            db, query, score_expr, text_scores, skip=skip, limit=limit, cursor=cursor
+        )
+
+    count_key = _count_cache_key(
+        f"search:{mode}", search_index.fold(keyword), lv1, lv2, lv3, lv4, lv5, brand, min_price, max_price,
+        min_rating, is_vietnam_origin, is_vietnam_brand, positive_over, active_only,
+    )
+    return _paginate(
+        query, sort, score_expr,
+        skip=skip, limit=limit, cursor=cursor,
+        count_key=count_key, exact_total=exact_total,
+    )
+
+
+# Số ứng viên tối đa mỗi nguồn (top BM25 / top cosine): filter, sort, total và
+# facet chạy trên tập này, IN (...) literal luôn nhỏ, không nạp cả tập khớp mỗi request
+SEARCH_CANDIDATE_LIMIT = 2000
+# Trọng số BM25 so với smart score khi sort mặc định (cả hai chuẩn hoá về [0, 1])
+SEARCH_TEXT_WEIGHT = 0.6
+_EXPLICIT_SORTS = {"price_asc", "price_desc", "rating_desc", "review_desc", "positive_desc"}
+SEARCH_MODES = ("keyword", "semantic", "hybrid")
+# hybrid: trọng số cosine so với BM25 (cả hai chuẩn hoá theo max của tập ứng viên)
+HYBRID_SEMANTIC_WEIGHT = 0.5
+
+
+def _candidate_scores(db: Session, keyword: str, mode: str) -> Dict[int, float]:
+    """Product_ID → điểm liên quan: top SEARCH_CANDIDATE_LIMIT theo BM25 và/hoặc cosine.
+
+    Semantic không dùng được (inference service/model lỗi) → fallback keyword.
+    """
+    lexical = None
+    if mode != "semantic":
+        lexical = dict(search_index.search(db, keyword, limit=SEARCH_CANDIDATE_LIMIT))
+        if mode == "keyword":
+            return lexical
+
+    hits = semantic_index.search(db, keyword, limit=SEARCH_CANDIDATE_LIMIT)
+    if hits is None:
+        return lexical if lexical is not None else dict(
+            search_index.search(db, keyword, limit=SEARCH_CANDIDATE_LIMIT)
+        )
+    semantic = dict(hits)
+    if mode == "semantic" or not lexical:
+        return semantic
+    if not semantic:
+        return lexical
+
+    max_lex = max(lexical.values()) or 1.0
+    max_sem = max(semantic.values()) or 1.0
+    return {
+        pid: HYBRID_SEMANTIC_WEIGHT * semantic.get(pid, 0.0) / max_sem
+        + (1 - HYBRID_SEMANTIC_WEIGHT) * lexical.get(pid, 0.0) / max_lex
+        for pid in lexical.keys() | semantic.keys()
+    }
+
+
+def _match_filter(product_ids):
+    """Product_ID thuộc tập ứng viên của search (≤ 2 * SEARCH_CANDIDATE_LIMIT id)."""
+    return _id_in(Products.Product_ID, sorted(int(pid) for pid in product_ids))
+
+
+def _page_by_blended_score(
+    db: Session,
+    query,
+    score_expr,
+    text_scores: Dict[int, float],
+    *,
+    skip: int,
+    limit: int,
+    cursor: Optional[str] = None,
+):
+    rows = query.with_entities(Products.Product_ID, score_expr).all()
+    total = len(rows)
+    if not rows:
+        return [], 0, None
+
+    max_text = max(text_scores.values()) or 1.0
+    max_smart = max((float(s or 0) for _, s in rows), default=0.0) or 1.0
+    blended = sorted(
+        (
+            (
+                SEARCH_TEXT_WEIGHT * text_scores.get(pid, 0.0) / max_text
+                + (1 - SEARCH_TEXT_WEIGHT) * float(s or 0) / max_smart,
+                pid,
+            )
+            for pid, s in rows
+        ),
+        key=lambda t: (-t[0], t[1]),
+    )
+    start = skip
+    if cursor:
+        key, last_id = decode_cursor(cursor, "blend")
+        start = bisect.bisect_right([(-b, pid) for b, pid in blended], (-float(key), last_id))
+    page = blended[start:start + limit]
+    page_ids = [pid for _, pid in page]
+    if not page_ids:
+        return [], total, None
+    next_cursor = encode_cursor("blend", page[-1][0], page[-1][1]) if start + limit < total else None
+
+    by_id = {p.Product_ID: p for p in db.query(Products).filter(Products.Product_ID.in_(page_ids)).all()}
+    return [by_id[pid] for pid in page_ids if pid in by_id], total, next_cursor
+
+
+def _id_in(column, ids: Sequence[int]):
+    """column IN (...) với danh sách int render thẳng vào SQL.
+
+    Một lv1 có thể chứa hàng nghìn Category_ID, vượt giới hạn ~2100 tham số của
+    SQL Server nếu bind từng giá trị; int an toàn để inline.
+    """
+    return column.in_(bindparam("id_list", value=list(ids), expanding=True, literal_execute=True, unique=True))
+
+
+# =========================================================
+# Sort + phân trang (offset cũ hoặc keyset theo cursor)
+# =========================================================
+def _sort_spec(sort: Optional[str], score_expr):
+    """(tên sort ghi vào cursor, biểu thức sort, asc?)."""
+    if sort == "price_asc":
+        return "price_asc", Products.Price, True
+    if sort == "price_desc":
+        return "price_desc", Products.Price, False
+    if sort == "rating_desc":
+        return "rating_desc", Products.Avg_Rating, False
+    if sort == "review_desc":
+        return "review_desc", Products.Review_Count, False
+    if sort == "positive_desc":
+        return "positive_desc", Products.Positive_Percent, False
+    return "smart", score_expr, False  # mặc định / fallback
+
+
+def _seek_filter(expr, asc: bool, key, last_id: int):
+    """Các dòng đứng sau (key, last_id) theo ORDER BY expr, Product_ID cùng chiều.
+
+    SQL Server: NULL đứng đầu khi ASC, đứng cuối khi DESC.
+    """
+    pid = Products.Product_ID
+    if asc:
+        if key is None:
+            return or_(and_(expr.is_(None), pid > last_id), expr.isnot(None))
+        return or_(expr > key, and_(expr == key, pid > last_id))
+    if key is None:
+        return and_(expr.is_(None), pid < last_id)
+    return or_(expr < key, expr.is_(None), and_(expr == key, pid < last_id))
+
+
+def _paginate(
+    query,
+    sort: Optional[str],
+    score_expr,
+    *,
+    skip: int,
+    limit: int,
+    cursor: Optional[str],
+    count_key: str,
+    exact_total: bool = False,
+):
+    """Trả (items, total, next_cursor) – trang + tổng trong 1 round trip khi có thể.
+
+    Có cursor → seek từ dòng cuối trang trước (bỏ qua skip) nên trang sâu tốn như trang 1.
+    Không có cursor → OFFSET skip như cũ. Product_ID làm tie-breaker để thứ tự ổn định.
+
+    Tổng: không cursor thì lấy COUNT(*) OVER() đi kèm từng dòng của trang (chính xác).
+    Trang theo cursor (hoặc trang rỗng) dùng tổng đã cache theo bộ lọc trong
+    COUNT_CACHE_TTL giây; exact_total=True hoặc cache miss mới chạy COUNT riêng.
+    """
+    name, expr, asc = _sort_spec(sort, score_expr)
+    page_query = query
+    if cursor:
+        key, last_id = decode_cursor(cursor, name)
+        page_query = query.filter(_seek_filter(expr, asc, key, last_id))
+        skip = 0
+
+    order = (expr.asc(), Products.Product_ID.asc()) if asc else (expr.desc(), Products.Product_ID.desc())
+    columns = [expr.label("sort_key")]
+    if not cursor:
+        columns.append(func.count().over().label("total_count"))
+    rows = (
+        page_query.add_columns(*columns)
+        .order_by(*order)
+        .offset(skip)
+        .limit(limit + 1)
+        .all()
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = [row[0] for row in rows]
+    next_cursor = encode_cursor(name, rows[-1][1], items[-1].Product_ID) if has_more else None
+
+    if not cursor and (rows or skip == 0):
+        total = int(rows[0][2]) if rows else 0
     else:
-        if sort == "price_asc":
-            query = query.order_by(Products.Price.asc())
-        elif sort == "price_desc":
-            query = query.order_by(Products.Price.desc())
-        elif sort == "rating_desc":
-            query = query.order_by(Products.Avg_Rating.desc())
-        elif sort == "review_desc":
-            query = query.order_by(Products.Review_Count.desc())
-        elif sort == "positive_desc":
-            query = query.order_by(Products.Positive_Percent.desc())
-        else:
-            query = query.order_by(score_expr.desc())  # fallback
+        cached = None if exact_total else get_json(count_key)
+        if cached is not None:
+            return items, int(cached), next_cursor
+        total = query.count()
+    set_json(count_key, total, ttl_seconds=COUNT_CACHE_TTL)
+    return items, total, next_cursor
+
 
-    total = query.count()
-    items = query.offset(skip).limit(limit).all()
+# Tổng theo bộ lọc (không phụ thuộc sort/trang) cache ngắn cho các trang theo cursor
+COUNT_CACHE_TTL = 120
 
-    return items, total
 
+def _count_cache_key(kind: str, *filters) -> str:
+    digest = hashlib.sha1(repr(filters).encode("utf-8")).hexdigest()
+    return f"cache:count:products:{kind}:{digest}"
 
 
 def get_tiki_products_older_than(db: Session, *, hours: int) -> Sequence[Products]:
@@ -396,11 +715,10 @@ def get_outstanding_product(
 
     search_count = func.coalesce(search_counts_sq.c.search_count, 0)
 
+    # Smart_Score dùng trọng số sentiment 0.4; ở đây giữ 0.35 như cũ
     score_expr = (
-        (func.coalesce(Products.Sentiment_Score, 0) * 0.35)
-        + (func.coalesce(Products.Avg_Rating, 0) * 0.3)
-        + (func.log(func.coalesce(Products.Review_Count, 0) + 1) * 0.2)
-        + (func.coalesce(Products.Positive_Percent, 0) * 0.1)
+        Products.Smart_Score
+        - (func.coalesce(Products.Sentiment_Score, 0) * 0.05)
         + (func.log(search_count + 1) * 0.05)  # Điểm cộng từ lượt tìm kiếm
     )
 
@@ -423,3 +741,143 @@ def get_outstanding_product(
         .limit(limit)
         .all()
     )
+
+
+# =========================================================
+# Nhãn sentiment → 3 nhóm (nhãn cũ có cả tiếng Việt)
+# =========================================================
+SENTIMENT_POSITIVE_LABELS = [
+    "positive", "tốt", "tot", "tích cực", "tich cuc", "tichcuc",
+    "tuyệt vời", "tuyet voi", "hài lòng", "hai long",
+]
+SENTIMENT_NEGATIVE_LABELS = [
+    "negative", "kém", "kem", "xấu", "xau", "tệ", "te",
+    "thất vọng", "that vong", "không tốt", "khong tot",
+]
+
+
+def sentiment_predicates():
+    """(positive, negative) điều kiện SQL trên Sentiment_Label; còn lại là neutral."""
+    label = func.lower(func.trim(func.coalesce(Products.Sentiment_Label, "")))
+    return label.in_(SENTIMENT_POSITIVE_LABELS), label.in_(SENTIMENT_NEGATIVE_LABELS)
+
+
+# =========================================================
+# Facets: đếm theo brand / giá / rating / positive / Việt Nam
+# =========================================================
+# Mốc giá (VND) cho histogram; bucket i = [edge[i], edge[i+1])
+PRICE_BUCKET_EDGES = [0, 100_000, 200_000, 500_000, 1_000_000, 2_000_000, 5_000_000, 10_000_000]
+# Ngưỡng tương ứng filter min_rating / positive_over của listing (đếm cộng dồn "≥ x")
+RATING_THRESHOLDS = [1, 2, 3, 4, 5]
+POSITIVE_THRESHOLDS = [50, 70, 80, 90]
+FACET_BRAND_LIMIT = 50
+
+
+def _bucket_expr(column, edges: Sequence[float]):
+    """CASE → chỉ số bucket theo mốc tăng dần; NULL hoặc dưới mốc đầu → -1."""
+    whens = [(column >= edge, i) for i, edge in reversed(list(enumerate(edges)))]
+    return case(*whens, else_=-1)
+
+
+def get_facet_counts(
+    db: Session,
+    *,
+    keyword: Optional[str] = None,
+    lv1=None, lv2=None, lv3=None, lv4=None, lv5=None,
+    active_only: bool = True,
+) -> Dict[str, Any]:
+    """Facet counts cho phạm vi danh mục/từ khoá hiện tại trong 1 câu GROUPING SETS."""
+    query = db.query(Products)
+    category_ids = category_index.resolve_ids(db, lv1, lv2, lv3, lv4, lv5)
+    if category_ids is not None:
+        if not category_ids:
+            return _facets_from_rows([])
+        query = query.filter(_id_in(Products.Category_ID, category_ids))
+    if keyword:
+        text_scores = search_index.search(db, keyword, limit=SEARCH_CANDIDATE_LIMIT)
+        if not text_scores:
+            return _facets_from_rows([])
+        query = query.filter(_match_filter(pid for pid, _ in text_scores))
+    if active_only:
+        query = query.filter(Products.Is_Active == True)
+
+    vn = "%việt nam%"
+    scoped = query.with_entities(
+        Products.Brand.label("brand"),
+        _bucket_expr(Products.Price, PRICE_BUCKET_EDGES).label("price_b"),
+        _bucket_expr(Products.Avg_Rating, RATING_THRESHOLDS).label("rating_b"),
+        _bucket_expr(Products.Positive_Percent, POSITIVE_THRESHOLDS).label("positive_b"),
+        case((func.lower(Products.Origin).like(vn), 1), else_=0).label("vn_origin"),
+        case((func.lower(Products.Brand_country).like(vn), 1), else_=0).label("vn_brand"),
+    ).subquery()
+
+    dims = [scoped.c.brand, scoped.c.price_b, scoped.c.rating_b, scoped.c.positive_b, scoped.c.vn_origin, scoped.c.vn_brand]
+    rows = (
+        db.query(*dims, func.count().label("n"), *[func.grouping(d) for d in dims])
+        .group_by(func.grouping_sets(*[tuple_(d) for d in dims]))
+        .all()
+    )
+    return _facets_from_rows(rows)
+
+
+def _facets_from_rows(rows) -> Dict[str, Any]:
+    brands: Dict[str, int] = {}
+    price = [0] * len(PRICE_BUCKET_EDGES)
+    rating = [0] * len(RATING_THRESHOLDS)
+    positive = [0] * len(POSITIVE_THRESHOLDS)
+    total = vn_origin = vn_brand = 0
+
+    for row in rows:
+        brand, price_b, rating_b, positive_b, is_vn_origin, is_vn_brand, n = row[:7]
+        grouping = row[7:]
+        n = int(n)
+        # GROUPING(col) = 0 → dòng thuộc grouping set của cột đó
+        if grouping[0] == 0:
+            if brand:
+                brands[brand] = brands.get(brand, 0) + n
+        elif grouping[1] == 0:
+            total += n  # mỗi sản phẩm thuộc đúng 1 bucket giá (kể cả -1)
+            if price_b >= 0:
+                price[price_b] += n
+        elif grouping[2] == 0:
+            if rating_b >= 0:
+                rating[rating_b] += n
+        elif grouping[3] == 0:
+            if positive_b >= 0:
+                positive[positive_b] += n
+        elif grouping[4] == 0:
+            if is_vn_origin:
+                vn_origin += n
+        elif grouping[5] == 0:
+            if is_vn_brand:
+                vn_brand += n
+
+    edges = PRICE_BUCKET_EDGES + [None]
+    top_brands = sorted(brands.items(), key=lambda kv: (-kv[1], kv[0]))[:FACET_BRAND_LIMIT]
+
+    def _at_least(counts: List[int]) -> List[int]:
+        # bucket i = [t_i, t_{i+1}) → cộng dồn từ cao xuống để ra "≥ t_i"
+        out, acc = [], 0
+        for c in reversed(counts):
+            acc += c
+            out.append(acc)
+        return out[::-1]
+
+    return {
+        "total": total,
+        "brands": [{"value": b, "count": c} for b, c in top_brands],
+        "price": [
+            {"min": edges[i], "max": edges[i + 1], "count": c}
+            for i, c in enumerate(price)
+        ],
+        "rating": [
+            {"min_rating": t, "count": c}
+            for t, c in zip(RATING_THRESHOLDS, _at_least(rating))
+        ],
+        "positive": [
+            {"positive_over": t, "count": c}
+            for t, c in zip(POSITIVE_THRESHOLDS, _at_least(positive))
+        ],
+        "vietnam_origin": vn_origin,
+        "vietnam_brand": vn_brand,
+    }
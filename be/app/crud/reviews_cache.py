@@ -0,0 +1,69 @@
+from typing import Any, Dict, Sequence
+
+from sqlalchemy.orm import Session
+
+from ..models.reviews_cache import Reviews_Cache
+
+
+def list_keys_for_product(db: Session, product_id: int):
+    """Projection nhẹ (không load ORM object) để diff với review hiện tại."""
+    return (
+        db.query(
+            Reviews_Cache.Cache_ID,
+            Reviews_Cache.Source,
+            Reviews_Cache.Review_Key,
+            Reviews_Cache.Text_Hash,
+            Reviews_Cache.Score,
+            Reviews_Cache.Has_Text,
+        )
+        .filter(Reviews_Cache.Product_ID == product_id)
+        .all()
+    )
+
+
+def add_many(db: Session, rows: Sequence[Dict[str, Any]]) -> None:
+    if rows:
+        db.bulk_insert_mappings(Reviews_Cache, list(rows))
+
+
+def update_many(db: Session, rows: Sequence[Dict[str, Any]]) -> None:
+    """rows: dict có Cache_ID + các cột cần sửa."""
+    if rows:
+        db.bulk_update_mappings(Reviews_Cache, list(rows))
+
+
+def delete_ids(db: Session, cache_ids: Sequence[int]) -> None:
+    ids = list(cache_ids)
+    # SQL Server giới hạn ~2100 tham số / câu lệnh
+    for i in range(0, len(ids), 1000):
+        (
+            db.query(Reviews_Cache)
+            .filter(Reviews_Cache.Cache_ID.in_(ids[i:i + 1000]))
+            .delete(synchronize_session=False)
+        )
+
+
+def rating_only_average(db: Session, product_id: int):
+    """Trung bình score suy từ Rating của các review không có comment."""
+    from sqlalchemy import func
+
+    return (
+        db.query(func.avg(Reviews_Cache.Score))
+        .filter(Reviews_Cache.Product_ID == product_id, Reviews_Cache.Has_Text.is_(False))
+        .scalar()
+    )
+
+
+def rating_only_averages(db: Session, product_ids: Sequence[int]) -> Dict[int, float]:
+    """Như rating_only_average nhưng cho nhiều sản phẩm trong 1 câu GROUP BY."""
+    from sqlalchemy import func
+
+    if not product_ids:
+        return {}
+    rows = (
+        db.query(Reviews_Cache.Product_ID, func.avg(Reviews_Cache.Score))
+        .filter(Reviews_Cache.Product_ID.in_(list(product_ids)), Reviews_Cache.Has_Text.is_(False))
+        .group_by(Reviews_Cache.Product_ID)
+        .all()
+    )
+    return {int(pid): float(avg) for pid, avg in rows if avg is not None}
@@ -32,5 +32,7 @@ def get_db():
 def init_db() -> None:
     # Import package which registers all models via app/models/__init__.py
     from . import models  # noqa: F401
+    from .migrations import run_migrations
 
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
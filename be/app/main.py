@@ -23,7 +23,11 @@ try:
     from .routes import admin, users, products, search_history, favorite, reviews as user_reviews
     from .routes.categories import router as category_router
     from .tasks.auto_update_batch import enqueue_auto_update_chunked
+    from .tasks.embeddings import enqueue_embed_changed
+    from .tasks.category_stats import enqueue_category_stats_changed
     from .services.system_flag_service import is_auto_update_enabled
+    from .services import autocomplete_index, search_index
+    from .rq_conn import close_async_redis
 except Exception:
     parent_dir = Path(__file__).resolve().parent.parent
     if str(parent_dir) not in sys.path:
@@ -35,7 +39,11 @@ except Exception:
     from app.routes import admin, users, products, search_history, favorite, reviews as user_reviews
     from app.routes.categories import router as category_router
     from app.tasks.auto_update_batch import enqueue_auto_update_chunked
+    from app.tasks.embeddings import enqueue_embed_changed
+    from app.tasks.category_stats import enqueue_category_stats_changed
     from app.services.system_flag_service import is_auto_update_enabled
+    from app.services import autocomplete_index, search_index
+    from app.rq_conn import close_async_redis
 
 
 # ============================================================
@@ -111,6 +119,36 @@ def start_scheduler() -> None:
         finally:
             db.close()
 
+    @scheduler.scheduled_job(
+        "interval",
+        minutes=5,
+        max_instances=1,
+        coalesce=True,
+    )
+    def scheduled_embeddings() -> None:
+        # Lưới an toàn cho ghi Products ngoài crawl job (admin, auto update...)
+        try:
+            job_id = enqueue_embed_changed()
+            if job_id:
+                print(f"[Scheduler] Enqueued embeddings job id={job_id}")
+        except Exception as exc:
+            print(f"[Scheduler] Embeddings job failed: {exc}")
+
+    @scheduler.scheduled_job(
+        "interval",
+        minutes=1,
+        max_instances=1,
+        coalesce=True,
+    )
+    def scheduled_category_stats() -> None:
+        # Tính lại Category_Stats của các danh mục có sản phẩm vừa ghi (tập dirty rỗng → job rất nhẹ)
+        try:
+            job_id = enqueue_category_stats_changed()
+            if job_id:
+                print(f"[Scheduler] Enqueued category stats job id={job_id}")
+        except Exception as exc:
+            print(f"[Scheduler] Category stats job failed: {exc}")
+
     scheduler.start()
     print("[Scheduler] Started successfully!")
     try:
@@ -135,6 +173,13 @@ def on_startup() -> None:
     init_db()
     print("[App] DB initialized")
     start_scheduler_in_background()
+    search_index.warm_up_in_background()
+    autocomplete_index.warm_up_in_background()
+
+
+@app.on_event("shutdown")
+async def on_shutdown() -> None:
+    await close_async_redis()
 
 
 # ============================================================
@@ -0,0 +1,74 @@
+"""Idempotent DDL cho thay đổi schema trên bảng đã tồn tại.
+
+Base.metadata.create_all chỉ tạo bảng mới, không ALTER bảng cũ, nên cột/index
+thêm sau được khai báo ở đây và chạy mỗi lần init_db (mỗi câu tự kiểm tra tồn tại).
+"""
+from sqlalchemy.engine import Engine
+
+from .models.products import SMART_SCORE_INDEX, SMART_SCORE_SQL
+
+MIGRATIONS = [
+    (
+        "Products.Sentiment_Sum",
+        "IF COL_LENGTH('Products', 'Sentiment_Sum') IS NULL "
+        "ALTER TABLE Products ADD Sentiment_Sum FLOAT NULL",
+    ),
+    (
+        "Products.Sentiment_Count",
+        "IF COL_LENGTH('Products', 'Sentiment_Count') IS NULL "
+        "ALTER TABLE Products ADD Sentiment_Count INT NULL",
+    ),
+    (
+        # Dòng cũ Is_Active NULL → coi là đang bán (listing public lọc Is_Active = 1)
+        "Products.Is_Active backfill",
+        "UPDATE Products SET Is_Active = 1 WHERE Is_Active IS NULL",
+    ),
+    (
+        "Products.Smart_Score",
+        "IF COL_LENGTH('Products', 'Smart_Score') IS NULL "
+        f"ALTER TABLE Products ADD Smart_Score AS ({SMART_SCORE_SQL}) PERSISTED",
+    ),
+    (
+        f"Products.{SMART_SCORE_INDEX}",
+        "IF NOT EXISTS (SELECT 1 FROM sys.indexes "
+        f"WHERE name = '{SMART_SCORE_INDEX}' AND object_id = OBJECT_ID('Products')) "
+        f"CREATE INDEX {SMART_SCORE_INDEX} ON Products (Category_ID, Is_Active, Smart_Score)",
+    ),
+    (
+        "Categories.Parent_ID",
+        "IF COL_LENGTH('Categories', 'Parent_ID') IS NULL "
+        "ALTER TABLE Categories ADD Parent_ID INT NULL",
+    ),
+    (
+        "Categories.FK_Categories_Parent",
+        "IF OBJECT_ID('FK_Categories_Parent', 'F') IS NULL "
+        "ALTER TABLE Categories ADD CONSTRAINT FK_Categories_Parent "
+        "FOREIGN KEY (Parent_ID) REFERENCES Categories (Category_ID)",
+    ),
+    (
+        "Categories.ix_Categories_Parent_ID",
+        "IF NOT EXISTS (SELECT 1 FROM sys.indexes "
+        "WHERE name = 'ix_Categories_Parent_ID' AND object_id = OBJECT_ID('Categories')) "
+        "CREATE INDEX ix_Categories_Parent_ID ON Categories (Parent_ID)",
+    ),
+    (
+        # Dòng cũ: cha = dòng cùng Source có path = path bỏ " > <level cuối>".
+        # Cha chưa tồn tại → scripts/backfill_category_parents tạo rồi nối.
+        "Categories.Parent_ID backfill",
+        "UPDATE c SET Parent_ID = p.Category_ID "
+        "FROM Categories c "
+        "CROSS APPLY (SELECT CHARINDEX(' > ', REVERSE(c.Category_Path)) AS pos) r "
+        "JOIN Categories p ON p.Source = c.Source AND p.Category_Path = LEFT(c.Category_Path, "
+        "CASE WHEN r.pos > 0 THEN LEN(c.Category_Path) - r.pos - 2 ELSE 0 END) "
+        "WHERE c.Parent_ID IS NULL AND r.pos > 0",
+    ),
+]
+
+
+def run_migrations(engine: Engine) -> None:
+    for name, sql in MIGRATIONS:
+        try:
+            with engine.begin() as conn:
+                conn.exec_driver_sql(sql)
+        except Exception as exc:
+            print(f"[Migration] {name} failed: {exc}")
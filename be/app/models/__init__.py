@@ -10,6 +10,9 @@ from . import (
     favorites,  # noqa: F401
     user_reviews,  # noqa: F401
     product_view,  # noqa: F401
+    reviews_cache,  # noqa: F401
+    product_embeddings,  # noqa: F401
+    category_stats,  # noqa: F401
 )
 
 __all__ = [
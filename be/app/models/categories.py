@@ -1,5 +1,5 @@
 from sqlalchemy import (
-    Column, Integer, Unicode, DateTime, BigInteger, UniqueConstraint, SmallInteger, func
+    Column, Integer, Unicode, DateTime, BigInteger, UniqueConstraint, SmallInteger, ForeignKey, func
 )
 from sqlalchemy.orm import relationship
 
@@ -21,8 +21,13 @@ class Categories(Base):
     Category_Lv5 = Column(Unicode(150))
     Category_Path = Column(Unicode(600), nullable=False)
     Level_Count = Column(SmallInteger)
+    # Danh mục cha trực tiếp (path bỏ level cuối); NULL với danh mục cấp 1.
+    # crud.categories.create_category tự tạo cha còn thiếu nên chuỗi cha luôn đủ.
+    Parent_ID = Column(Integer, ForeignKey("Categories.Category_ID"), nullable=True, index=True)
     Created_At = Column(DateTime, server_default=func.sysutcdatetime())
     Updated_At = Column(DateTime, server_default=func.sysutcdatetime(), onupdate=func.sysutcdatetime())
 
     # Relationships
     products = relationship("Products", back_populates="category", cascade="all, delete")
+    parent = relationship("Categories", remote_side=[Category_ID], back_populates="children")
+    children = relationship("Categories", back_populates="parent")
@@ -0,0 +1,29 @@
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Integer, func
+
+from ..database import Base
+
+
+class Category_Stats(Base):
+    """Tổng hợp sản phẩm thuộc TRỰC TIẾP từng danh mục (job tasks/category_stats.py).
+
+    Lưu tổng + số đếm thay vì trung bình để cộng dồn được lên danh mục cha
+    (services/category_tree). Giá/rating/sentiment chỉ tính sản phẩm đang bán.
+    """
+
+    __tablename__ = "Category_Stats"
+
+    Category_ID = Column(
+        Integer, ForeignKey("Categories.Category_ID", ondelete="CASCADE"), primary_key=True
+    )
+    Product_Count = Column(Integer, nullable=False, default=0)
+    Active_Count = Column(Integer, nullable=False, default=0)
+    Price_Sum = Column(Float, nullable=False, default=0)
+    Price_Count = Column(Integer, nullable=False, default=0)
+    Rating_Sum = Column(Float, nullable=False, default=0)
+    Rating_Count = Column(Integer, nullable=False, default=0)
+    Positive_Count = Column(Integer, nullable=False, default=0)
+    Neutral_Count = Column(Integer, nullable=False, default=0)
+    Negative_Count = Column(Integer, nullable=False, default=0)
+    Updated_At = Column(
+        DateTime, server_default=func.sysutcdatetime(), onupdate=func.sysutcdatetime(), nullable=False
+    )
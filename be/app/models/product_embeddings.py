@@ -0,0 +1,25 @@
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Index, Integer, LargeBinary, String, func
+
+from ..database import Base
+
+
+class Product_Embeddings(Base):
+    """Vector ngữ nghĩa của sản phẩm (tên + brand + danh mục), lượng tử hoá int8."""
+
+    __tablename__ = "Product_Embeddings"
+    __table_args__ = (
+        Index("IX_ProductEmbeddings_Model_Updated", "Model_Key", "Updated_At"),
+    )
+
+    Product_ID = Column(
+        Integer, ForeignKey("Products.Product_ID", ondelete="CASCADE"), primary_key=True
+    )
+    # "<model>@<revision>" – đổi model/backend thì vector cũ không còn dùng được
+    Model_Key = Column(String(120), nullable=False)
+    Text_Hash = Column(String(40), nullable=False)
+    # int8[dim], giá trị thật ≈ Vector * Scale (vector gốc đã L2-normalize)
+    Vector = Column(LargeBinary, nullable=False)
+    Scale = Column(Float, nullable=False)
+    Updated_At = Column(
+        DateTime, server_default=func.sysutcdatetime(), onupdate=func.sysutcdatetime(), nullable=False
+    )
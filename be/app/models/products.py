@@ -1,17 +1,29 @@
 from sqlalchemy import (
     Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Unicode, UnicodeText,
-    BigInteger, DECIMAL, Text, UniqueConstraint, func
+    BigInteger, DECIMAL, Text, UniqueConstraint, Computed, Index, func
 )
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
 from ..database import Base
 
+# "AI smart score" – sort mặc định của listing/search. Là computed column PERSISTED
+# nên SQL Server tự tính lại khi bất kỳ cột đầu vào nào đổi (crawl, refresh,
+# sentiment bulk update...) và có thể index được.
+SMART_SCORE_SQL = (
+    "COALESCE([Sentiment_Score], 0) * 0.4"
+    " + COALESCE([Avg_Rating], 0) * 0.3"
+    " + LOG(COALESCE([Review_Count], 0) + 1) * 0.2"
+    " + COALESCE([Positive_Percent], 0) * 0.1"
+)
+SMART_SCORE_INDEX = "IX_Products_Category_Active_SmartScore"
+
 
 class Products(Base):
     __tablename__ = "Products"
     __table_args__ = (
         UniqueConstraint("External_ID", name="UQ_Products_ExternalID"),
+        Index(SMART_SCORE_INDEX, "Category_ID", "Is_Active", "Smart_Score"),
     )
 
     Product_ID = Column(Integer, primary_key=True, index=True)
@@ -29,10 +41,14 @@ class Products(Base):
     Positive_Percent = Column(Float)
     Sentiment_Score = Column(Float)
     Sentiment_Label = Column(Unicode(50))
+    # Tổng/đếm score các review có text trong Reviews_Cache (cập nhật theo delta)
+    Sentiment_Sum = Column(Float, nullable=True)
+    Sentiment_Count = Column(Integer, nullable=True)
     Brand_country = Column(Unicode(50))
     Origin = Column(Unicode(255))
     Is_Authentic = Column(Boolean, default=True)
     Is_Active = Column(Boolean, default=True)
+    Smart_Score = Column(Float, Computed(SMART_SCORE_SQL, persisted=True))
 
     Created_At = Column(
         DateTime(timezone=False),
@@ -0,0 +1,29 @@
+from sqlalchemy import (
+    Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, String, UniqueConstraint, func
+)
+from sqlalchemy.orm import relationship
+
+from ..database import Base
+
+
+class Reviews_Cache(Base):
+    """Score sentiment của từng review (Tiki + User) đã chấm, để cập nhật tăng dần."""
+
+    __tablename__ = "Reviews_Cache"
+    __table_args__ = (
+        UniqueConstraint("Product_ID", "Source", "Review_Key", name="UQ_ReviewsCache_Product_Source_Key"),
+        Index("IX_ReviewsCache_Product", "Product_ID"),
+    )
+
+    Cache_ID = Column(Integer, primary_key=True, index=True)
+    Product_ID = Column(Integer, ForeignKey("Products.Product_ID", ondelete="CASCADE"), nullable=False)
+    Source = Column(String(20), nullable=False)  # "Tiki" | "User"
+    # Tiki: "<text_hash>#<n>" (n = lần xuất hiện thứ n của cùng nội dung); User: "<Review_ID>"
+    Review_Key = Column(String(80), nullable=False)
+    Text_Hash = Column(String(40), nullable=False)
+    Score = Column(Float, nullable=False)
+    # False = review user không có comment → score suy từ Rating, không vào Sentiment_Sum
+    Has_Text = Column(Boolean, nullable=False, default=True)
+    Updated_At = Column(DateTime, server_default=func.sysutcdatetime(), onupdate=func.sysutcdatetime())
+
+    product = relationship("Products")
@@ -19,6 +19,7 @@ from ..models.products import Products
 from ..schemas.products import ProductCreate, ProductUpdate
 from ..schemas.users import UserCreate
 from ..services import admin_service, user_service
+from ..utils.cursor import InvalidCursor
 from ..services.product_service import (
     filter_products_service,
     get_outstanding_product_service,
@@ -265,21 +266,28 @@ def admin_search_products(
     brand: Optional[str] = None,
     min_rating: Optional[float] = None,
     sort: Optional[str] = None,
+    cursor: Optional[str] = None,
+    exact_total: bool = False,
     db: Session = Depends(get_db),
 ):
-    items, total = search_products_service(
-        db=db,
-        keyword=q.strip(),
-        limit=limit,
-        skip=skip,
-        brand=brand,
-        min_price=min_price,
-        max_price=max_price,
-        min_rating=min_rating,
-        sort=sort,
-    )
+    try:
+        items, total, next_cursor = search_products_service(
+            db=db,
+            keyword=q.strip(),
+            limit=limit,
+            skip=skip,
+            brand=brand,
+            min_price=min_price,
+            max_price=max_price,
+            min_rating=min_rating,
+            sort=sort,
+            cursor=cursor,
+            exact_total=exact_total,
+        )
+    except InvalidCursor as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
     results = [_serialize_product(p) for p in items]
-    return {"total": total, "count": len(results), "results": results}
+    return {"total": total, "count": len(results), "next_cursor": next_cursor, "results": results}
 
 
 @router.get("/products/by-category", dependencies=[Depends(require_admin)], operation_id="admin_filter_products_by_category")
@@ -299,32 +307,40 @@ def admin_filter_products_by_category(
     is_vietnam_origin: bool = False,
     is_vietnam_brand: bool = False,
     positive_over: Optional[int] = None,
+    cursor: Optional[str] = None,
+    exact_total: bool = False,
     db: Session = Depends(get_db),
 ):
-    items, total = filter_products_service(
-        db=db,
-        lv1=lv1,
-        lv2=lv2,
-        lv3=lv3,
-        lv4=lv4,
-        lv5=lv5,
-        min_price=min_price,
-        max_price=max_price,
-        brand=brand,
-        min_rating=min_rating,
-        sort=sort,
-        skip=skip,
-        limit=limit,
-        is_vietnam_origin=is_vietnam_origin,
-        is_vietnam_brand=is_vietnam_brand,
-        positive_over=positive_over,
-    )
+    try:
+        items, total, next_cursor = filter_products_service(
+            db=db,
+            lv1=lv1,
+            lv2=lv2,
+            lv3=lv3,
+            lv4=lv4,
+            lv5=lv5,
+            min_price=min_price,
+            max_price=max_price,
+            brand=brand,
+            min_rating=min_rating,
+            sort=sort,
+            skip=skip,
+            limit=limit,
+            is_vietnam_origin=is_vietnam_origin,
+            is_vietnam_brand=is_vietnam_brand,
+            positive_over=positive_over,
+            cursor=cursor,
+            exact_total=exact_total,
+        )
+    except InvalidCursor as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
     results = [_serialize_product(p) for p in items]
     return {
         "total": total,
         "skip": skip,
         "limit": limit,
         "count": len(results),
+        "next_cursor": next_cursor,
         "results": results,
     }
 
@@ -1,71 +1,56 @@
-﻿from fastapi import APIRouter, Depends
+﻿from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.models.categories import Categories
-from ..cache import get_json, set_json
+from ..services import category_tree
 
 router = APIRouter(prefix="/categories", tags=["Categories"])
 
-@router.get("/tree")
-def get_categories_tree(db: Session = Depends(get_db)):
-    """
-    Trả về toàn bộ danh mục dạng cây (nested JSON).
-    """
-    cache_key = "cache:category:tree"
-    cached = get_json(cache_key)
-    if cached:
-        return cached
-
-    rows = (
-        db.query(
-            Categories.Category_Lv1,
-            Categories.Category_Lv2,
-            Categories.Category_Lv3,
-            Categories.Category_Lv4,
-            Categories.Category_Lv5,
-        )
-        .filter(Categories.Category_Lv1.isnot(None))
-        .all()
-    )
-
-    tree = {}
-
-    for r in rows:
-        lv1, lv2, lv3, lv4, lv5 = r
+# Cây lấy từ bản in-memory (services/category_tree); client giữ bản cũ và hỏi lại
+# với If-None-Match → 304 khi không đổi
+TREE_CACHE_CONTROL = "public, max-age=60"
 
-        if lv1 not in tree:
-            tree[lv1] = {"name": lv1, "children": {}}
 
-        node = tree[lv1]["children"]
+def _tree_response(request: Request, rendered) -> Response:
+    version, etag, body = rendered
+    headers = {"ETag": etag, "Cache-Control": TREE_CACHE_CONTROL, "X-Category-Tree-Version": str(version)}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
-        if lv2:
-            if lv2 not in node:
-                node[lv2] = {"name": lv2, "children": {}}
-            node = node[lv2]["children"]
 
-        if lv3:
-            if lv3 not in node:
-                node[lv3] = {"name": lv3, "children": {}}
-            node = node[lv3]["children"]
-
-        if lv4:
-            if lv4 not in node:
-                node[lv4] = {"name": lv4, "children": {}}
-            node = node[lv4]["children"]
-
-        if lv5:
-            if lv5 not in node:
-                node[lv5] = {"name": lv5, "children": {}}
-
-    def dict_to_list(node_dict):
-        return [
-            {
-                "name": v["name"],
-                "children": dict_to_list(v["children"]) if v["children"] else [],
-            }
-            for v in node_dict.values()
-        ]
-
-    result = dict_to_list(tree)
-    set_json(cache_key, result, ttl_seconds=21600)
-    return result
+@router.get("/tree")
+def get_categories_tree(
+    request: Request,
+    depth: Optional[int] = Query(None, ge=1, le=5),
+    stats: bool = False,
+    db: Session = Depends(get_db),
+):
+    """
+    Trả về danh mục dạng cây (nested JSON).
+    depth: số level trả về (vd 2 cho lần hiển thị đầu); node bị cắt có has_children
+    để tải tiếp qua /categories/subtree.
+    stats: kèm số sản phẩm / giá, rating TB / sentiment của cả cây con mỗi node.
+    """
+    return _tree_response(request, category_tree.render(db, (), depth, with_stats=stats))
+
+
+@router.get("/subtree")
+def get_categories_subtree(
+    request: Request,
+    path: str = Query(..., description="Đường dẫn danh mục, vd 'Nhà Cửa - Đời Sống > Dụng cụ nhà bếp'"),
+    depth: Optional[int] = Query(None, ge=1, le=5),
+    stats: bool = False,
+    db: Session = Depends(get_db),
+):
+    """Cây con tại path (không phân biệt hoa/thường), sâu tối đa depth level."""
+    names = category_tree.parse_path(path)
+    if not names:
+        raise HTTPException(status_code=400, detail="path không hợp lệ")
+    rendered = category_tree.render(db, names, depth, with_stats=stats)
+    if rendered is None:
+        raise HTTPException(status_code=404, detail="Không tìm thấy danh mục")
+    return _tree_response(request, rendered)
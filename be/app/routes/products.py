@@ -6,17 +6,18 @@ from app.models.products import Products
 from app.models.categories import Categories
 import math
 from ..database import get_db
-from ..services import crawler_tiki_service as tiki
-from ..services import barcode_service
 from ..services.product_service import filter_products_service
 from ..crud import products as product_crud
 from ..core.security import get_optional_user
 from ..services.search_history_service import save_search_history
 from ..services.view_history_service import add_view_history
-from ..services.chat_intent_service import parse_search_intent
-from ..services.product_service import search_products_service
-from ..tasks.crawler import enqueue_crawl_keyword, enqueue_crawl_barcode, enqueue_scan_image, enqueue_scan_barcode_image
-from ..cache import get_json, set_json
+from ..services.chat_intent_service import parse_search_intent_cached
+from ..services.product_service import search_products_service, get_facets_service
+from ..services import autocomplete_index
+from ..tasks.crawler import aenqueue_crawl_keyword, aenqueue_scan_barcode_image, aenqueue_scan_image, enqueue_crawl_barcode
+from ..cache import category_tag, get_or_compute, product_tag
+from ..services import category_index
+from ..utils.cursor import InvalidCursor
 from typing import Optional, List, Dict
 
 
@@ -25,6 +26,14 @@ from typing import Optional, List, Dict
 from ..tasks.job_status import get_job_status
 router = APIRouter(prefix="/products", tags=["Products"])
 
+# Cache route: đúng nhờ invalidate tag ở mọi đường ghi Products (cache.invalidate_tags),
+# TTL chỉ để dọn entry ít dùng
+SEARCH_CACHE_TTL = 3600
+PRODUCT_CACHE_TTL = 6 * 3600
+# Hết TTL: 1 request tính lại, request khác vẫn nhận bản cũ trong khoảng này
+SEARCH_STALE_TTL = 300
+PRODUCT_STALE_TTL = 600
+
 @router.get("/jobs/{job_id}")
 def job_status(job_id: str):
     return get_job_status(job_id)
@@ -40,7 +49,7 @@ async def search_product(
     current_user=Depends(get_optional_user)
 ):
     # 1. G?i Gemini ph?n t?ch
-    intent = await parse_search_intent(q)
+    intent = await parse_search_intent_cached(q)
 
     # 2. N?u AI b?o ??y l? chat -> kh?ng c?o
     if intent.get("is_searching") is False:
@@ -57,7 +66,7 @@ async def search_product(
     refined_query = intent.get("product_name") or q
     print(f"[Search] '{q}' -> enqueue crawl for keyword: '{refined_query}'")
 
-    job_id = enqueue_crawl_keyword(refined_query)
+    job_id = await aenqueue_crawl_keyword(refined_query)
 
     return {
         "input_type": "product_search",
@@ -109,55 +118,70 @@ def search_product_local(
     is_vietnam_origin: Optional[bool] = False,
     is_vietnam_brand: Optional[bool] = False,
     positive_over: Optional[int] = None,
+    cursor: Optional[str] = None,
+    exact_total: bool = False,
+    mode: str = "keyword",
     db: Session = Depends(get_db),
     current_user=Depends(get_optional_user)
 ):
     keyword = (q or "").strip()
     if not keyword:
         raise HTTPException(status_code=400, detail="Thi?u t? kh?a t?m ki?m")
+    if mode not in product_crud.SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"mode phải là một trong {', '.join(product_crud.SEARCH_MODES)}")
 
     cache_key = (
         f"cache:search_local:{keyword}:{limit}:{skip}:"
         f"{lv1}:{lv2}:{lv3}:{lv4}:{lv5}:{min_price}:{max_price}:{brand}:"
-        f"{min_rating}:{sort}:{is_vietnam_origin}:{is_vietnam_brand}:{positive_over}"
-    )
-    cached = get_json(cache_key)
-    if cached:
-        return cached
-
-    items, total = search_products_service(
-        db=db,
-        keyword=keyword,
-        limit=limit,
-        skip=skip,
-        lv1=lv1, lv2=lv2, lv3=lv3, lv4=lv4, lv5=lv5,
-        min_price=min_price,
-        max_price=max_price,
-        brand=brand,
-        min_rating=min_rating,
-        sort=sort,
-        is_vietnam_origin=is_vietnam_origin,
-        is_vietnam_brand=is_vietnam_brand,
-        positive_over=positive_over,
+        f"{min_rating}:{sort}:{is_vietnam_origin}:{is_vietnam_brand}:{positive_over}:{cursor}:{exact_total}:{mode}"
     )
 
-    results = [_serialize_product(p) for p in items]
+    def compute():
+        items, total, next_cursor = search_products_service(
+            db=db,
+            keyword=keyword,
+            limit=limit,
+            skip=skip,
+            lv1=lv1, lv2=lv2, lv3=lv3, lv4=lv4, lv5=lv5,
+            min_price=min_price,
+            max_price=max_price,
+            brand=brand,
+            min_rating=min_rating,
+            sort=sort,
+            is_vietnam_origin=is_vietnam_origin,
+            is_vietnam_brand=is_vietnam_brand,
+            positive_over=positive_over,
+            cursor=cursor,
+            exact_total=exact_total,
+            active_only=True,
+            mode=mode,
+        )
+        results = [_serialize_product(p) for p in items]
+
+        if results:
+            save_search_history(db, current_user, query=q, results=results)
 
-    if results:
-        save_search_history(db, current_user, query=q, results=results)
+        return {
+            "input_type": "local_product_search",
+            "query": q,
+            "refined_query": keyword,
+            "mode": mode,
+            "total": total,
+            "skip": skip,
+            "limit": limit,
+            "count": len(results),
+            "next_cursor": next_cursor,
+            "results": results
+        }
 
-    payload = {
-        "input_type": "local_product_search",
-        "query": q,
-        "refined_query": keyword,
-        "total": total,
-        "skip": skip,
-        "limit": limit,
-        "count": len(results),
-        "results": results
-    }
-    set_json(cache_key, payload, ttl_seconds=600)
-    return payload
+    # Kết quả phụ thuộc mọi sản phẩm trong phạm vi lọc → tag theo phạm vi danh mục
+    scope_tag = category_index.cache_tag(category_index.scope_tag(lv1, lv2, lv3, lv4, lv5))
+    try:
+        return get_or_compute(
+            cache_key, compute, ttl=SEARCH_CACHE_TTL, stale_ttl=SEARCH_STALE_TTL, tags=[scope_tag]
+        )
+    except InvalidCursor as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
 
 # ============================================================
 # 2️⃣ TRA CỨU SẢN PHẨM THEO MÃ VẠCH (BARCODE)
@@ -196,7 +220,7 @@ async def scan_product_image(file: UploadFile = File(...), db: Session = Depends
         tmp.write(await file.read())
         tmp_path = tmp.name
 
-    job_id = enqueue_scan_image(tmp_path, filename=file.filename)
+    job_id = await aenqueue_scan_image(tmp_path, filename=file.filename)
     return {
         "input_type": "image",
         "query": file.filename,
@@ -222,7 +246,7 @@ async def scan_barcode_image(
         tmp.write(await file.read())
         tmp_path = tmp.name
 
-    job_id = enqueue_scan_barcode_image(tmp_path)
+    job_id = await aenqueue_scan_barcode_image(tmp_path)
     return {
         "input_type": "barcode_image",
         "query": file.filename,
@@ -255,20 +279,28 @@ def get_products_by_category(
     is_vietnam_origin: Optional[bool] = False,
     is_vietnam_brand: Optional[bool] = False,
     positive_over: Optional[int] = None,
+    cursor: Optional[str] = None,
+    exact_total: bool = False,
     db: Session = Depends(get_db)
 ):
-    items, total = filter_products_service(
-        db=db,
-        lv1=lv1, lv2=lv2, lv3=lv3, lv4=lv4, lv5=lv5,
-        min_price=min_price, max_price=max_price,
-        brand=brand, min_rating=min_rating,
-        sort=sort,
-        skip=skip,
-        limit=limit,
-        is_vietnam_origin=is_vietnam_origin,
-        is_vietnam_brand=is_vietnam_brand,
-        positive_over=positive_over,
-    )
+    try:
+        items, total, next_cursor = filter_products_service(
+            db=db,
+            lv1=lv1, lv2=lv2, lv3=lv3, lv4=lv4, lv5=lv5,
+            min_price=min_price, max_price=max_price,
+            brand=brand, min_rating=min_rating,
+            sort=sort,
+            skip=skip,
+            limit=limit,
+            is_vietnam_origin=is_vietnam_origin,
+            is_vietnam_brand=is_vietnam_brand,
+            positive_over=positive_over,
+            cursor=cursor,
+            exact_total=exact_total,
+            active_only=True,
+        )
+    except InvalidCursor as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
 
     results = [_serialize_product(p) for p in items]
 
@@ -277,9 +309,42 @@ def get_products_by_category(
         "skip": skip,
         "limit": limit,
         "count": len(results),
+        "next_cursor": next_cursor,
         "results": results
     }
 
+# ============================================================
+# FACETS CHO BỘ LỌC (brand / giá / rating / positive / Việt Nam)
+# ============================================================
+@router.get("/facets")
+def get_product_facets(
+    q: Optional[str] = None,
+    lv1: Optional[str] = None,
+    lv2: Optional[str] = None,
+    lv3: Optional[str] = None,
+    lv4: Optional[str] = None,
+    lv5: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Số sản phẩm theo từng giá trị filter trong phạm vi danh mục/từ khoá hiện tại."""
+    return get_facets_service(
+        db,
+        keyword=(q or "").strip() or None,
+        lv1=lv1, lv2=lv2, lv3=lv3, lv4=lv4, lv5=lv5,
+    )
+
+# ============================================================
+# AUTOCOMPLETE (index in-process, không chạm DB mỗi phím gõ)
+# ============================================================
+@router.get("/autocomplete")
+def autocomplete_products(
+    q: str = Query("", max_length=100),
+    limit: int = Query(10, ge=1, le=10),
+    db: Session = Depends(get_db)
+):
+    """Gợi ý tên sản phẩm / brand / từ khoá phổ biến khớp prefix (không dấu vẫn khớp)."""
+    return {"query": q, "suggestions": autocomplete_index.suggest(db, q, limit)}
+
 # ============================================================
 # 4️⃣ LẤY CHI TIẾT SẢN PHẨM TRONG DB
 # ============================================================
@@ -288,38 +353,40 @@ def get_product_detail(product_id: int, db: Session = Depends(get_db), current_u
     """
     Lấy thông tin chi tiết sản phẩm đã lưu trong DB (không cần crawler).
     """
-    cache_key = f"cache:product:{product_id}"
-    cached = get_json(cache_key)
-    if cached:
-        add_view_history(db, current_user, product_id)
-        return cached
+    def compute():
+        product = product_crud.get_by_id(db, product_id)
+        if not product:
+            return None
+        return {
+            "Product_ID": product.Product_ID,
+            "Product_Name": product.Product_Name,
+            "Brand": product.Brand,
+            "Category_ID": product.Category_ID,
+            "Price": product.Price,
+            "Avg_Rating": product.Avg_Rating,
+            "Review_Count": product.Review_Count,
+            "Positive_Percent": product.Positive_Percent,
+            "Sentiment_Score": product.Sentiment_Score,
+            "Sentiment_Label": product.Sentiment_Label,
+            "Origin": product.Origin,
+            "Brand_country": product.Brand_country,
+            "Image_URL": product.Image_URL,
+            "Product_URL": product.Product_URL,
+            "Description": product.Description,
+            "Is_Authentic": product.Is_Authentic,
+            "Is_Active": product.Is_Active,
+            "Source": product.Source,
+            "Image_Full_URL": product.Image_Full_URL,
+        }
 
-    product = product_crud.get_by_id(db, product_id)
-    if not product:
+    # None (không có sản phẩm) cũng được cache ngắn → id rác không đập DB liên tục
+    data = get_or_compute(
+        f"cache:product:{product_id}", compute,
+        ttl=PRODUCT_CACHE_TTL, stale_ttl=PRODUCT_STALE_TTL, tags=[product_tag(product_id)],
+    )
+    if data is None:
         raise HTTPException(status_code=404, detail="Không tìm thấy sản phẩm trong DB")
     add_view_history(db, current_user, product_id)
-    data = {
-        "Product_ID": product.Product_ID,
-        "Product_Name": product.Product_Name,
-        "Brand": product.Brand,
-        "Category_ID": product.Category_ID,
-        "Price": product.Price,
-        "Avg_Rating": product.Avg_Rating,
-        "Review_Count": product.Review_Count,
-        "Positive_Percent": product.Positive_Percent,
-        "Sentiment_Score": product.Sentiment_Score,
-        "Sentiment_Label": product.Sentiment_Label,
-        "Origin": product.Origin,
-        "Brand_country": product.Brand_country,
-        "Image_URL": product.Image_URL,
-        "Product_URL": product.Product_URL,
-        "Description": product.Description,
-        "Is_Authentic": product.Is_Authentic,
-        "Is_Active": product.Is_Active,
-        "Source": product.Source,
-        "Image_Full_URL": product.Image_Full_URL,
-    }
-    set_json(cache_key, data, ttl_seconds=600)
     return data
 
 # ============================================================
@@ -343,14 +410,15 @@ def update_sentiment(product_id: int, db: Session = Depends(get_db)):
 # 6️⃣ CẬP NHẬT SENTIMENT HÀNG LOẠT
 # =========================================================
 @router.put("/update_all_sentiment")
-def update_all_sentiment(db: Session = Depends(get_db)):
+def update_all_sentiment(resume: bool = True):
     """
-    Enqueue sentiment update cho to?n b? s?n ph?m Tiki.
+    Enqueue 1 job bulk cập nhật sentiment cho toàn bộ sản phẩm Tiki.
+    Tiến độ (products/sec, reviews/sec) xem qua /products/jobs/{job_id}.
     """
-    products = product_crud.get_all_tiki_products(db)
-    from ..tasks.sentiment import enqueue_update_sentiment
-    job_ids = [enqueue_update_sentiment(p.Product_ID) for p in products]
-    return {"total": len(products), "job_ids": job_ids, "status": "queued"}
+    from ..tasks.sentiment import enqueue_bulk_sentiment
+
+    job_id = enqueue_bulk_sentiment(resume=resume)
+    return {"job_id": job_id, "status": "queued"}
 
 
 # =========================================================
@@ -379,21 +447,21 @@ def recommend_best_products(product_id: int, limit: int = 5, db: Session = Depen
     """
     from ..services.recommender_service import recommend_best_in_category
 
-    cache_key = f"cache:recommend:{product_id}:{limit}"
-    cached = get_json(cache_key)
-    if cached:
-        return cached
+    tags = [product_tag(product_id)]
 
-    try:
-        products = recommend_best_in_category(db, product_id, limit) or []
-    except Exception:
-        products = []
-
-    # Serialize ra dict để FE luôn nhận đủ field và tránh object không JSON-serializable
-    serialized = [_serialize_product(p) for p in products]
+    def compute():
+        try:
+            products = recommend_best_in_category(db, product_id, limit) or []
+        except Exception:
+            products = []
+        tags.extend(category_tag(p.Category_ID) for p in products if p.Category_ID)
+        # Serialize ra dict để FE luôn nhận đủ field và tránh object không JSON-serializable
+        return [_serialize_product(p) for p in products]
 
-    set_json(cache_key, serialized, ttl_seconds=3600)
-    return serialized
+    return get_or_compute(
+        f"cache:recommend:{product_id}:{limit}", compute,
+        ttl=PRODUCT_CACHE_TTL, stale_ttl=PRODUCT_STALE_TTL, tags=lambda _: tags,
+    )
 
 @router.get("/{product_id}/risk")
 def get_product_risk(product_id: int, db: Session = Depends(get_db)):
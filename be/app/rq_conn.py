@@ -1,6 +1,12 @@
+import asyncio
+import functools
 import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
 
 from redis import Redis
+from redis import asyncio as aioredis
 from rq import Queue
 
 # Redis connection and default queues for background jobs
@@ -11,3 +17,42 @@ redis_conn = Redis.from_url(REDIS_URL)
 # Dedicated queues so we can scale workers per queue if needed
 crawl_queue = Queue("crawl", connection=redis_conn, default_timeout=900)
 auto_update_queue = Queue("auto_update", connection=redis_conn, default_timeout=1800)
+
+# ==========================================================
+# Async: cho route async def (không chặn event loop khi gọi Redis)
+# ==========================================================
+# Connection redis.asyncio gắn với event loop tạo ra nó; API có loop của uvicorn
+# và loop riêng của scheduler thread → mỗi loop 1 client + pool riêng.
+REDIS_ASYNC_MAX_CONNECTIONS = int(os.getenv("REDIS_ASYNC_MAX_CONNECTIONS", "64"))
+_ASYNC_CLIENTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aioredis.Redis]" = weakref.WeakKeyDictionary()
+
+
+def get_async_redis() -> aioredis.Redis:
+    """Client redis.asyncio của event loop đang chạy (gọi trong coroutine)."""
+    loop = asyncio.get_running_loop()
+    client = _ASYNC_CLIENTS.get(loop)
+    if client is None:
+        client = aioredis.Redis.from_url(REDIS_URL, max_connections=REDIS_ASYNC_MAX_CONNECTIONS)
+        _ASYNC_CLIENTS[loop] = client
+    return client
+
+
+async def close_async_redis() -> None:
+    client = _ASYNC_CLIENTS.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+# RQ chỉ có API sync (Job.create + pipeline sync) → enqueue từ route async chạy
+# trên pool thread riêng: event loop không chờ round trip Redis, và enqueue
+# dồn dập không chiếm threadpool mà FastAPI dùng cho route def thường.
+RQ_ENQUEUE_THREADS = int(os.getenv("RQ_ENQUEUE_THREADS", "8"))
+_ENQUEUE_EXECUTOR = ThreadPoolExecutor(max_workers=RQ_ENQUEUE_THREADS, thread_name_prefix="rq-enqueue")
+
+T = TypeVar("T")
+
+
+async def run_enqueue(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """await run_enqueue(enqueue_xxx, ...) – chạy hàm enqueue sync ngoài event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_ENQUEUE_EXECUTOR, functools.partial(fn, *args, **kwargs))
@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import bisect
+import heapq
+import logging
+import math
+import os
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import Unicode, cast, func
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal
+from ..models.products import Products
+from ..models.search_history import Search_History
+from . import search_index
+
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# Autocomplete in-process: tên sản phẩm, brand, query phổ biến
+# ==========================================================
+# Key = text bỏ dấu (search_index.tokenize) nối bằng 1 space, so khớp theo prefix.
+#
+# Cấu trúc "frozen" (dựng 1 lần, chỉ đọc):
+#   - key/display của mọi entry nối thành 2 blob bytes UTF-8 + mảng offset,
+#     sắp theo key → tìm khoảng prefix bằng binary search trên blob
+#   - weight/kind/ref là array cột (không có object Python cho từng entry)
+#   - prefix nào khớp > SCAN_LIMIT entry được tính sẵn top-K lúc build, prefix
+#     hẹp hơn thì heapq.nlargest trên khoảng ≤ SCAN_LIMIT → lookup < 1ms
+# Sản phẩm mới/sửa (change feed của search_index) vào "delta" nhỏ, entry frozen
+# cũ của chúng bị ẩn; delta quá lớn hoặc quá REBUILD_SECONDS thì dựng lại nền.
+#
+# Bộ nhớ ước tính mỗi entry: key ≤ 32B + display ~60B (≤ 80 ký tự) + offset 2×4B
+# + weight 4B + kind 1B + ref 8B ≈ 110B. 1M sản phẩm + ~50k brand + ~100k query
+# ≈ 1.15M entry ≈ 130MB mỗi process (so với ~450MB nếu giữ tuple/str Python),
+# bảng top-K thêm < 5MB. Đo lại bằng scripts/bench_autocomplete.py.
+KIND_PRODUCT, KIND_BRAND, KIND_QUERY = 0, 1, 2
+_KIND_NAMES = ("product", "brand", "query")
+
+KEY_MAX_CHARS = 32
+DISPLAY_MAX_CHARS = 80
+TOP_K = 20  # lưu dư để còn đủ sau khi bỏ trùng/ẩn entry cũ
+SCAN_LIMIT = 256
+DELTA_MAX = 20_000
+REBUILD_SECONDS = int(os.getenv("AUTOCOMPLETE_REBUILD_SECONDS", "1800"))
+QUERY_HISTORY_DAYS = 90
+QUERY_MIN_COUNT = 2
+_SYNC_INTERVAL = 1.0
+
+
+def normalize(text: Optional[str]) -> str:
+    return " ".join(search_index.tokenize(text))[:KEY_MAX_CHARS]
+
+
+class _Frozen:
+    def __init__(self, entries: List[Tuple[str, str, int, float, int]]) -> None:
+        """entries: (key, display, kind, weight, ref_id)."""
+        encoded = sorted(
+            ((key.encode("utf-8"), disp, kind, weight, ref) for key, disp, kind, weight, ref in entries if key),
+            key=lambda e: e[0],
+        )
+        keys, displays = bytearray(), bytearray()
+        self.key_off = array("I", [0])
+        self.disp_off = array("I", [0])
+        self.weights = array("f")
+        self.kinds = bytearray()
+        self.refs = array("q")
+        for kb, disp, kind, weight, ref in encoded:
+            keys += kb
+            displays += disp[:DISPLAY_MAX_CHARS].encode("utf-8")
+            self.key_off.append(len(keys))
+            self.disp_off.append(len(displays))
+            self.weights.append(weight)
+            self.kinds.append(kind)
+            self.refs.append(ref)
+        self.keys = bytes(keys)
+        self.displays = bytes(displays)
+        self.size = len(self.weights)
+        self.top: Dict[bytes, List[int]] = {}
+        self._build_top()
+
+    def key_at(self, i: int) -> bytes:
+        return self.keys[self.key_off[i]:self.key_off[i + 1]]
+
+    def display_at(self, i: int) -> str:
+        return self.displays[self.disp_off[i]:self.disp_off[i + 1]].decode("utf-8")
+
+    def _lower_bound(self, target: bytes, lo: int = 0, hi: Optional[int] = None) -> int:
+        hi = self.size if hi is None else hi
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key_at(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _range(self, prefix: bytes) -> Tuple[int, int]:
+        # UTF-8 không bao giờ chứa byte 0xFF → prefix + b"\xff" lớn hơn mọi key có prefix đó
+        lo = self._lower_bound(prefix)
+        return lo, self._lower_bound(prefix + b"\xff", lo)
+
+    def _build_top(self) -> None:
+        if self.size > SCAN_LIMIT:
+            self._top_of(0, self.size, 0)
+
+    def _top_of(self, lo: int, hi: int, depth: int) -> List[int]:
+        """Top-K của khoảng [lo, hi) có chung prefix dài depth byte; lưu bảng nếu khoảng lớn.
+
+        Bottom-up: top-K của prefix = top-K gộp từ các prefix con, nên mỗi entry chỉ
+        bị quét một lần ở nút nhỏ nhất chứa nó.
+        """
+        if hi - lo <= SCAN_LIMIT:
+            return heapq.nlargest(TOP_K, range(lo, hi), key=self.weights.__getitem__)
+        prefix = self.key_at(lo)[:depth]
+        # Key đúng bằng prefix đứng đầu khoảng, sau đó là từng nhóm prefix + 1 byte
+        i = self._lower_bound(prefix + b"\x00", lo, hi)
+        candidates = heapq.nlargest(TOP_K, range(lo, i), key=self.weights.__getitem__)
+        while i < hi:
+            child = self.key_at(i)[:depth + 1]
+            j = self._lower_bound(child + b"\xff", i, hi)
+            candidates.extend(self._top_of(i, j, depth + 1))
+            i = j
+        top = heapq.nlargest(TOP_K, candidates, key=self.weights.__getitem__)
+        self.top[prefix] = top
+        return top
+
+    def lookup(self, prefix: bytes) -> List[int]:
+        lo, hi = self._range(prefix)
+        if hi - lo <= SCAN_LIMIT:
+            return heapq.nlargest(TOP_K, range(lo, hi), key=self.weights.__getitem__)
+        return self.top.get(prefix, [])
+
+
+class _State:
+    def __init__(self, frozen: _Frozen, seq: int) -> None:
+        self.frozen = frozen
+        self.built_at = time.time()
+        self.applied_seq = seq
+        self.hidden: Set[int] = set()  # Product_ID có entry frozen đã cũ
+        self.delta: Dict[int, Tuple[bytes, str, float]] = {}  # Product_ID → (key, display, weight)
+        self.delta_keys: List[Tuple[bytes, int]] = []  # sorted (key, Product_ID)
+
+    def upsert_product(self, pid: int, name: Optional[str], review_count: Optional[int], active: bool) -> None:
+        self.hidden.add(pid)
+        old = self.delta.pop(pid, None)
+        if old is not None:
+            self.delta_keys.remove((old[0], pid))
+        key = normalize(name)
+        if not active or not key:
+            return
+        kb = key.encode("utf-8")
+        self.delta[pid] = (kb, name or "", _product_weight(review_count))
+        bisect.insort(self.delta_keys, (kb, pid))
+
+
+_STATE: Optional[_State] = None
+_LAST_SYNC = 0.0
+_LOCK = threading.Lock()
+_BUILDING = threading.Event()
+
+
+def _product_weight(review_count: Optional[int]) -> float:
+    return 1.0 + math.log1p(review_count or 0)
+
+
+def _collect_entries(db: Session) -> List[Tuple[str, str, int, float, int]]:
+    entries: List[Tuple[str, str, int, float, int]] = []
+    brands: Dict[str, List[Any]] = {}  # key → [display, tổng review, số sản phẩm]
+
+    rows = (
+        db.query(Products.Product_ID, Products.Product_Name, Products.Brand, Products.Review_Count)
+        .filter(Products.Is_Active == True)
+        .yield_per(10_000)
+    )
+    for pid, name, brand, review_count in rows:
+        entries.append((normalize(name), name or "", KIND_PRODUCT, _product_weight(review_count), int(pid)))
+        bkey = normalize(brand)
+        if bkey:
+            agg = brands.setdefault(bkey, [brand, 0, 0])
+            agg[1] += review_count or 0
+            agg[2] += 1
+    for bkey, (display, reviews, n_products) in brands.items():
+        entries.append((bkey, display, KIND_BRAND, 1.5 + math.log1p(reviews) + math.log1p(n_products), 0))
+
+    since = datetime.utcnow() - timedelta(days=QUERY_HISTORY_DAYS)
+    query_text = cast(Search_History.Query, Unicode(200))
+    queries: Dict[str, List[Any]] = {}
+    for text, count in (
+        db.query(query_text, func.count(Search_History.History_ID))
+        .filter(Search_History.Created_At >= since, Search_History.Query.isnot(None))
+        .group_by(query_text)
+        .all()
+    ):
+        qkey = normalize(text)
+        if qkey:
+            agg = queries.setdefault(qkey, [text.strip(), 0])
+            agg[1] += int(count)
+    for qkey, (display, count) in queries.items():
+        if count >= QUERY_MIN_COUNT:
+            entries.append((qkey, display, KIND_QUERY, 2.0 + 2 * math.log1p(count), 0))
+    return entries
+
+
+def rebuild(db: Session) -> None:
+    global _STATE
+    start = time.perf_counter()
+    seq = search_index.current_seq() or 0
+    frozen = _Frozen(_collect_entries(db))
+    with _LOCK:
+        _STATE = _State(frozen, seq)
+    logger.info(
+        "autocomplete index built: %s entries, %s KB in %.2fs",
+        frozen.size, (len(frozen.keys) + len(frozen.displays) + frozen.size * 21) // 1024,
+        time.perf_counter() - start,
+    )
+
+
+def _rebuild_in_background() -> None:
+    with _LOCK:
+        # check + set trong lock: request đồng thời không cùng khởi động 1 lần dựng
+        if _BUILDING.is_set():
+            return
+        _BUILDING.set()
+
+    def _run() -> None:
+        db = SessionLocal()
+        try:
+            rebuild(db)
+        except Exception as exc:
+            logger.warning("autocomplete rebuild failed: %s", exc)
+        finally:
+            db.close()
+            _BUILDING.clear()
+
+    threading.Thread(target=_run, daemon=True).start()
+
+
+def warm_up_in_background() -> None:
+    """Gọi lúc API startup: dựng index trên thread riêng, không chặn khởi động."""
+    _rebuild_in_background()
+
+
+def _apply_changes(db: Session, state: _State) -> None:
+    seq = search_index.current_seq()
+    if seq is None or seq <= state.applied_seq:
+        return
+    try:
+        ids = search_index.changed_since(state.applied_seq, seq)
+    except Exception as exc:
+        logger.debug("autocomplete: cannot read change feed: %s", exc)
+        return
+    if ids is None or len(state.delta) + len(ids) > DELTA_MAX:
+        _rebuild_in_background()
+        return
+
+    for i in range(0, len(ids), 1000):
+        chunk = ids[i:i + 1000]
+        found = set()
+        for pid, name, review_count, active in (
+            db.query(Products.Product_ID, Products.Product_Name, Products.Review_Count, Products.Is_Active)
+            .filter(Products.Product_ID.in_(chunk))
+            .all()
+        ):
+            found.add(int(pid))
+            with _LOCK:
+                state.upsert_product(int(pid), name, review_count, bool(active))
+        with _LOCK:
+            for pid in chunk:
+                if pid not in found:
+                    state.upsert_product(pid, None, 0, False)
+    state.applied_seq = seq
+
+
+def _ensure_fresh(db: Session) -> Optional[_State]:
+    global _LAST_SYNC
+    state = _STATE
+    if state is None:
+        # Chưa dựng xong (warm-up đang chạy): trả rỗng thay vì mỗi request tự dựng
+        # lại toàn bộ catalog cùng lúc; _BUILDING đảm bảo chỉ 1 lần dựng
+        _rebuild_in_background()
+        return None
+    now = time.time()
+    if now - state.built_at > REBUILD_SECONDS:
+        _rebuild_in_background()
+    if now - _LAST_SYNC >= _SYNC_INTERVAL:
+        _LAST_SYNC = now
+        _apply_changes(db, state)
+    return state
+
+
+def suggest(db: Session, q: str, limit: int = 10) -> List[Dict[str, Any]]:
+    prefix = normalize(q)
+    if not prefix:
+        return []
+    state = _ensure_fresh(db)
+    if state is None:
+        return []
+    pb = prefix.encode("utf-8")
+    frozen = state.frozen
+
+    with _LOCK:
+        candidates: List[Tuple[float, int, str, int]] = []  # (weight, kind, display, ref)
+        for i in frozen.lookup(pb):
+            kind, ref = frozen.kinds[i], frozen.refs[i]
+            if kind == KIND_PRODUCT and ref in state.hidden:
+                continue
+            candidates.append((frozen.weights[i], kind, frozen.display_at(i), ref))
+        lo = bisect.bisect_left(state.delta_keys, (pb,))
+        hi = bisect.bisect_left(state.delta_keys, (pb + b"\xff",))
+        for _, pid in state.delta_keys[lo:hi]:
+            _, display, weight = state.delta[pid]
+            candidates.append((weight, KIND_PRODUCT, display, pid))
+
+    candidates.sort(key=lambda c: -c[0])
+    out: List[Dict[str, Any]] = []
+    seen: Set[str] = set()
+    for weight, kind, display, ref in candidates:
+        norm = normalize(display)
+        if norm in seen:
+            continue
+        seen.add(norm)
+        item: Dict[str, Any] = {"text": display, "type": _KIND_NAMES[kind]}
+        if kind == KIND_PRODUCT:
+            item["product_id"] = ref
+        out.append(item)
+        if len(out) >= limit:
+            break
+    return out
+
+
+def build_from_entries(entries: Sequence[Tuple[str, str, int, float, int]]) -> _Frozen:
+    """Dựng cấu trúc frozen từ entries có sẵn (benchmark / kiểm tra bộ nhớ không cần DB)."""
+    return _Frozen(list(entries))
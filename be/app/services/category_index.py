@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import json
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..cache import CATALOG_TAG
+from ..models.categories import Categories
+from ..rq_conn import redis_conn
+
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# Category index in-process: tên lv1..lv5 → tập Category_ID
+# ==========================================================
+# Bảng Categories nhỏ (vài nghìn dòng) nên mỗi process giữ bản đầy đủ trong RAM,
+# filter sản phẩm theo danh mục chỉ còn Products.Category_ID IN (...) – không join,
+# không so sánh chuỗi Unicode trên DB.
+# Ghi danh mục (crawler/admin) → tăng version trong Redis; process thấy version
+# khác (kiểm tra tối đa mỗi _SYNC_INTERVAL giây) sẽ cập nhật:
+#   - mark_inserted(category): version mới kèm dòng vừa thêm trong _CHANGES_KEY →
+#     process khác áp dụng tăng dần, không đọc lại cả bảng (crawler thêm liên tục)
+#   - mark_changed(): sửa/xoá, hoặc log đã bị cắt → nạp lại toàn bộ
+_VERSION_KEY = "category:index:version"
+_CHANGES_KEY = "category:index:changes"
+_CHANGES_KEEP = 1000
+_SYNC_INTERVAL = 1.0
+_RELOAD_SECONDS = 600
+LEVELS = 5
+
+
+def name_key(name: str) -> str:
+    # Gần với collation CI của SQL Server: không phân biệt hoa/thường, khoảng trắng thừa
+    return " ".join(name.split()).casefold()
+
+
+class _Snapshot:
+    def __init__(self, rows: Sequence[tuple], version: int) -> None:
+        self.version = version
+        self.loaded_at = time.time()
+        self.ids: Set[int] = set()
+        self.levels_of: Dict[int, Tuple[Optional[str], ...]] = {}
+        # by_level[n][name] = {Category_ID có Category_Lv{n+1} == name}
+        self.by_level: List[Dict[str, Set[int]]] = [{} for _ in range(LEVELS)]
+        # Category_ID thêm tăng dần sau khi nạp, theo thứ tự (category_tree đọc tiếp từ đây)
+        self.inserted: List[int] = []
+        for cid, *levels in rows:
+            self._add(int(cid), levels)
+
+    def _add(self, cid: int, levels: Sequence[Optional[str]]) -> None:
+        self.ids.add(cid)
+        self.levels_of[cid] = tuple(levels)
+        for n, name in enumerate(levels):
+            if name:
+                self.by_level[n].setdefault(name_key(name), set()).add(cid)
+
+    def apply_insert(self, cid: int, levels: Sequence[Optional[str]]) -> None:
+        # Sửa tại chỗ dưới _LOCK: reader chỉ get/copy/giao set (1 thao tác C, giữ GIL)
+        if cid in self.ids:
+            return
+        self._add(cid, levels)
+        self.inserted.append(cid)
+
+    def resolve(self, levels: Sequence[Optional[str]]) -> Optional[Set[int]]:
+        """Giao các tập theo từng level được truyền; None nếu không lọc level nào."""
+        result: Optional[Set[int]] = None
+        for n, name in enumerate(levels):
+            if not name:
+                continue
+            ids = self.by_level[n].get(name_key(name), set())
+            result = set(ids) if result is None else result & ids
+            if not result:
+                return set()
+        return result
+
+
+_SNAPSHOT: Optional[_Snapshot] = None
+_LAST_SYNC = 0.0
+_LOCK = threading.Lock()
+
+
+def _redis_version() -> Optional[int]:
+    try:
+        return int(redis_conn.get(_VERSION_KEY) or 0)
+    except Exception as exc:
+        logger.debug("category index: cannot read version: %s", exc)
+        return None
+
+
+def _load(db: Session, version: int) -> _Snapshot:
+    rows = db.query(
+        Categories.Category_ID,
+        Categories.Category_Lv1,
+        Categories.Category_Lv2,
+        Categories.Category_Lv3,
+        Categories.Category_Lv4,
+        Categories.Category_Lv5,
+    ).all()
+    snap = _Snapshot(rows, version)
+    logger.info("category index loaded: %s categories (version %s)", len(snap.ids), version)
+    return snap
+
+
+def _apply_changes(snap: _Snapshot, version: int) -> bool:
+    """Áp dụng các insert (snap.version, version]; False nếu có version không phải insert/đã bị cắt."""
+    if snap.version < 0 or version < snap.version or version - snap.version > _CHANGES_KEEP:
+        return False
+    try:
+        items = redis_conn.zrangebyscore(_CHANGES_KEY, snap.version + 1, version, withscores=True)
+    except Exception as exc:
+        logger.debug("category index: cannot read changes: %s", exc)
+        return False
+    if len(items) != version - snap.version:
+        return False
+    for raw, _ in items:
+        row = json.loads(raw)
+        snap.apply_insert(int(row["id"]), row["levels"])
+    snap.version = version
+    return True
+
+
+def snapshot(db: Session) -> _Snapshot:
+    global _SNAPSHOT, _LAST_SYNC
+    with _LOCK:
+        now = time.time()
+        snap = _SNAPSHOT
+        if snap is not None and now - _LAST_SYNC < _SYNC_INTERVAL:
+            return snap
+        _LAST_SYNC = now
+        version = _redis_version()
+        if snap is None or now - snap.loaded_at > _RELOAD_SECONDS:
+            _SNAPSHOT = _load(db, version if version is not None else -1)
+        elif version is not None and version != snap.version and not _apply_changes(snap, version):
+            _SNAPSHOT = _load(db, version)
+        return _SNAPSHOT
+
+
+def resolve_ids(db: Session, lv1=None, lv2=None, lv3=None, lv4=None, lv5=None) -> Optional[List[int]]:
+    """Category_ID khớp bộ lọc lv1..lv5 (mọi level được truyền đều phải khớp).
+
+    None = không có filter danh mục; [] = không danh mục nào khớp.
+    """
+    levels = [lv1, lv2, lv3, lv4, lv5]
+    if not any(levels):
+        return None
+    ids = snapshot(db).resolve(levels)
+    return None if ids is None else sorted(ids)
+
+
+def scope_tag(lv1=None, lv2=None, lv3=None, lv4=None, lv5=None) -> str:
+    """Tag phạm vi của bộ lọc danh mục: level sâu nhất được truyền, hoặc "all"."""
+    for n, name in reversed(list(enumerate([lv1, lv2, lv3, lv4, lv5], start=1))):
+        if name:
+            return f"lv{n}:{name_key(name)}"
+    return "all"
+
+
+def scope_tags(db: Session, category_ids: Iterable[Optional[int]]) -> Set[str]:
+    """Mọi tag phạm vi chứa sản phẩm thuộc các Category_ID này (luôn gồm "all")."""
+    tags = {"all"}
+    ids = [int(c) for c in category_ids if c is not None]
+    if not ids:
+        return tags
+    snap = snapshot(db)
+    for cid in ids:
+        for n, name in enumerate(snap.levels_of.get(cid, ()), start=1):
+            if name:
+                tags.add(f"lv{n}:{name_key(name)}")
+    return tags
+
+
+def cache_tag(scope: str) -> str:
+    """Tag cache (cache.set_json tags=...) của phạm vi scope_tag(): "all" → catalog."""
+    return CATALOG_TAG if scope == "all" else f"scope:{scope}"
+
+
+# INCR version + ghi dòng với score = version mới trong 1 lệnh: reader thấy version
+# thì cũng thấy dòng tương ứng
+_RECORD_INSERT = """
+local v = redis.call('incr', KEYS[1])
+redis.call('zadd', KEYS[2], v, ARGV[1])
+redis.call('zremrangebyrank', KEYS[2], 0, -tonumber(ARGV[2]) - 1)
+return v
+"""
+
+
+def mark_changed() -> None:
+    """Gọi sau khi commit sửa/xoá danh mục: mọi process nạp lại toàn bộ."""
+    try:
+        redis_conn.incr(_VERSION_KEY)
+    except Exception as exc:
+        logger.debug("category index: cannot bump version: %s", exc)
+
+
+def mark_inserted(category: Categories) -> None:
+    """Gọi sau khi commit THÊM danh mục: process khác thêm dòng này vào bản in-memory."""
+    row = json.dumps({
+        "id": int(category.Category_ID),
+        "levels": [getattr(category, f"Category_Lv{n}") for n in range(1, LEVELS + 1)],
+    })
+    try:
+        redis_conn.eval(_RECORD_INSERT, 2, _VERSION_KEY, _CHANGES_KEY, row, _CHANGES_KEEP)
+    except Exception as exc:
+        logger.debug("category index: cannot record insert: %s", exc)
@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..crud import category_stats as stats_crud
+from ..rq_conn import redis_conn
+from . import category_index
+
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# Cây danh mục in-process (cho /categories/tree và /categories/subtree)
+# ==========================================================
+# Dựng từ category_index (đã giữ Lv1..Lv5 của mọi danh mục trong RAM) nên không
+# query DB. Danh mục mới mà category_index áp dụng tăng dần (snap.inserted) được
+# chèn thẳng vào cây; chỉ khi category_index nạp lại toàn bộ mới dựng lại cây.
+# JSON trả về (theo path + depth) render 1 lần cho mỗi version, kèm ETag theo nội
+# dung → client gửi If-None-Match nhận 304 khi cây không đổi.
+#
+# stats=true: mỗi node kèm tổng hợp sản phẩm (Category_Stats) cộng dồn cả cây con.
+# Mọi ghi Products đánh dấu danh mục (cũ + mới) vào _STATS_DIRTY_KEY; job
+# tasks/category_stats.py tính lại đúng các danh mục đó, ghi bảng rồi
+# mark_stats_changed() → process nạp lại (bảng nhỏ, 1 dòng / danh mục) và cộng
+# dồn lại trong RAM.
+PATH_SEPARATOR = ">"
+_RENDER_CACHE_MAX = 1024
+_STATS_VERSION_KEY = "category:stats:version"
+_STATS_DIRTY_KEY = "category:stats:dirty"
+_STATS_PROCESSING_KEY = "category:stats:processing"
+_STATS_SYNC_INTERVAL = 5.0
+
+
+class _Node:
+    __slots__ = ("name", "children")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.children: Dict[str, _Node] = {}
+
+
+class _Tree:
+    def __init__(self, snap: Any) -> None:
+        self.snap = snap
+        self.version = snap.version
+        self.root = _Node("")
+        for cid in sorted(snap.levels_of):
+            self.insert(snap.levels_of[cid])
+        self.applied = len(snap.inserted)
+        self.rendered: Dict[Tuple[Tuple[str, ...], Optional[int], bool], Optional[Tuple[str, bytes]]] = {}
+        # path (name_key) → tổng cộng dồn theo stats_crud.STAT_FIELDS; None = cần tính lại
+        self.rollup: Optional[Dict[Tuple[str, ...], List[float]]] = None
+
+    def insert(self, levels: Sequence[Optional[str]]) -> None:
+        # Giống cây cũ: bỏ qua level rỗng, nối level sau vào level có tên gần nhất
+        if not levels or not levels[0]:
+            return  # cây cũ bỏ qua danh mục không có Lv1
+        node = self.root
+        for name in levels:
+            if not name:
+                continue
+            key = category_index.name_key(name)
+            child = node.children.get(key)
+            if child is None:
+                child = node.children[key] = _Node(" ".join(name.split()))
+            node = child
+
+    def find(self, keys: Sequence[str]) -> Tuple[Optional[_Node], List[str]]:
+        """(node, tên hiển thị dọc đường đi) theo các name_key từ Lv1."""
+        node, names = self.root, []
+        for key in keys:
+            node = node.children.get(key)
+            if node is None:
+                return None, names
+            names.append(node.name)
+        return node, names
+
+
+_TREE: Optional[_Tree] = None
+_LOCK = threading.Lock()
+
+
+def _sync(db: Session) -> _Tree:
+    global _TREE
+    snap = category_index.snapshot(db)
+    tree = _TREE
+    if tree is None or tree.snap is not snap:
+        tree = _TREE = _Tree(snap)
+    elif len(snap.inserted) > tree.applied or snap.version != tree.version:
+        new_ids = snap.inserted[tree.applied:]
+        for cid in new_ids:
+            tree.insert(snap.levels_of[cid])
+        tree.applied += len(new_ids)
+        tree.version = snap.version
+        if new_ids:
+            tree.rendered.clear()
+            tree.rollup = None
+    return tree
+
+
+class _Stats:
+    def __init__(self) -> None:
+        self.rows: Dict[int, Dict[str, float]] = {}
+        self.version: Optional[int] = None
+        self.checked_at = 0.0
+
+
+_STATS = _Stats()
+
+
+def mark_stats_dirty(category_ids: Sequence[int]) -> None:
+    """Gọi sau khi commit ghi Products (qua crud.products.invalidate_product_caches)."""
+    ids = [int(cid) for cid in category_ids if cid is not None]
+    if not ids:
+        return
+    try:
+        redis_conn.sadd(_STATS_DIRTY_KEY, *ids)
+    except Exception as exc:
+        logger.debug("category tree: cannot mark stats dirty %s: %s", ids[:5], exc)
+
+
+def take_stats_dirty() -> List[int]:
+    """Chuyển tập dirty sang key processing (MULTI) và trả về toàn bộ processing.
+
+    Lần chạy trước lỗi giữa chừng (chưa ack_stats_dirty) → id của nó vẫn ở
+    processing và được gộp vào lần này. Lỗi Redis → raise.
+    """
+    pipe = redis_conn.pipeline(transaction=True)
+    pipe.sunionstore(_STATS_PROCESSING_KEY, [_STATS_PROCESSING_KEY, _STATS_DIRTY_KEY])
+    pipe.delete(_STATS_DIRTY_KEY)
+    pipe.smembers(_STATS_PROCESSING_KEY)
+    *_, members = pipe.execute()
+    return sorted(int(m) for m in members)
+
+
+def ack_stats_dirty() -> None:
+    """Gọi sau khi commit Category_Stats cho các id của take_stats_dirty()."""
+    redis_conn.delete(_STATS_PROCESSING_KEY)
+
+
+def mark_stats_changed() -> None:
+    """Gọi sau khi commit Category_Stats: process API nạp lại số liệu."""
+    try:
+        redis_conn.incr(_STATS_VERSION_KEY)
+    except Exception as exc:
+        logger.debug("category tree: cannot bump stats version: %s", exc)
+
+
+def _sync_stats(db: Session, tree: _Tree) -> None:
+    now = time.time()
+    if now - _STATS.checked_at < _STATS_SYNC_INTERVAL:
+        return
+    _STATS.checked_at = now
+    try:
+        version = int(redis_conn.get(_STATS_VERSION_KEY) or 0)
+    except Exception as exc:
+        logger.debug("category tree: cannot read stats version: %s", exc)
+        version = -1  # Redis lỗi: nạp lại theo nhịp kiểm tra
+    if version == _STATS.version and version >= 0:
+        return
+    _STATS.rows = stats_crud.all_rows(db)
+    _STATS.version = version
+    tree.rollup = None
+    tree.rendered.clear()
+
+
+def _ensure_rollup(tree: _Tree) -> Dict[Tuple[str, ...], List[float]]:
+    if tree.rollup is None:
+        rollup: Dict[Tuple[str, ...], List[float]] = {}
+        for cid, row in _STATS.rows.items():
+            levels = tree.snap.levels_of.get(cid)
+            if not levels or not levels[0]:
+                continue
+            values = [row[f] for f in stats_crud.STAT_FIELDS]
+            keys = tuple(category_index.name_key(name) for name in levels if name)
+            for n in range(1, len(keys) + 1):
+                acc = rollup.setdefault(keys[:n], [0.0] * len(values))
+                for i, v in enumerate(values):
+                    acc[i] += v
+        tree.rollup = rollup
+    return tree.rollup
+
+
+def _stats_json(values: Optional[List[float]]) -> Dict[str, Any]:
+    v = dict(zip(stats_crud.STAT_FIELDS, values or [0.0] * len(stats_crud.STAT_FIELDS)))
+    return {
+        "product_count": int(v["Product_Count"]),
+        "active_count": int(v["Active_Count"]),
+        "avg_price": round(v["Price_Sum"] / v["Price_Count"], 2) if v["Price_Count"] else None,
+        "avg_rating": round(v["Rating_Sum"] / v["Rating_Count"], 2) if v["Rating_Count"] else None,
+        "sentiment": {
+            "positive": int(v["Positive_Count"]),
+            "neutral": int(v["Neutral_Count"]),
+            "negative": int(v["Negative_Count"]),
+        },
+    }
+
+
+def _to_json(
+    node: _Node,
+    depth: Optional[int],
+    keys: Tuple[str, ...] = (),
+    rollup: Optional[Dict[Tuple[str, ...], List[float]]] = None,
+) -> Dict[str, Any]:
+    children = sorted(node.children.items(), key=lambda kv: kv[0])
+    expand = depth is None or depth > 1
+    out: Dict[str, Any] = {"name": node.name, "has_children": bool(children)}
+    if rollup is not None and keys:
+        out["stats"] = _stats_json(rollup.get(keys))
+    out["children"] = [
+        _to_json(c, None if depth is None else depth - 1, keys + (k,), rollup) for k, c in children
+    ] if expand else []
+    return out
+
+
+def parse_path(path: Optional[str]) -> List[str]:
+    """"Lv1 > Lv2 > ..." (như Category_Path) → danh sách tên, bỏ phần rỗng."""
+    return [part.strip() for part in (path or "").split(PATH_SEPARATOR) if part.strip()]
+
+
+def render(
+    db: Session,
+    path: Sequence[str] = (),
+    depth: Optional[int] = None,
+    with_stats: bool = False,
+) -> Optional[Tuple[int, str, bytes]]:
+    """(version, etag, JSON bytes) của cây con tại path, sâu tối đa depth level; None nếu path không tồn tại.
+
+    path rỗng → danh sách danh mục cấp 1 (định dạng cũ của /categories/tree); còn lại
+    → 1 node {path, name, has_children, children}. Node bị cắt theo depth có
+    children = [] và has_children cho biết còn con để tải tiếp qua /subtree.
+    with_stats: thêm "stats" (số sản phẩm, đang bán, giá/rating TB, sentiment) cộng dồn cây con.
+    """
+    keys = tuple(category_index.name_key(name) for name in path)
+    with _LOCK:
+        tree = _sync(db)
+        if with_stats:
+            _sync_stats(db, tree)
+        cache_key = (keys, depth, with_stats)
+        if cache_key not in tree.rendered:
+            node, names = tree.find(keys)
+            if node is None:
+                rendered = None
+            else:
+                # depth = số level trả về dưới điểm được hỏi
+                rollup = _ensure_rollup(tree) if with_stats else None
+                data = _to_json(node, None if depth is None else depth + 1, keys, rollup)
+                payload: Any = {"path": " > ".join(names), **data} if keys else data["children"]
+                body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                rendered = (f'"{hashlib.sha1(body).hexdigest()[:20]}"', body)
+            if len(tree.rendered) >= _RENDER_CACHE_MAX:
+                tree.rendered.clear()
+            tree.rendered[cache_key] = rendered
+        result = tree.rendered[cache_key]
+        version = tree.version
+    if result is None:
+        return None
+    return version, result[0], result[1]
@@ -1,17 +1,34 @@
+import hashlib
 import json
 import os
-import google.generativeai as genai
 from typing import Dict, Any
 from app.config import settings
+from app.cache import aget_json, aset_json
 
 # 1. IN RA LOG XEM CÓ KEY CHƯA (Che bớt key để bảo mật)
 raw_key = settings.API_KEY_GEMINI or os.getenv("API_KEY_GEMINI")
 if raw_key:
     print(f"🔑 [DEBUG] API Key loaded: {raw_key[:5]}...{raw_key[-3:]}")
-    genai.configure(api_key=raw_key)
 else:
     print("❌ [DEBUG] API KEY IS MISSING/NONE! Code will skip Gemini.")
 
+AI_BUSY_MESSAGE = "Hệ thống AI đang bận xíu, bạn thử lại sau nha."
+# Cùng câu hỏi → cùng intent: cache để không gọi lại Gemini (vài trăm ms + quota)
+INTENT_CACHE_TTL = 24 * 3600
+
+# google-generativeai (grpc, protobuf...) chỉ import + configure ở lần gọi đầu tiên
+_GENAI = None
+
+
+def _get_genai():
+    global _GENAI
+    if _GENAI is None:
+        import google.generativeai as genai
+
+        genai.configure(api_key=raw_key)
+        _GENAI = genai
+    return _GENAI
+
 async def parse_search_intent(message: str) -> Dict[str, Any]:
     print(f"⚡ [DEBUG] Starting intent analysis for: '{message}'")
 
@@ -20,7 +37,7 @@ async def parse_search_intent(message: str) -> Dict[str, Any]:
         print("⚠️ [DEBUG] No API Key -> FALLBACK MODE ACTIVATED")
         return {"is_searching": True, "product_name": message}
 
-    model = genai.GenerativeModel(
+    model = _get_genai().GenerativeModel(
         'gemini-2.5-flash',
         generation_config={"temperature": 0.1, "response_mime_type": "application/json"}
     )
@@ -104,5 +121,19 @@ async def parse_search_intent(message: str) -> Dict[str, Any]:
         # Trả về tin nhắn báo lỗi nhẹ nhàng, không crash app
         return {
             "is_searching": False, 
-            "message": "Hệ thống AI đang bận xíu, bạn thử lại sau nha."
-        }
\ No newline at end of file
+            "message": AI_BUSY_MESSAGE
+        }
+
+
+async def parse_search_intent_cached(message: str) -> Dict[str, Any]:
+    """parse_search_intent qua cache (client Redis async); không cache fallback/lỗi."""
+    normalized = " ".join((message or "").lower().split())
+    cache_key = f"cache:intent:{hashlib.sha1(normalized.encode('utf-8')).hexdigest()}"
+    cached = await aget_json(cache_key)
+    if cached is not None:
+        return cached
+
+    intent = await parse_search_intent(message)
+    if raw_key and intent.get("message") != AI_BUSY_MESSAGE:
+        await aset_json(cache_key, intent, ttl_seconds=INTENT_CACHE_TTL)
+    return intent
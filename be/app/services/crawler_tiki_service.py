@@ -11,7 +11,7 @@ from sqlalchemy.orm import Session
 
 from ..crud import products as product_crud
 from ..services.category_service import create_or_get_category
-from ..services.sentiment_service import analyze_comment, label_sentiment
+from ..services.sentiment_service import label_sentiment, score_comments, sync_product_sentiment
 from ..services.http_async import get_json_with_session, bounded_gather
 
 
@@ -442,7 +442,7 @@ def update_sentiment_from_tiki_reviews(db: Session, product_id: int) -> Optional
         product_crud.update_sentiment(db, product_id, score=None, label=None)
         return None
 
-    scores = [analyze_comment(c) for c in comments if c]
+    scores = score_comments(comments)
     if not scores:
         product_crud.update_sentiment(db, product_id, score=None, label=None)
         return None
@@ -1087,20 +1087,11 @@ def search_and_crawl_tiki_products_fast(db: Session, keyword: str, limit: int =
 # Override earlier definition with async-powered implementation
 def update_sentiment_from_tiki_reviews(db: Session, product_id: int) -> Optional[float]:
     comments = _run_coro_safely(aget_product_reviews(product_id, limit=20))
-
-    if not comments:
-        product_crud.update_sentiment(db, product_id, score=None, label=None)
-        return None
-
-    scores = [analyze_comment(c) for c in comments if c]
-    if not scores:
-        product_crud.update_sentiment(db, product_id, score=None, label=None)
+    product = product_crud.get_by_external_id(db, product_id)
+    if not product:
         return None
-
-    avg_score = sum(scores) / len(scores)
-    label = label_sentiment(avg_score)
-    product_crud.update_sentiment(db, product_id, score=avg_score, label=label)
-    return avg_score
+    # Chỉ chấm review mới/đổi, review đã có score lấy từ Reviews_Cache
+    return sync_product_sentiment(db, product, comments or [])
 
 
 # Also override get_product_reviews to use async implementation
@@ -1113,18 +1104,11 @@ def get_product_reviews(
 
 
 def update_sentiment_with_comments(db: Session, product_id: int, comments: List[str]) -> Optional[float]:
-    comments = [c for c in (comments or []) if c]
-    if not comments:
-        product_crud.update_sentiment(db, product_id, score=None, label=None)
-        return None
-    scores = [analyze_comment(c) for c in comments]
-    if not scores:
-        product_crud.update_sentiment(db, product_id, score=None, label=None)
+    product = product_crud.get_by_external_id(db, product_id)
+    if not product:
         return None
-    avg_score = sum(scores) / len(scores)
-    label = label_sentiment(avg_score)
-    product_crud.update_sentiment(db, product_id, score=avg_score, label=label)
-    return avg_score
+    # comments chỉ là mẫu vài trang đầu → không xoá review Tiki đã lưu mà mẫu không có
+    return sync_product_sentiment(db, product, comments or [], complete=False)
 
 
 # Override get_tiki_ids to async wrapper to remove requests dependency
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import unicodedata
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from ..rq_conn import redis_conn
+
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# Content-addressed cache cho embedding của review
+# ==========================================================
+# Key = sha1(model | revision | text đã chuẩn hoá) nên cùng một review
+# crawl lại nhiều lần chỉ encode đúng 1 lần. Giá trị là vector float16
+# (768 chiều ~ 1.5KB) thay vì score để đổi anchors không làm hỏng cache.
+# TTL được gia hạn mỗi lần hit (sliding) → Redis với
+# maxmemory-policy=volatile-lru sẽ đẩy ra các review ít dùng nhất.
+_KEY_PREFIX = "emb:v1:"
+_TTL_SECONDS = 30 * 24 * 3600
+_DTYPE = np.float16
+
+
+def normalize_text(text: str) -> str:
+    """NFC + gộp khoảng trắng: 2 review chỉ khác whitespace dùng chung 1 key."""
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+
+def text_key(model_name: str, revision: str, text: str) -> str:
+    digest = hashlib.sha1(
+        f"{model_name}\x1f{revision}\x1f{normalize_text(text)}".encode("utf-8")
+    ).hexdigest()
+    return _KEY_PREFIX + digest
+
+
+def get_many(keys: Sequence[str]) -> List[Optional[np.ndarray]]:
+    """MGET các embedding; phần tử None = miss (hoặc Redis lỗi)."""
+    if not keys:
+        return []
+    try:
+        raws = redis_conn.mget(list(keys))
+    except Exception as exc:
+        logger.debug("embedding cache error on mget: %s", exc)
+        return [None] * len(keys)
+
+    out: List[Optional[np.ndarray]] = []
+    hits: List[str] = []
+    for key, raw in zip(keys, raws):
+        if raw is None:
+            out.append(None)
+            continue
+        out.append(np.frombuffer(raw, dtype=_DTYPE).astype(np.float32))
+        hits.append(key)
+
+    if hits:
+        try:
+            pipe = redis_conn.pipeline(transaction=False)
+            for key in hits:
+                pipe.expire(key, _TTL_SECONDS)
+            pipe.execute()
+        except Exception as exc:
+            logger.debug("embedding cache error on touch: %s", exc)
+    logger.debug("embedding cache: %s/%s hit", len(hits), len(keys))
+    return out
+
+
+def set_many(keys: Sequence[str], embeddings: np.ndarray) -> None:
+    if not len(keys):
+        return
+    try:
+        pipe = redis_conn.pipeline(transaction=False)
+        for key, emb in zip(keys, embeddings):
+            pipe.setex(key, _TTL_SECONDS, np.asarray(emb, dtype=_DTYPE).tobytes())
+        pipe.execute()
+    except Exception as exc:
+        logger.debug("embedding cache error on set: %s", exc)
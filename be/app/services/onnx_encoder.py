@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import json
+import os
+from typing import List
+
+import numpy as np
+
+# ==========================================================
+# ONNX Runtime backend cho sentence embedder (CPU, int8)
+# ==========================================================
+# Artifact được tạo bởi be/scripts/export_sentiment_onnx.py:
+#   <dir>/model.onnx          – fp32 export của transformer
+#   <dir>/model.int8.onnx     – dynamic int8 quantization
+#   <dir>/pooling.json        – pooling mode + max_seq_length của SentenceTransformer
+#   <dir>/tokenizer files     – tokenizer.save_pretrained(...)
+INT8_FILE = "model.int8.onnx"
+FP32_FILE = "model.onnx"
+POOLING_FILE = "pooling.json"
+
+
+def artifact_dir(cache_folder: str, model_name: str, revision: str) -> str:
+    return os.path.join(cache_folder, "onnx", f"{model_name.replace('/', '--')}-{revision}")
+
+
+class OnnxEncoder:
+    """Thay thế SentenceTransformer.encode bằng onnxruntime (cùng chữ ký encode)."""
+
+    def __init__(self, model_dir: str, *, quantized: bool = True, batch_size: int = 32):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(model_dir, POOLING_FILE), encoding="utf-8") as f:
+            pooling = json.load(f)
+        self.pooling_mode = pooling.get("pooling_mode", "mean")
+        self.max_seq_length = int(pooling.get("max_seq_length") or 512)
+        self.batch_size = batch_size
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, INT8_FILE if quantized else FP32_FILE),
+            sess_options=opts,
+            providers=["CPUExecutionProvider"],
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def _pool(self, hidden: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        if self.pooling_mode == "cls":
+            return hidden[:, 0]
+        m = mask[..., None].astype(hidden.dtype)
+        return (hidden * m).sum(axis=1) / np.clip(m.sum(axis=1), 1e-9, None)
+
+    def encode(self, texts: List[str], normalize_embeddings: bool = True, **_) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        # Sắp theo độ dài để mỗi batch ít padding nhất, trả lại đúng thứ tự ban đầu
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        out: List[np.ndarray] = [None] * len(texts)  # type: ignore[list-item]
+        for start in range(0, len(order), self.batch_size):
+            idx = order[start:start + self.batch_size]
+            enc = self.tokenizer(
+                [texts[i] for i in idx],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np",
+            )
+            feeds = {k: v.astype(np.int64) for k, v in enc.items() if k in self._input_names}
+            hidden = self.session.run(None, feeds)[0]
+            emb = self._pool(hidden, enc["attention_mask"])
+            if normalize_embeddings:
+                emb = emb / np.clip(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12, None)
+            for i, e in zip(idx, emb):
+                out[i] = e.astype(np.float32)
+        return np.vstack(out)
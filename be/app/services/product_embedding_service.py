@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import hashlib
+import html
+import logging
+import re
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from ..crud import product_embeddings as embedding_crud
+from ..models.products import Products
+from . import category_index, sentiment_service
+from .embedding_cache import normalize_text
+from .semantic_index import quantize
+
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# Tính vector ngữ nghĩa cho sản phẩm (chạy trong worker)
+# ==========================================================
+# Text = tên + brand + đường dẫn danh mục + mô tả (bỏ HTML, cắt DESCRIPTION_MAX_CHARS).
+# Text_Hash lưu kèm vector nên chạy lại trên sản phẩm không đổi các phần này sẽ
+# không encode lại; sửa mô tả thì hash đổi → encode lại.
+EMBED_BATCH = 64
+DESCRIPTION_MAX_CHARS = 1000
+
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+def _plain_description(description: Optional[str]) -> str:
+    """Mô tả Tiki là HTML → text thuần, cắt theo ranh giới từ."""
+    text = normalize_text(html.unescape(_TAG_RE.sub(" ", description or "")))
+    if len(text) <= DESCRIPTION_MAX_CHARS:
+        return text
+    return text[:DESCRIPTION_MAX_CHARS].rsplit(" ", 1)[0]
+
+
+def product_text(
+    name: Optional[str],
+    brand: Optional[str],
+    levels: Sequence[Optional[str]] = (),
+    description: Optional[str] = None,
+) -> str:
+    parts = [name or ""]
+    if brand:
+        parts.append(f"Thương hiệu: {brand}")
+    path = " > ".join(lv for lv in levels if lv)
+    if path:
+        parts.append(f"Danh mục: {path}")
+    desc = _plain_description(description)
+    if desc:
+        parts.append(f"Mô tả: {desc}")
+    return normalize_text(". ".join(parts))
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def embed_products(db: Session, product_ids: Sequence[int]) -> Dict[str, int]:
+    """Encode + lưu vector cho các Product_ID có text đổi so với vector đang lưu.
+
+    "failed" > 0: model không dùng được giữa chừng, còn sản phẩm chưa encode.
+    """
+    ids = sorted({int(pid) for pid in product_ids})
+    if not ids:
+        return {"embedded": 0, "unchanged": 0, "failed": 0}
+
+    # Key theo env process này chỉ là đoán ban đầu; key thật đi kèm vector đã encode
+    model_key = sentiment_service.embedding_model_key()
+    snap = category_index.snapshot(db)
+    stored = embedding_crud.get_hashes(db, ids, model_key)
+
+    pending: List[tuple] = []  # (Product_ID, text, hash)
+    for i in range(0, len(ids), 1000):
+        rows = (
+            db.query(
+                Products.Product_ID, Products.Product_Name, Products.Brand, Products.Category_ID, Products.Description
+            )
+            .filter(Products.Product_ID.in_(ids[i:i + 1000]))
+            .all()
+        )
+        for pid, name, brand, category_id, description in rows:
+            text = product_text(name, brand, snap.levels_of.get(category_id, ()), description)
+            h = _text_hash(text)
+            if stored.get(int(pid)) != h:
+                pending.append((int(pid), text, h))
+
+    embedded = 0
+    i = 0
+    while i < len(pending):
+        batch = pending[i:i + EMBED_BATCH]
+        encoded = sentiment_service.encode_texts_keyed([text for _, text, _ in batch], use_cache=False)
+        if encoded is None:
+            logger.warning("product embeddings: model unavailable, %s products left", len(pending) - i)
+            break
+        vectors, key = encoded
+        if key != model_key:
+            # Inference service chạy model/backend khác env process này: lưu theo key
+            # của service, so lại hash phần còn lại với vector đang lưu dưới key đó
+            model_key = key
+            rest = pending[i + len(batch):]
+            stored = embedding_crud.get_hashes(db, [pid for pid, _, _ in rest], model_key)
+            pending = pending[:i + len(batch)] + [p for p in rest if stored.get(p[0]) != p[2]]
+        q, scales = quantize(vectors)
+        embedding_crud.upsert_many(db, [
+            {
+                "Product_ID": pid,
+                "Model_Key": model_key,
+                "Text_Hash": h,
+                "Vector": q[j].tobytes(),
+                "Scale": float(scales[j]),
+            }
+            for j, (pid, _, h) in enumerate(batch)
+        ])
+        db.commit()
+        embedded += len(batch)
+        i += len(batch)
+    return {"embedded": embedded, "unchanged": len(ids) - len(pending), "failed": len(pending) - embedded}
@@ -1,12 +1,15 @@
+import hashlib
 from typing import Any, Dict, Optional, Sequence
 from datetime import datetime
 
 from sqlalchemy.orm import Session
 from sqlalchemy import func, case
 
+from ..cache import get_or_compute
 from ..crud import products as product_crud
 from ..models.products import Products
 from ..models.categories import Categories
+from ..services import category_index, search_index
 
 
 def get_product_detail(db: Session, product_id: int) -> Optional[Products]:
@@ -52,8 +55,11 @@ def filter_products_service(
     is_vietnam_origin=False,
     is_vietnam_brand=False,
     positive_over=None,
+    cursor: Optional[str] = None,
+    exact_total: bool = False,
+    active_only: bool = False,
 ):
-    items, total = product_crud.get_products_by_category_and_filters(
+    items, total, next_cursor = product_crud.get_products_by_category_and_filters(
         db=db,
         lv1=lv1,
         lv2=lv2,
@@ -70,8 +76,11 @@ def filter_products_service(
         is_vietnam_origin=is_vietnam_origin,
         is_vietnam_brand=is_vietnam_brand,
         positive_over=positive_over,
+        cursor=cursor,
+        exact_total=exact_total,
+        active_only=active_only,
     )
-    return items, total
+    return items, total, next_cursor
 
 
 def search_products_service(
@@ -92,8 +101,12 @@ def search_products_service(
     is_vietnam_origin: bool = False,
     is_vietnam_brand: bool = False,
     positive_over: Optional[int] = None,
+    cursor: Optional[str] = None,
+    exact_total: bool = False,
+    active_only: bool = False,
+    mode: str = "keyword",
 ):
-    items, total = product_crud.search_products_by_keyword_and_filters(
+    items, total, next_cursor = product_crud.search_products_by_keyword_and_filters(
         db=db,
         keyword=keyword,
         limit=limit,
@@ -111,8 +124,46 @@ def search_products_service(
         is_vietnam_origin=is_vietnam_origin,
         is_vietnam_brand=is_vietnam_brand,
         positive_over=positive_over,
+        cursor=cursor,
+        exact_total=exact_total,
+        active_only=active_only,
+        mode=mode,
     )
-    return items, total
+    return items, total, next_cursor
+
+# Facet cache gắn tag phạm vi (catalog / scope:lvN:tên) – ghi sản phẩm trong phạm vi
+# đó invalidate tag (crud.products.invalidate_product_caches) nên TTL dài được.
+FACETS_TTL_SECONDS = 6 * 3600
+FACETS_STALE_SECONDS = 600
+
+
+def get_facets_service(
+    db: Session,
+    *,
+    keyword: Optional[str] = None,
+    lv1: Optional[str] = None,
+    lv2: Optional[str] = None,
+    lv3: Optional[str] = None,
+    lv4: Optional[str] = None,
+    lv5: Optional[str] = None,
+    active_only: bool = True,
+) -> Dict[str, Any]:
+    scope = category_index.scope_tag(lv1, lv2, lv3, lv4, lv5)
+    signature = repr((lv1, lv2, lv3, lv4, lv5, search_index.fold(keyword), active_only))
+    cache_key = f"cache:facets:{scope}:{hashlib.sha1(signature.encode('utf-8')).hexdigest()}"
+    return get_or_compute(
+        cache_key,
+        lambda: product_crud.get_facet_counts(
+            db,
+            keyword=keyword,
+            lv1=lv1, lv2=lv2, lv3=lv3, lv4=lv4, lv5=lv5,
+            active_only=active_only,
+        ),
+        ttl=FACETS_TTL_SECONDS,
+        stale_ttl=FACETS_STALE_SECONDS,
+        tags=[category_index.cache_tag(scope)],
+    )
+
 
 """Đây là service lấy danh sách sản phẩm nổi bật dựa trên điểm số AI và lượt tìm kiếm cho adminu"""
 
@@ -154,21 +205,8 @@ def get_sentiment_by_category(
     - Có thể lọc theo lv1..lv5, khoảng thời gian (from_date/to_date) dựa trên Updated_At.
     """
 
-    # Chuẩn hóa sentiment về 3 nhãn để tổng hợp
-    sentiment_lower = func.lower(func.trim(func.coalesce(Products.Sentiment_Label, "")))
-
-    # Map both English and Vietnamese labels into unified buckets
-    positive_aliases = [
-        "positive", "tốt", "tot", "tích cực", "tich cuc", "tichcuc",
-        "tuyệt vời", "tuyet voi", "hài lòng", "hai long",
-    ]
-    negative_aliases = [
-        "negative", "kém", "kem", "xấu", "xau", "tệ", "te",
-        "thất vọng", "that vong", "không tốt", "khong tot",
-    ]
-
-    positive_pred = sentiment_lower.in_(positive_aliases)
-    negative_pred = sentiment_lower.in_(negative_aliases)
+    # Chuẩn hóa sentiment về 3 nhãn để tổng hợp (cả nhãn tiếng Anh lẫn tiếng Việt)
+    positive_pred, negative_pred = product_crud.sentiment_predicates()
 
     positive_count = func.sum(case((positive_pred, 1), else_=0))
     negative_count = func.sum(case((negative_pred, 1), else_=0))
@@ -3,7 +3,9 @@ from sqlalchemy.orm import Session
 from typing import Sequence
 from ..models.products import Products
 from ..services.risk_service import evaluate_risk
-from ..cache import get_json, set_json
+from ..cache import category_tag, get_many, product_tag, set_many
+
+RISK_CACHE_TTL = 6 * 3600
 
 
 def recommend_best_in_category(db: Session, product_id: int, limit: int = 5) -> Sequence[Products]:
@@ -44,16 +46,29 @@ def recommend_best_in_category(db: Session, product_id: int, limit: int = 5) ->
         .all()
     )
 
+    # Risk cache đọc 1 lần cho cả danh sách; chỉ ứng viên miss mới evaluate_risk
+    keys = {p.Product_ID: f"cache:risk:{p.Product_ID}" for p in candidates}
+    # evaluate_risk so với thống kê danh mục → đổi danh mục cũng phải làm mới risk
+    risk_tags = {
+        keys[p.Product_ID]: [product_tag(p.Product_ID)] + ([category_tag(p.Category_ID)] if p.Category_ID else [])
+        for p in candidates
+    }
+    cached = get_many(keys.values())
+    computed = {}
     safe_products = []
     for p in candidates:
-        cache_key = f"cache:risk:{p.Product_ID}"
-        risk = get_json(cache_key)
-        if not risk:
-            risk = evaluate_risk(p, db)
-            set_json(cache_key, risk, ttl_seconds=3600)
+        key = keys[p.Product_ID]
+        risk = cached.get(key)
+        if risk is None:
+            risk = computed[key] = evaluate_risk(p, db)
         if risk.get("risk_score", 1) < 0.6:
             safe_products.append(p)
         if len(safe_products) >= limit:
             break
 
+    set_many(
+        computed,
+        ttl_seconds=RISK_CACHE_TTL,
+        tags=risk_tags,
+    )
     return safe_products
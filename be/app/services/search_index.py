@@ -0,0 +1,357 @@
+from __future__ import annotations
+
+import bisect
+import logging
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal
+from ..models.products import Products
+from ..rq_conn import redis_conn
+
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# Inverted index in-process cho local search (tên + brand)
+# ==========================================================
+# Token đã bỏ dấu + lowercase ("Nồi cơm điện" → noi, com, dien) nên gõ
+# không dấu vẫn ra. Query: AND tất cả token, token cuối match theo prefix
+# (gõ tới đâu ra tới đó). Ranking BM25, caller trộn với smart score.
+#
+# Đồng bộ giữa các process (API nhiều worker + RQ worker cùng ghi Products):
+#   - Ghi sản phẩm → mark_dirty(ids): INCR seq, ZADD ids với score = seq
+#   - Mỗi process nhớ seq đã áp dụng, query sau thấy seq Redis lớn hơn thì
+#     đọc lại đúng các Product_ID đó từ DB (ZRANGEBYSCORE)
+#   - Zset bị cắt bớt → process tụt quá xa (seq < floor) sẽ rebuild toàn bộ
+#   - Rebuild định kỳ REBUILD_SECONDS làm lưới an toàn
+_SEQ_KEY = "search:index:seq"
+_DIRTY_KEY = "search:index:dirty"
+_FLOOR_KEY = "search:index:floor"
+_MAX_DIRTY = 50_000
+_SYNC_INTERVAL = 1.0
+REBUILD_SECONDS = int(os.getenv("SEARCH_INDEX_REBUILD_SECONDS", str(6 * 3600)))
+
+_K1 = 1.2
+_B = 0.75
+_MIN_PREFIX_LEN = 2
+_MAX_PREFIX_TERMS = 200
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def fold(text: Optional[str]) -> str:
+    """Bỏ dấu tiếng Việt + lowercase: "Điện Thoại" → "dien thoai"."""
+    if not text:
+        return ""
+    s = unicodedata.normalize("NFD", text.replace("đ", "d").replace("Đ", "D"))
+    return "".join(ch for ch in s if unicodedata.category(ch) != "Mn").lower()
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _TOKEN_RE.findall(fold(text))
+
+
+class _Index:
+    def __init__(self) -> None:
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)  # token → {pid: tf}
+        self.doc_tokens: Dict[int, List[str]] = {}
+        self.total_len = 0
+        self._vocab: List[str] = []
+        self._vocab_stale = True
+
+    # ---------------- write ----------------
+    def remove(self, pid: int) -> None:
+        tokens = self.doc_tokens.pop(pid, None)
+        if tokens is None:
+            return
+        self.total_len -= len(tokens)
+        for tok in set(tokens):
+            docs = self.postings.get(tok)
+            if docs is None:
+                continue
+            docs.pop(pid, None)
+            if not docs:
+                del self.postings[tok]
+                self._vocab_stale = True
+
+    def upsert(self, pid: int, name: Optional[str], brand: Optional[str]) -> None:
+        self.remove(pid)
+        tokens = tokenize(name) + tokenize(brand)
+        if not tokens:
+            return
+        self.doc_tokens[pid] = tokens
+        self.total_len += len(tokens)
+        tf: Dict[str, int] = defaultdict(int)
+        for tok in tokens:
+            tf[tok] += 1
+        for tok, n in tf.items():
+            if tok not in self.postings:
+                self._vocab_stale = True
+            self.postings[tok][pid] = n
+
+    # ---------------- read ----------------
+    def _expand(self, prefix: str) -> List[str]:
+        if self._vocab_stale:
+            self._vocab = sorted(self.postings)
+            self._vocab_stale = False
+        start = bisect.bisect_left(self._vocab, prefix)
+        out: List[str] = []
+        for term in self._vocab[start:start + _MAX_PREFIX_TERMS]:
+            if not term.startswith(prefix):
+                break
+            out.append(term)
+        return out
+
+    def search(self, query: str, limit: Optional[int]) -> List[Tuple[int, float]]:
+        q_tokens = tokenize(query)
+        if not q_tokens or not self.doc_tokens:
+            return []
+
+        # Mỗi token query → danh sách term trong index; token cuối được mở rộng prefix
+        groups: List[List[str]] = []
+        for i, tok in enumerate(q_tokens):
+            if i == len(q_tokens) - 1 and len(tok) >= _MIN_PREFIX_LEN:
+                terms = self._expand(tok)
+            else:
+                terms = [tok] if tok in self.postings else []
+            if not terms:
+                return []
+            groups.append(terms)
+
+        # AND: giao các tập doc, bắt đầu từ nhóm hiếm nhất
+        doc_sets = []
+        for terms in groups:
+            docs: Set[int] = set()
+            for term in terms:
+                docs.update(self.postings[term])
+            doc_sets.append(docs)
+        doc_sets.sort(key=len)
+        candidates = set(doc_sets[0])
+        for docs in doc_sets[1:]:
+            candidates &= docs
+            if not candidates:
+                return []
+
+        n_docs = len(self.doc_tokens)
+        avgdl = self.total_len / n_docs
+        scores: Dict[int, float] = {}
+        for terms in groups:
+            # Token prefix: lấy term khớp tốt nhất trong doc (không cộng dồn)
+            best: Dict[int, float] = {}
+            for term in terms:
+                docs = self.postings[term]
+                idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                for pid in candidates.intersection(docs):
+                    tf = docs[pid]
+                    dl = len(self.doc_tokens[pid])
+                    s = idf * tf * (_K1 + 1) / (tf + _K1 * (1 - _B + _B * dl / avgdl))
+                    if s > best.get(pid, 0.0):
+                        best[pid] = s
+            for pid, s in best.items():
+                scores[pid] = scores.get(pid, 0.0) + s
+
+        ranked = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))
+        return ranked if limit is None else ranked[:limit]
+
+
+_INDEX: Optional[_Index] = None
+_BUILT_AT = 0.0
+_APPLIED_SEQ = 0
+_LAST_SYNC = 0.0
+_LOCK = threading.Lock()
+_BUILDING = threading.Event()
+
+
+def current_seq() -> Optional[int]:
+    """Seq mới nhất của change feed Products; None nếu Redis lỗi."""
+    try:
+        return int(redis_conn.get(_SEQ_KEY) or 0)
+    except Exception as exc:
+        logger.debug("search index: cannot read seq: %s", exc)
+        return None
+
+
+def changed_since(after_seq: int, upto_seq: int) -> Optional[List[int]]:
+    """Product_ID được ghi trong (after_seq, upto_seq].
+
+    None nếu feed đã bị cắt qua after_seq (caller phải rebuild). Lỗi Redis → raise.
+    Dùng chung cho các index in-process khác dựng từ Products (autocomplete...).
+    """
+    floor = int(redis_conn.get(_FLOOR_KEY) or 0)
+    if after_seq < floor:
+        return None
+    return [int(x) for x in redis_conn.zrangebyscore(_DIRTY_KEY, f"({after_seq}", upto_seq)]
+
+
+def _rebuild(db: Session) -> None:
+    """Dựng index mới ngoài _LOCK rồi swap vào; search vẫn chạy trên index cũ."""
+    global _INDEX, _BUILT_AT, _APPLIED_SEQ
+    start = time.perf_counter()
+    # Đọc seq trước khi quét DB: ghi xảy ra trong lúc quét sẽ được áp lại ở lần sync sau
+    seq = current_seq()
+    index = _Index()
+    rows = (
+        db.query(Products.Product_ID, Products.Product_Name, Products.Brand)
+        .yield_per(5000)
+    )
+    for pid, name, brand in rows:
+        index.upsert(int(pid), name, brand)
+    with _LOCK:
+        _INDEX = index
+        _BUILT_AT = time.time()
+        _APPLIED_SEQ = seq or 0
+    logger.info(
+        "search index rebuilt: %s docs, %s terms in %.2fs",
+        len(index.doc_tokens), len(index.postings), time.perf_counter() - start,
+    )
+
+
+def _rebuild_in_background() -> None:
+    # Gọi khi đang giữ _LOCK (từ search) hoặc không – chỉ đụng _BUILDING
+    if _BUILDING.is_set():
+        return
+    _BUILDING.set()
+
+    def _run() -> None:
+        db = SessionLocal()
+        try:
+            _rebuild(db)
+        except Exception as exc:
+            logger.warning("search index rebuild failed: %s", exc)
+        finally:
+            db.close()
+            _BUILDING.clear()
+
+    threading.Thread(target=_run, daemon=True).start()
+
+
+def warm_up_in_background() -> None:
+    """Gọi lúc API startup: dựng index trên thread riêng, không chặn khởi động."""
+    with _LOCK:
+        _rebuild_in_background()
+
+
+def _apply_dirty(db: Session, seq: int) -> bool:
+    """Áp các Product_ID đổi sau _APPLIED_SEQ. False nếu phải rebuild."""
+    global _APPLIED_SEQ
+    try:
+        ids = changed_since(_APPLIED_SEQ, seq)
+    except Exception as exc:
+        logger.debug("search index: cannot read dirty set: %s", exc)
+        return True
+    if ids is None:
+        return False
+
+    for i in range(0, len(ids), 1000):
+        chunk = ids[i:i + 1000]
+        rows = (
+            db.query(Products.Product_ID, Products.Product_Name, Products.Brand)
+            .filter(Products.Product_ID.in_(chunk))
+            .all()
+        )
+        found = set()
+        for pid, name, brand in rows:
+            _INDEX.upsert(int(pid), name, brand)
+            found.add(int(pid))
+        for pid in chunk:
+            if pid not in found:
+                _INDEX.remove(pid)
+    _APPLIED_SEQ = seq
+    return True
+
+
+def _ensure_fresh(db: Session) -> None:
+    """Gọi trong _LOCK. Rebuild toàn bộ luôn chạy nền; request chỉ áp delta nhỏ."""
+    global _LAST_SYNC
+    now = time.time()
+    if _INDEX is None:
+        _rebuild_in_background()
+        return
+    if now - _BUILT_AT > REBUILD_SECONDS:
+        _rebuild_in_background()
+    if now - _LAST_SYNC < _SYNC_INTERVAL:
+        return
+    _LAST_SYNC = now
+    seq = current_seq()
+    if seq is None or seq <= _APPLIED_SEQ:
+        return
+    if not _apply_dirty(db, seq):
+        # Feed đã cắt qua seq của index: phục vụ index hiện tại tới khi bản mới xong
+        _rebuild_in_background()
+
+
+def search(db: Session, query: str, limit: Optional[int] = 2000) -> List[Tuple[int, float]]:
+    """[(Product_ID, bm25)] giảm dần; mọi token phải có mặt, token cuối match prefix.
+
+    Index chưa dựng xong (vừa khởi động) → [] thay vì chặn request.
+    """
+    with _LOCK:
+        _ensure_fresh(db)
+        if _INDEX is None:
+            return []
+        return _INDEX.search(query, limit)
+
+
+# INCR seq + ZADD + cắt feed trong 1 lệnh: 2 round trip riêng thì writer A (seq 5)
+# có thể ZADD sau writer B (seq 6) → reader đã áp tới 6 bỏ sót id của A.
+# ARGV[1] = _MAX_DIRTY, ARGV[2..] = Product_ID.
+_MARK_DIRTY = """
+local seq = redis.call('incr', KEYS[1])
+local args = {}
+for i = 2, #ARGV do
+    args[#args + 1] = seq
+    args[#args + 1] = ARGV[i]
+    if #args >= 2000 then
+        redis.call('zadd', KEYS[2], unpack(args))
+        args = {}
+    end
+end
+if #args > 0 then
+    redis.call('zadd', KEYS[2], unpack(args))
+end
+local excess = redis.call('zcard', KEYS[2]) - tonumber(ARGV[1])
+if excess > 0 then
+    local dropped = redis.call('zrange', KEYS[2], excess - 1, excess - 1, 'WITHSCORES')
+    redis.call('set', KEYS[3], dropped[2])
+    redis.call('zremrangebyrank', KEYS[2], 0, excess - 1)
+end
+return seq
+"""
+
+
+def mark_dirty(product_ids: Iterable[Optional[int]]) -> None:
+    """Gọi sau khi commit ghi Products (tạo/sửa/xoá) để mọi process cập nhật index."""
+    ids = [int(pid) for pid in product_ids if pid is not None]
+    if not ids:
+        return
+    try:
+        redis_conn.eval(_MARK_DIRTY, 3, _SEQ_KEY, _DIRTY_KEY, _FLOOR_KEY, _MAX_DIRTY, *ids)
+    except Exception as exc:
+        logger.debug("search index: cannot mark dirty %s: %s", ids[:5], exc)
+
+
+def invalidate_local() -> None:
+    """Bỏ index của process hiện tại, lần search sau rebuild từ DB."""
+    global _INDEX
+    with _LOCK:
+        _INDEX = None
+
+
+def stats() -> Dict[str, int]:
+    index = _INDEX
+    if index is None:
+        return {"built": 0, "docs": 0, "terms": 0, "applied_seq": _APPLIED_SEQ}
+    return {
+        "built": int(_BUILT_AT),
+        "docs": len(index.doc_tokens),
+        "terms": len(index.postings),
+        "applied_seq": _APPLIED_SEQ,
+    }
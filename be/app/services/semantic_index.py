@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple, Type
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from ..crud import product_embeddings as embedding_crud
+from . import sentiment_client
+
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# Vector index in-process cho semantic search sản phẩm
+# ==========================================================
+# Vector sản phẩm do worker tính lúc ingest (tasks/embeddings.py) và lưu int8 trong
+# bảng Product_Embeddings. Mỗi process API dump toàn bộ vector của model hiện tại ra
+# file memmap (int8: 768B/sản phẩm → 1M sản phẩm ~ 770MB trên đĩa, RAM chỉ giữ
+# page đang dùng), vector ghi sau đó vào delta nhỏ trong RAM (đọc theo Updated_At).
+#
+# Backend tìm kiếm chọn qua SEMANTIC_INDEX_BACKEND; hiện chỉ có "exact" (matmul
+# NumPy theo block, đúng tuyệt đối). ANN (HNSW/IVF...) chỉ cần thêm class con của
+# VectorIndex và đăng ký vào _BACKENDS.
+INDEX_DIR = os.getenv("SEMANTIC_INDEX_DIR", os.path.join(tempfile.gettempdir(), "vietchoice_vectors"))
+BACKEND = os.getenv("SEMANTIC_INDEX_BACKEND", "exact")
+REBUILD_SECONDS = int(os.getenv("SEMANTIC_INDEX_REBUILD_SECONDS", str(6 * 3600)))
+MIN_SCORE = float(os.getenv("SEMANTIC_MIN_SCORE", "0.35"))
+# Query encode nằm trên request path: service chậm/quá tải thì bỏ semantic, dùng keyword
+QUERY_EMBED_TIMEOUT = float(os.getenv("SEMANTIC_QUERY_TIMEOUT", "1.5"))
+DELTA_MAX = 20_000
+_SYNC_INTERVAL = 5.0
+_PAGE_SIZE = 5000
+# Ghi Updated_At theo đồng hồ worker → đọc lùi một chút để không sót khi lệch giờ
+_CLOCK_SKEW = timedelta(seconds=10)
+
+
+def quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """float32 [n, dim] → (int8 [n, dim], scale [n]) với scale = max|v| / 127."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    q = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return q, scales.astype(np.float32)
+
+
+class VectorIndex:
+    """Interface backend: ids int64 [n], vectors int8 [n, dim], scales float32 [n]."""
+
+    def __init__(self, ids: np.ndarray, vectors: np.ndarray, scales: np.ndarray) -> None:
+        self.ids = ids
+        self.vectors = vectors
+        self.scales = scales
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(positions, cosine) top-k giảm dần."""
+        raise NotImplementedError
+
+
+class ExactIndex(VectorIndex):
+    _BLOCK = 65_536  # dequantize theo block: ~200MB float32 tạm thời với dim 768
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        n = len(self.ids)
+        if n == 0 or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        query = query.astype(np.float32)
+        best_pos: List[np.ndarray] = []
+        best_score: List[np.ndarray] = []
+        for start in range(0, n, self._BLOCK):
+            end = min(start + self._BLOCK, n)
+            scores = (self.vectors[start:end].astype(np.float32) @ query) * self.scales[start:end]
+            if end - start > k:
+                top = np.argpartition(-scores, k)[:k]
+            else:
+                top = np.arange(end - start)
+            best_pos.append(top + start)
+            best_score.append(scores[top])
+        pos = np.concatenate(best_pos)
+        score = np.concatenate(best_score)
+        order = np.argsort(-score, kind="stable")[:k]
+        return pos[order], score[order]
+
+
+_BACKENDS: Dict[str, Type[VectorIndex]] = {"exact": ExactIndex}
+
+
+class _Snapshot:
+    def __init__(self, model_key: str, index: VectorIndex, watermark: datetime, path: Optional[str]) -> None:
+        self.model_key = model_key
+        self.index = index
+        self.watermark = watermark
+        self.path = path
+        self.built_at = time.time()
+        # Vector ghi sau snapshot: Product_ID → (int8 vector, scale); ghi đè bản trong file
+        self.delta: Dict[int, Tuple[np.ndarray, float]] = {}
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        pos, scores = self.index.search(query, k + len(self.delta))
+        out = [
+            (int(self.index.ids[p]), float(s))
+            for p, s in zip(pos, scores)
+            if int(self.index.ids[p]) not in self.delta
+        ]
+        for pid, (vec, scale) in self.delta.items():
+            out.append((pid, float(vec.astype(np.float32) @ query) * scale))
+        out.sort(key=lambda t: (-t[1], t[0]))
+        return out[:k]
+
+
+_SNAPSHOT: Optional[_Snapshot] = None
+_LAST_SYNC = 0.0
+_LOCK = threading.Lock()
+
+
+def _embed_query(text: str) -> Optional[Tuple[np.ndarray, str]]:
+    """(vector, model_key) của query; key lấy từ reply của service, không từ env API.
+
+    Chỉ encode qua inference service (SENTIMENT_SERVICE_MODE=remote): process API
+    không bao giờ load model local, service lỗi/timeout → None, caller về keyword.
+    """
+    if not sentiment_client.is_enabled():
+        return None
+    out = sentiment_client.embed_remote_keyed([text], timeout=QUERY_EMBED_TIMEOUT)
+    if out is None or len(out[0]) == 0:
+        return None
+    return out[0][0], out[1]
+
+
+def _empty(model_key: str, watermark: datetime) -> _Snapshot:
+    index = _BACKENDS[BACKEND](np.zeros(0, np.int64), np.zeros((0, 0), np.int8), np.zeros(0, np.float32))
+    return _Snapshot(model_key, index, watermark, None)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # tồn tại nhưng khác user
+    return True
+
+
+def _remove_stale_files() -> None:
+    """Xoá file vector process chết để lại (crash/kill -9 không qua _drop).
+
+    File của chính pid này mà không phải snapshot đang dùng cũng bị xoá: trong
+    container API thường là pid 1, process mới trùng pid với process đã chết.
+    """
+    try:
+        names = os.listdir(INDEX_DIR)
+    except OSError:
+        return
+    current = _SNAPSHOT.path if _SNAPSHOT is not None else None
+    for name in names:
+        parts = name.split("-")
+        if len(parts) != 3 or parts[0] != "vectors" or not name.endswith(".int8") or not parts[1].isdigit():
+            continue
+        pid = int(parts[1])
+        path = os.path.join(INDEX_DIR, name)
+        if pid == os.getpid() and path == current:
+            continue
+        if pid != os.getpid() and _pid_alive(pid):
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _build(db: Session, model_key: str) -> _Snapshot:
+    start = time.perf_counter()
+    n = embedding_crud.count_for_model(db, model_key)
+    watermark = datetime(1970, 1, 1)
+    if n == 0:
+        return _empty(model_key, watermark)
+
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    _remove_stale_files()
+    path = os.path.join(INDEX_DIR, f"vectors-{os.getpid()}-{uuid.uuid4().hex[:8]}.int8")
+    ids = np.zeros(n, dtype=np.int64)
+    scales = np.zeros(n, dtype=np.float32)
+    vectors = None
+    filled, after_id = 0, 0
+    # Dòng thêm giữa COUNT và lúc quét sẽ vượt n → để delta lấy sau
+    while filled < n:
+        page = embedding_crud.page_for_model(db, model_key, after_id=after_id, limit=_PAGE_SIZE)
+        if not page:
+            break
+        for pid, blob, scale, updated_at in page:
+            if filled >= n:
+                break
+            vec = np.frombuffer(blob, dtype=np.int8)
+            if vectors is None:
+                vectors = np.memmap(path, dtype=np.int8, mode="w+", shape=(n, len(vec)))
+            vectors[filled] = vec
+            ids[filled] = pid
+            scales[filled] = scale
+            filled += 1
+            if updated_at and updated_at > watermark:
+                watermark = updated_at
+        after_id = int(page[-1][0])
+
+    if vectors is None:
+        return _empty(model_key, watermark)
+    vectors.flush()
+    dim = vectors.shape[1]
+    del vectors
+    readonly = np.memmap(path, dtype=np.int8, mode="r", shape=(n, dim))[:filled]
+    index = _BACKENDS[BACKEND](ids[:filled], readonly, scales[:filled])
+    logger.info(
+        "semantic index built: %s vectors (dim %s, %s) in %.2fs",
+        filled, dim, BACKEND, time.perf_counter() - start,
+    )
+    return _Snapshot(model_key, index, watermark, path)
+
+
+def _apply_delta(db: Session, snap: _Snapshot) -> bool:
+    """Nạp vector ghi sau watermark. False nếu delta quá lớn (nên rebuild)."""
+    rows = embedding_crud.changed_after(db, snap.model_key, snap.watermark - _CLOCK_SKEW, limit=DELTA_MAX + 1)
+    if len(snap.delta.keys() | {int(r[0]) for r in rows}) > DELTA_MAX:
+        return False
+    for pid, blob, scale, updated_at in rows:
+        snap.delta[int(pid)] = (np.frombuffer(blob, dtype=np.int8).copy(), float(scale))
+        if updated_at and updated_at > snap.watermark:
+            snap.watermark = updated_at
+    return True
+
+
+def _drop(snap: Optional[_Snapshot]) -> None:
+    if snap is None or snap.path is None:
+        return
+    try:
+        os.remove(snap.path)  # mmap còn mở vẫn đọc được tới khi GC (POSIX)
+    except OSError:
+        pass
+
+
+def _ensure_fresh(db: Session, model_key: str) -> _Snapshot:
+    global _SNAPSHOT, _LAST_SYNC
+    now = time.time()
+    snap = _SNAPSHOT
+    if snap is None or snap.model_key != model_key or now - snap.built_at > REBUILD_SECONDS:
+        _SNAPSHOT = _build(db, model_key)
+        _LAST_SYNC = 0.0
+        _drop(snap)
+        snap = _SNAPSHOT
+    if now - _LAST_SYNC >= _SYNC_INTERVAL:
+        _LAST_SYNC = now
+        if not _apply_delta(db, snap):
+            _SNAPSHOT = _build(db, model_key)
+            _drop(snap)
+            snap = _SNAPSHOT
+    return snap
+
+
+def search(db: Session, query: str, limit: int = 2000) -> Optional[List[Tuple[int, float]]]:
+    """[(Product_ID, cosine)] giảm dần, chỉ giữ cosine ≥ MIN_SCORE.
+
+    None nếu semantic search không dùng được lúc này (không encode được query, hoặc
+    chưa có vector sản phẩm nào của model đang encode query) – caller fallback sang
+    keyword search.
+    """
+    if not (query or "").strip():
+        return []
+    embedded = _embed_query(query)
+    if embedded is None:
+        return None
+    vector, model_key = embedded
+    with _LOCK:
+        snap = _ensure_fresh(db, model_key)
+        if len(snap.index.ids) == 0 and not snap.delta:
+            return None
+        hits = snap.search(vector, limit)
+    return [(pid, score) for pid, score in hits if score >= MIN_SCORE]
+
+
+def stats() -> Dict[str, int]:
+    snap = _SNAPSHOT
+    if snap is None:
+        return {"built": 0, "vectors": 0, "delta": 0}
+    return {"built": int(snap.built_at), "vectors": len(snap.index.ids), "delta": len(snap.delta)}
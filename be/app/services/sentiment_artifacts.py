@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+# ==========================================================
+# Artifact anchor embeddings (.npy) cạnh HF cache
+# ==========================================================
+# <cache_folder>/sentiment_anchors/<key>/{pos,neg,centroids}.npy + meta.json
+# key = sha1(format, model, revision, anchors) → đổi model/revision/backend
+# hoặc sửa danh sách anchors sẽ ra key mới và tự encode lại.
+_FORMAT_VERSION = 1
+_SUBDIR = "sentiment_anchors"
+
+
+def artifact_key(
+    model_name: str,
+    revision: str,
+    positive: Sequence[str],
+    negative: Sequence[str],
+) -> str:
+    payload = json.dumps(
+        {
+            "v": _FORMAT_VERSION,
+            "model": model_name,
+            "revision": revision,
+            "positive": list(positive),
+            "negative": list(negative),
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def artifact_dir(cache_folder: str, key: str) -> str:
+    return os.path.join(cache_folder, _SUBDIR, key)
+
+
+def load(cache_folder: str, key: str) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Memory-map (pos, neg, centroids); None nếu chưa build cho key này."""
+    d = artifact_dir(cache_folder, key)
+    try:
+        pos = np.load(os.path.join(d, "pos.npy"), mmap_mode="r")
+        neg = np.load(os.path.join(d, "neg.npy"), mmap_mode="r")
+        centroids = np.load(os.path.join(d, "centroids.npy"), mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    return pos, neg, centroids
+
+
+def centroids_of(pos: np.ndarray, neg: np.ndarray) -> np.ndarray:
+    """[mean(pos), mean(neg)] sau khi normalize từng anchor.
+
+    Với x đã normalize: mean_i cos(x, a_i) == x · centroid, nên chấm điểm chỉ cần
+    1 phép nhân (n, d) x (d, 2) thay vì so với từng anchor.
+    """
+    def _unit(a: np.ndarray) -> np.ndarray:
+        a = np.asarray(a, dtype=np.float32)
+        return a / np.clip(np.linalg.norm(a, axis=1, keepdims=True), 1e-12, None)
+
+    return np.vstack([_unit(pos).mean(axis=0), _unit(neg).mean(axis=0)]).astype(np.float32)
+
+
+def save(
+    cache_folder: str,
+    key: str,
+    pos: np.ndarray,
+    neg: np.ndarray,
+    centroids: np.ndarray,
+    meta: dict,
+) -> None:
+    """Ghi artifact, mỗi file ghi ra tmp rồi os.replace để process khác không đọc dở."""
+    d = artifact_dir(cache_folder, key)
+    os.makedirs(d, exist_ok=True)
+    for name, arr in (("pos", pos), ("neg", neg), ("centroids", centroids)):
+        tmp = os.path.join(d, f".{name}.{os.getpid()}.npy")
+        np.save(tmp, np.asarray(arr, dtype=np.float32))
+        os.replace(tmp, os.path.join(d, f"{name}.npy"))
+    with open(os.path.join(d, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({**meta, "key": key, "format": _FORMAT_VERSION}, f, ensure_ascii=False)
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import base64
+import json
+import logging
+import os
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..rq_conn import redis_conn
+
+logger = logging.getLogger(__name__)
+
+# ==========================================================
+# Client cho sentiment inference service (worker/sentiment_worker.py)
+# ==========================================================
+# Crawl/refresh job chỉ đẩy text vào Redis list, service giữ model
+# thường trú sẽ gom batch từ nhiều job rồi trả score về reply list riêng.
+# SENTIMENT_SERVICE_MODE=remote để bật; mặc định "local" (load model in-process).
+# Request có "op": "embed" thì service trả vector (float16, base64) thay vì score,
+# kèm model_key của model đã encode (env của service quyết định, không phải của caller).
+REQUEST_QUEUE = "sentiment:requests"
+REPLY_PREFIX = "sentiment:reply:"
+REPLY_TTL_SECONDS = 60
+
+SERVICE_MODE = os.getenv("SENTIMENT_SERVICE_MODE", "local").lower()
+# Timeout cho MỖI chunk (không phải cả lời gọi)
+SERVICE_TIMEOUT = float(os.getenv("SENTIMENT_SERVICE_TIMEOUT", "30"))
+# Cùng biến env với worker/config.py: mỗi request vừa đúng 1 batch của service,
+# 1 trang bulk job (hàng nghìn review) không còn là 1 request vượt timeout.
+SERVICE_BATCH_SIZE = max(1, int(os.getenv("SENTIMENT_BATCH_SIZE", "256")))
+
+
+def is_enabled() -> bool:
+    return SERVICE_MODE == "remote"
+
+
+def _roundtrip(texts: List[str], extra: Dict[str, Any], timeout: Optional[float]) -> Optional[List[Dict[str, Any]]]:
+    """Chia texts thành chunk SERVICE_BATCH_SIZE, LPUSH tất cả trong 1 pipeline rồi chờ
+    reply theo thứ tự. None nếu Redis lỗi hoặc 1 chunk quá timeout (giây / chunk).
+    """
+    chunks = [texts[i:i + SERVICE_BATCH_SIZE] for i in range(0, len(texts), SERVICE_BATCH_SIZE)]
+    request_ids = [uuid.uuid4().hex for _ in chunks]
+    try:
+        pipe = redis_conn.pipeline(transaction=False)
+        for request_id, chunk in zip(request_ids, chunks):
+            pipe.lpush(REQUEST_QUEUE, json.dumps({"id": request_id, **extra, "texts": chunk}))
+        pipe.execute()
+
+        replies: List[Dict[str, Any]] = []
+        for n, request_id in enumerate(request_ids):
+            item = redis_conn.brpop(REPLY_PREFIX + request_id, timeout=timeout or SERVICE_TIMEOUT)
+            if item is None:
+                logger.warning(
+                    "sentiment service timeout on chunk %s/%s (%s texts)", n + 1, len(chunks), len(chunks[n])
+                )
+                return None
+            replies.append(json.loads(item[1]))
+    except Exception as exc:
+        logger.warning("sentiment service error: %s", exc)
+        return None
+    return replies
+
+
+def score_remote(texts: List[str], timeout: Optional[float] = None) -> Optional[List[float]]:
+    """Gửi texts tới inference service và chờ score.
+
+    Trả None nếu service không phản hồi kịp để caller fallback sang local.
+    """
+    if not texts:
+        return []
+    replies = _roundtrip(texts, {}, timeout)
+    if replies is None:
+        return None
+
+    out: List[float] = []
+    for reply in replies:
+        scores = reply.get("scores")
+        if not isinstance(scores, list):
+            return None
+        out.extend(float(s) for s in scores)
+    return out if len(out) == len(texts) else None
+
+
+def embed_remote(
+    texts: List[str], timeout: Optional[float] = None, use_cache: bool = True
+) -> Optional[np.ndarray]:
+    """Vector đã L2-normalize (float32, shape [len(texts), dim]) từ inference service.
+
+    None nếu service không phản hồi kịp / lỗi, caller tự quyết fallback.
+    """
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    out = embed_remote_keyed(texts, timeout=timeout, use_cache=use_cache)
+    return None if out is None else out[0]
+
+
+def embed_remote_keyed(
+    texts: List[str], timeout: Optional[float] = None, use_cache: bool = True
+) -> Optional[Tuple[np.ndarray, str]]:
+    """(vectors, model_key) – key do service trả về, so được với Model_Key đã lưu.
+
+    None nếu service lỗi / quá timeout / các chunk khác model (service vừa đổi model).
+    """
+    replies = _roundtrip(texts, {"op": "embed", "cache": use_cache}, timeout)
+    if not replies:
+        return None
+
+    parts = []
+    keys = set()
+    try:
+        for reply in replies:
+            if reply.get("vectors") is None:
+                # Service báo model lỗi ({"vectors": null})
+                return None
+            flat = np.frombuffer(base64.b64decode(reply["vectors"]), dtype=np.float16)
+            parts.append(flat.reshape(-1, int(reply["dim"])))
+            keys.add(reply["model_key"])
+    except (KeyError, ValueError, TypeError):
+        return None
+    if len(keys) != 1:
+        return None
+    vectors = np.vstack(parts).astype(np.float32)
+    return (vectors, keys.pop()) if len(vectors) == len(texts) else None
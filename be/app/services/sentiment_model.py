@@ -0,0 +1,334 @@
+from __future__ import annotations
+
+import os
+from typing import List, Optional, Tuple
+import numpy as np
+
+from ..services import embedding_cache, sentiment_artifacts, sentiment_client
+
+# Phần model thuần (load, encode, anchors, chấm điểm): không import config/DB để
+# chạy được lúc build image (scripts/build_sentiment_artifacts) và trong inference
+# service. Phần ghi Reviews_Cache/Products nằm ở sentiment_service.
+
+# ==========================================================
+# Model config
+# ==========================================================
+_MODEL = None
+_POS_EMBS = None
+_NEG_EMBS = None
+_CENTROIDS = None  # [centroid pos, centroid neg]
+_MODEL_NAME = "dangvantuan/vietnamese-document-embedding"
+_MODEL_REVISION = "6fa4e2f"
+_DEVICE = "cpu"
+_CACHE_FOLDER = "/app/hf_cache"
+# "torch" (SentenceTransformer) hoặc "onnx" (onnxruntime int8, CPU-only)
+_BACKEND = os.getenv("SENTIMENT_BACKEND", "torch").lower()
+
+# ==========================================================
+# Anchors (tối ưu – rút gọn – giảm lệch)
+# ==========================================================
+_POSITIVE_ANCHORS = [
+    "rất tốt", "tuyệt vời", "ưng ý", "hài lòng",
+    "chất lượng tốt", "đáng mua", "đúng mô tả",
+    "giao nhanh", "đẹp", "uy tín",
+]
+
+_NEGATIVE_ANCHORS = [
+    "tệ", "rất tệ", "kém chất lượng", "thất vọng",
+    "fake", "hàng nhái", "lừa đảo", "sai mô tả",
+    "bị lỗi", "không dùng được",
+]
+
+
+# ==========================================================
+# Device selection
+# ==========================================================
+def _select_device() -> str:
+    try:
+        import torch
+
+        if torch.cuda.is_available():
+            return "cuda"
+        if hasattr(torch.backends, "mps") and torch.backends.mps.is_available():
+            return "mps"
+    except Exception:
+        pass
+    return "cpu"
+
+
+# ==========================================================
+# Load embedding model
+# ==========================================================
+def _load_model():
+    global _MODEL, _DEVICE
+    if _MODEL is not None:
+        return _MODEL
+    if _BACKEND == "onnx":
+        _MODEL = _load_onnx_model()
+        if _MODEL is not None:
+            return _MODEL
+    try:
+        from sentence_transformers import SentenceTransformer
+        _DEVICE = _select_device()
+        _MODEL = SentenceTransformer(
+            _MODEL_NAME,
+            revision=_MODEL_REVISION,
+            trust_remote_code=True,
+            device=_DEVICE,
+            cache_folder=_CACHE_FOLDER
+        )
+    except Exception:
+        _MODEL = None
+        _DEVICE = "cpu"
+    return _MODEL
+
+
+def _load_onnx_model():
+    """Load artifact ONNX int8; thiếu artifact/onnxruntime thì fallback về torch."""
+    global _BACKEND
+    try:
+        from .onnx_encoder import OnnxEncoder, artifact_dir
+        return OnnxEncoder(artifact_dir(_CACHE_FOLDER, _MODEL_NAME, _MODEL_REVISION))
+    except Exception as exc:
+        print(f"[Sentiment] ONNX backend unavailable ({exc}), falling back to torch")
+        _BACKEND = "torch"
+        return None
+
+
+def _cache_revision() -> str:
+    # Embedding int8 khác embedding fp32 → không dùng chung key cache
+    return _MODEL_REVISION if _BACKEND == "torch" else f"{_MODEL_REVISION}+onnx-int8"
+
+
+def use_backend(name: str) -> None:
+    """Đổi backend ("torch" | "onnx") và bỏ model/anchors đang giữ trong process."""
+    global _BACKEND, _MODEL, _POS_EMBS, _NEG_EMBS, _CENTROIDS
+    _BACKEND = name.lower()
+    _MODEL = None
+    _POS_EMBS = None
+    _NEG_EMBS = None
+    _CENTROIDS = None
+
+
+# ==========================================================
+# Encode texts (qua embedding cache)
+# ==========================================================
+def _encode_texts(texts: List[str], use_cache: bool = True) -> Optional[np.ndarray]:
+    """Encode texts, chỉ chạy model cho các text chưa có trong cache.
+
+    Nếu mọi text đều hit cache thì không cần load model. use_cache=False cho text
+    đã có cơ chế chống encode lại riêng (vector sản phẩm theo Text_Hash).
+    """
+    if not use_cache:
+        model = _load_model()
+        if model is None:
+            return None
+        return np.array(model.encode(texts, normalize_embeddings=True)).astype(np.float32)
+
+    keys = [embedding_cache.text_key(_MODEL_NAME, _cache_revision(), t) for t in texts]
+    cached = embedding_cache.get_many(keys)
+    missing = [i for i, emb in enumerate(cached) if emb is None]
+
+    if missing:
+        revision = _cache_revision()
+        model = _load_model()
+        if model is None:
+            return None
+        if _cache_revision() != revision:
+            # Backend vừa fallback onnx → torch: key cache đã khác, tra lại từ đầu
+            return _encode_texts(texts)
+        fresh = np.array(
+            model.encode([texts[i] for i in missing], normalize_embeddings=True)
+        )
+        embedding_cache.set_many([keys[i] for i in missing], fresh)
+        for i, emb in zip(missing, fresh):
+            cached[i] = emb
+
+    return np.vstack(cached).astype(np.float32)
+
+
+def embedding_model_key() -> str:
+    """Định danh không gian vector của model trong process này; vector khác key không so sánh được.
+
+    Bật inference service thì key thật là của service (xem encode_texts_keyed).
+    """
+    return f"{_MODEL_NAME}@{_cache_revision()}"
+
+
+def encode_texts(texts: List[str], use_cache: bool = True) -> Optional[np.ndarray]:
+    """Vector L2-normalize cho texts bất kỳ trong worker (text sản phẩm...).
+
+    Bật inference service thì encode bên service, timeout mới load model local.
+    Query tìm kiếm của API không đi qua đây (xem semantic_index._embed_query).
+    """
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    out = encode_texts_keyed(texts, use_cache=use_cache)
+    return None if out is None else out[0]
+
+
+def encode_texts_keyed(texts: List[str], use_cache: bool = True) -> Optional[Tuple[np.ndarray, str]]:
+    """(vectors, model_key) với key của model đã thực sự encode (service hoặc local)."""
+    if sentiment_client.is_enabled():
+        out = sentiment_client.embed_remote_keyed(texts, use_cache=use_cache)
+        if out is not None:
+            return out
+    vectors = encode_texts_local(texts, use_cache=use_cache)
+    if vectors is None:
+        return None
+    # Đọc key sau khi encode: load ONNX lỗi sẽ chuyển _BACKEND sang torch
+    return vectors, embedding_model_key()
+
+
+def encode_texts_local(texts: List[str], use_cache: bool = True) -> Optional[np.ndarray]:
+    """Encode bằng model trong process hiện tại (dùng bởi inference service)."""
+    return _encode_texts(texts, use_cache=use_cache)
+
+
+# ==========================================================
+# Encode anchors (ưu tiên artifact .npy đã build sẵn)
+# ==========================================================
+def _anchor_artifact_key() -> str:
+    return sentiment_artifacts.artifact_key(
+        _MODEL_NAME, _cache_revision(), _POSITIVE_ANCHORS, _NEGATIVE_ANCHORS
+    )
+
+
+def _ensure_anchor_embeddings():
+    global _POS_EMBS, _NEG_EMBS, _CENTROIDS
+    if _POS_EMBS is not None and _NEG_EMBS is not None:
+        return _POS_EMBS, _NEG_EMBS
+
+    loaded = sentiment_artifacts.load(_CACHE_FOLDER, _anchor_artifact_key())
+    if loaded is not None:
+        _POS_EMBS, _NEG_EMBS, _CENTROIDS = loaded
+        return _POS_EMBS, _NEG_EMBS
+
+    # Hash không khớp (hoặc chưa build) → encode rồi ghi artifact cho lần sau
+    pos = _encode_texts(_POSITIVE_ANCHORS)
+    neg = _encode_texts(_NEGATIVE_ANCHORS)
+    if pos is None or neg is None:
+        return None, None
+
+    centroids = sentiment_artifacts.centroids_of(pos, neg)
+    try:
+        sentiment_artifacts.save(
+            _CACHE_FOLDER,
+            _anchor_artifact_key(),
+            pos,
+            neg,
+            centroids,
+            meta={"model": _MODEL_NAME, "revision": _cache_revision()},
+        )
+    except OSError as exc:
+        print(f"[Sentiment] Cannot write anchor artifacts: {exc}")
+
+    _POS_EMBS = pos
+    _NEG_EMBS = neg
+    _CENTROIDS = centroids
+
+    return _POS_EMBS, _NEG_EMBS
+
+
+# ==========================================================
+# Preload (worker cha load trước khi fork job)
+# ==========================================================
+def preload() -> bool:
+    """Load model + anchor embeddings ngay, để child process fork ra dùng chung (copy-on-write)."""
+    pos, neg = _ensure_anchor_embeddings()
+    return _load_model() is not None and pos is not None and neg is not None
+
+
+# ==========================================================
+# Compute score (tối ưu – không âm oan)
+# ==========================================================
+def _compute_score(pos_mean: float, neg_mean: float) -> float:
+    raw = pos_mean - neg_mean
+    score = np.tanh(raw * 1.5)   # scale cực đẹp [-1,1]
+    return float(score)
+
+
+# ==========================================================
+# Score using model
+# ==========================================================
+def _score_with_model(texts: List[str]) -> Optional[List[float]]:
+    pos_embs, neg_embs = _ensure_anchor_embeddings()
+    if pos_embs is None or neg_embs is None:
+        return None
+
+    # Encode text (cache hit → không inference)
+    arr = _encode_texts(texts)
+    if arr is None:
+        return None
+
+    # Trung bình cosine với từng anchor == dot với centroid (xem centroids_of)
+    arr = arr / np.clip(np.linalg.norm(arr, axis=1, keepdims=True), 1e-12, None)
+    sims = arr @ np.asarray(_CENTROIDS).T
+
+    scores = [_compute_score(float(p), float(n)) for p, n in sims]
+    return scores
+
+
+# ==========================================================
+# Analyze comment
+# ==========================================================
+def analyze_comment(text: str) -> float:
+    if not text:
+        return 0.0
+    return score_comments([text])[0]
+
+
+def score_comments(texts: List[str], allow_heuristic: bool = True) -> Optional[List[float]]:
+    """Chấm điểm cả batch trong 1 lần encode (thay vì gọi analyze_comment từng câu).
+
+    Khi bật inference service thì gửi sang service, chỉ fallback local nếu timeout.
+    allow_heuristic=False: model không load được → None thay vì điểm heuristic
+    (caller lưu điểm vào DB không được ghi điểm heuristic như điểm model).
+    """
+    texts = [t for t in texts if t]
+    if not texts:
+        return []
+    if sentiment_client.is_enabled():
+        scores = sentiment_client.score_remote(texts)
+        if scores is not None:
+            return scores
+    return score_comments_local(texts, allow_heuristic=allow_heuristic)
+
+
+def score_comments_local(texts: List[str], allow_heuristic: bool = True) -> Optional[List[float]]:
+    """Chấm điểm bằng model trong process hiện tại (dùng bởi inference service)."""
+    scores = _score_with_model(texts)
+    if scores is not None:
+        return scores
+    if not allow_heuristic:
+        return None
+    return [_heuristic_score(t) for t in texts]
+
+
+def _heuristic_score(text: str) -> float:
+    # fallback heuristic
+    t = text.lower()
+    positives = ["tốt", "tuyệt", "ưng", "hài lòng", "đáng mua", "đúng mô tả"]
+    negatives = ["tệ", "kém", "thất vọng", "fake", "nhái", "lừa đảo"]
+
+    score = 0
+    score += sum(1 for w in positives if w in t)
+    score -= sum(1 for w in negatives if w in t)
+
+    return max(-1.0, min(1.0, score / 3.0))
+
+
+# ==========================================================
+# Sentiment label
+# ==========================================================
+# Dùng chung với bản SQL (crud.products.apply_sentiment_deltas)
+POSITIVE_MIN = 0.4
+NEUTRAL_MIN = -0.1
+
+
+def label_sentiment(score: float) -> str:
+    if score >= POSITIVE_MIN:
+        return "positive"
+    if score >= NEUTRAL_MIN:
+        return "neutral"
+    return "negative"
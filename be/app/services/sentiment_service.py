@@ -1,188 +1,265 @@
 from __future__ import annotations
 
-from typing import Iterable, List, Optional
-import numpy as np
-import torch
-from sklearn.metrics.pairwise import cosine_similarity
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from ..crud import products as product_crud
+from ..crud import reviews_cache as review_cache_crud
 from ..models.user_reviews import User_Reviews
 from ..models.products import Products
-from ..services.product_service import update_sentiment_score_and_label
+from ..services import embedding_cache
+from .sentiment_model import (  # noqa: F401 – API cũ của module
+    NEUTRAL_MIN,
+    POSITIVE_MIN,
+    analyze_comment,
+    embedding_model_key,
+    encode_texts,
+    encode_texts_keyed,
+    encode_texts_local,
+    label_sentiment,
+    preload,
+    score_comments,
+    score_comments_local,
+)
 
 # ==========================================================
-# Model config
+# Review store (Reviews_Cache) – diff review hiện tại với review đã chấm
 # ==========================================================
-_MODEL = None
-_POS_EMBS = None
-_NEG_EMBS = None
-_MODEL_NAME = "dangvantuan/vietnamese-document-embedding"
-_MODEL_REVISION = "6fa4e2f"
-_DEVICE = "cpu"
+def _text_hash(text: str) -> str:
+    return hashlib.sha1(embedding_cache.normalize_text(text).encode("utf-8")).hexdigest()
 
-# ==========================================================
-# Anchors (tối ưu – rút gọn – giảm lệch)
-# ==========================================================
-_POSITIVE_ANCHORS = [
-    "rất tốt", "tuyệt vời", "ưng ý", "hài lòng",
-    "chất lượng tốt", "đáng mua", "đúng mô tả",
-    "giao nhanh", "đẹp", "uy tín",
-]
-
-_NEGATIVE_ANCHORS = [
-    "tệ", "rất tệ", "kém chất lượng", "thất vọng",
-    "fake", "hàng nhái", "lừa đảo", "sai mô tả",
-    "bị lỗi", "không dùng được",
-]
-
-
-# ==========================================================
-# Device selection
-# ==========================================================
-def _select_device() -> str:
-    try:
-        if torch.cuda.is_available():
-            return "cuda"
-        if hasattr(torch.backends, "mps") and torch.backends.mps.is_available():
-            return "mps"
-    except Exception:
-        pass
-    return "cpu"
-
-
-# ==========================================================
-# Load embedding model
-# ==========================================================
-def _load_model():
-    global _MODEL, _DEVICE
-    if _MODEL is not None:
-        return _MODEL
-    try:
-        from sentence_transformers import SentenceTransformer
-        _DEVICE = _select_device()
-        _MODEL = SentenceTransformer(
-            _MODEL_NAME,
-            revision=_MODEL_REVISION,
-            trust_remote_code=True,
-            device=_DEVICE,
-            cache_folder="/app/hf_cache"
-        )
-    except Exception:
-        _MODEL = None
-        _DEVICE = "cpu"
-    return _MODEL
-
-
-# ==========================================================
-# Encode anchors
-# ==========================================================
-def _ensure_anchor_embeddings():
-    global _POS_EMBS, _NEG_EMBS
-    if _POS_EMBS is not None and _NEG_EMBS is not None:
-        return _POS_EMBS, _NEG_EMBS
-
-    model = _load_model()
-    if model is None:
-        return None, None
-
-    pos = model.encode(_POSITIVE_ANCHORS, normalize_embeddings=True)
-    neg = model.encode(_NEGATIVE_ANCHORS, normalize_embeddings=True)
-
-    _POS_EMBS = np.array(pos)
-    _NEG_EMBS = np.array(neg)
-
-    return _POS_EMBS, _NEG_EMBS
-
-
-# ==========================================================
-# Compute score (tối ưu – không âm oan)
-# ==========================================================
-def _compute_score(pos_mean: float, neg_mean: float) -> float:
-    raw = pos_mean - neg_mean
-    score = np.tanh(raw * 1.5)   # scale cực đẹp [-1,1]
-    return float(score)
-
-
-# ==========================================================
-# Score using model
-# ==========================================================
-def _score_with_model(texts: List[str]) -> Optional[List[float]]:
-    model = _load_model()
-    pos_embs, neg_embs = _ensure_anchor_embeddings()
-    if model is None or pos_embs is None or neg_embs is None:
-        return None
-
-    # Encode text
-    arr = model.encode(texts, normalize_embeddings=True)
-    arr = np.array(arr)
-
-    # Cosine similarity chuẩn
-    pos_sim = cosine_similarity(arr, pos_embs).mean(axis=1)
-    neg_sim = cosine_similarity(arr, neg_embs).mean(axis=1)
-
-    scores = [_compute_score(float(p), float(n)) for p, n in zip(pos_sim, neg_sim)]
-    return scores
-
-
-# ==========================================================
-# Analyze comment
-# ==========================================================
-def analyze_comment(text: str) -> float:
-    if not text:
-        return 0.0
-    scores = _score_with_model([text])
-    if scores is not None:
-        return float(scores[0])
-
-    # fallback heuristic
-    t = text.lower()
-    positives = ["tốt", "tuyệt", "ưng", "hài lòng", "đáng mua", "đúng mô tả"]
-    negatives = ["tệ", "kém", "thất vọng", "fake", "nhái", "lừa đảo"]
-
-    score = 0
-    score += sum(1 for w in positives if w in t)
-    score -= sum(1 for w in negatives if w in t)
 
-    return max(-1.0, min(1.0, score / 3.0))
+def _rating_score(rating: Optional[int]) -> float:
+    return (max(1, min(5, rating or 0)) - 3) / 2.0
 
 
-# ==========================================================
-# Sentiment label
-# ==========================================================
-def label_sentiment(score: float) -> str:
-    if score >= 0.4:
-        return "positive"
-    if score >= -0.1:
-        return "neutral"
-    return "negative"
-
-
-# ==========================================================
-# Collect comments
-# ==========================================================
-def _collect_comments_for_product(db: Session, product: Products) -> List[str]:
-    comments: List[str] = []
+def _desired_reviews(
+    db: Session,
+    product: Products,
+    tiki_texts: Optional[List[str]],
+) -> Dict[Tuple[str, str], Tuple[str, Optional[str], Optional[float]]]:
+    """(Source, Review_Key) -> (Text_Hash, text cần chấm | None, score suy từ Rating | None)."""
+    desired: Dict[Tuple[str, str], Tuple[str, Optional[str], Optional[float]]] = {}
 
     user_reviews: List[User_Reviews] = (
         db.query(User_Reviews)
         .filter(User_Reviews.Product_ID == product.Product_ID)
         .all()
     )
-    user_texts = [(r.Comment or "").strip() for r in user_reviews if r.Comment]
+    for r in user_reviews:
+        text = (r.Comment or "").strip()
+        if text:
+            desired[("User", str(r.Review_ID))] = (_text_hash(text), text, None)
+        else:
+            desired[("User", str(r.Review_ID))] = (f"rating:{r.Rating}", None, _rating_score(r.Rating))
+
+    seen: Dict[str, int] = {}
+    for text in tiki_texts or []:
+        text = (text or "").strip()
+        if not text:
+            continue
+        h = _text_hash(text)
+        # Review trùng nội dung vẫn được tính riêng như trước (key = hash#lần xuất hiện)
+        n = seen.get(h, 0)
+        seen[h] = n + 1
+        desired[("Tiki", f"{h}#{n}")] = (h, text, None)
+    return desired
+
+
+def _plan_sync(
+    db: Session,
+    product: Products,
+    tiki_texts: Optional[List[str]],
+    complete: bool,
+) -> Dict[str, Any]:
+    """Diff review hiện tại với Reviews_Cache; trả về các text cần chấm + thay đổi cần ghi."""
+    desired = _desired_reviews(db, product, tiki_texts)
+    existing = {
+        (row.Source, row.Review_Key): row
+        for row in review_cache_crud.list_keys_for_product(db, product.Product_ID)
+    }
+    plan: Dict[str, Any] = {
+        "product": product,
+        "desired": desired,
+        "existing": existing,
+        "to_score": [],
+        "new_rows": [],
+        "changed_rows": [],
+        "deleted_ids": [],
+        "delta_sum": 0.0,
+        "delta_count": 0,
+    }
+
+    for key, old in existing.items():
+        if key in desired:
+            continue
+        if key[0] == "Tiki" and (tiki_texts is None or not complete):
+            continue
+        plan["deleted_ids"].append(old.Cache_ID)
+        if old.Has_Text:
+            plan["delta_sum"] -= old.Score
+            plan["delta_count"] -= 1
+
+    for key, (text_hash, text, rating_score) in desired.items():
+        old = existing.get(key)
+        if old is not None and old.Text_Hash == text_hash:
+            continue
+        if old is not None and old.Has_Text:
+            # Review user bị sửa: bỏ score cũ, thêm score mới khi chấm xong
+            plan["delta_sum"] -= old.Score
+            plan["delta_count"] -= 1
+        if text is not None:
+            plan["to_score"].append((key, text))
+        else:
+            _stage_row(plan, key, {"Text_Hash": text_hash, "Score": rating_score, "Has_Text": False})
+    return plan
+
+
+def _apply_scores(plan: Dict[str, Any], scores: List[float]) -> None:
+    for (key, _), score in zip(plan["to_score"], scores):
+        _stage_row(plan, key, {"Text_Hash": plan["desired"][key][0], "Score": float(score), "Has_Text": True})
+        plan["delta_sum"] += float(score)
+        plan["delta_count"] += 1
+
+
+def _stage_row(plan: Dict[str, Any], key: Tuple[str, str], row: Dict[str, Any]) -> None:
+    old = plan["existing"].get(key)
+    if old is None:
+        plan["new_rows"].append({
+            "Product_ID": plan["product"].Product_ID,
+            "Source": key[0],
+            "Review_Key": key[1],
+            **row,
+        })
+    else:
+        plan["changed_rows"].append({"Cache_ID": old.Cache_ID, **row})
 
-    if product.External_ID is None:
-        return user_texts
 
-    from .crawler_tiki_service import get_product_reviews
-    tiki_texts: List[str] = get_product_reviews(int(product.External_ID)) or []
+def _plan_is_noop(plan: Dict[str, Any]) -> bool:
+    return (
+        not (plan["new_rows"] or plan["changed_rows"] or plan["deleted_ids"])
+        and plan["product"].Sentiment_Count is not None
+    )
 
-    if user_texts:
-        comments.extend(user_texts)
-        comments.extend(tiki_texts)
-    else:
-        comments.extend(tiki_texts)
 
-    return comments
+def sync_product_sentiment(
+    db: Session,
+    product: Products,
+    tiki_texts: Optional[List[str]],
+    *,
+    complete: bool = True,
+) -> Optional[float]:
+    """Cập nhật sentiment sản phẩm chỉ dựa trên review mới / đổi / bị xoá.
+
+    - tiki_texts=None: không đụng tới review Tiki đã lưu (vd. thiếu External_ID).
+    - complete=False: tiki_texts chỉ là mẫu vài trang → không xoá review Tiki vắng mặt.
+    """
+    plan = _plan_sync(db, product, tiki_texts, complete)
+    if plan["to_score"]:
+        scores = score_comments([t for _, t in plan["to_score"]], allow_heuristic=False)
+        if scores is None:
+            # Model lỗi: không lưu gì, review vẫn "mới" nên lần chạy sau chấm lại
+            print(f"[Sentiment] Model unavailable, product {product.Product_ID} not updated")
+            return product.Sentiment_Score
+        _apply_scores(plan, scores)
+    if _plan_is_noop(plan):
+        return product.Sentiment_Score
+
+    review_cache_crud.delete_ids(db, plan["deleted_ids"])
+    review_cache_crud.add_many(db, plan["new_rows"])
+    review_cache_crud.update_many(db, plan["changed_rows"])
+    fallback = review_cache_crud.rating_only_average(db, product.Product_ID)
+    score = product_crud.apply_sentiment_delta(
+        db,
+        product.Product_ID,
+        delta_sum=plan["delta_sum"],
+        delta_count=plan["delta_count"],
+        label_fn=label_sentiment,
+        fallback_score=float(fallback) if fallback is not None else None,
+    )
+    db.commit()
+    product_crud.invalidate_product_caches(db, [product.Product_ID], [product.Category_ID], product_feed=False)
+    return score
+
+
+# Job khác (crawler / auto-update) chèn cùng review giữa lúc plan và commit →
+# UQ_ReviewsCache_Product_Source_Key: rollback, plan lại từ DB rồi ghi lại trang
+SYNC_PAGE_RETRIES = 3
+
+
+def sync_products_page(
+    db: Session,
+    products: List[Products],
+    tiki_texts_by_id: Dict[int, Optional[List[str]]],
+) -> Dict[str, int]:
+    """Bản set-based của sync_product_sentiment cho cả 1 trang sản phẩm.
+
+    Mọi review mới của trang được chấm trong 1 lần score_comments, rồi ghi
+    Reviews_Cache + Products bằng executemany thay vì từng sản phẩm.
+    Model không dùng được → không ghi gì, trả "model_unavailable": True.
+    """
+    attempt = 1
+    while True:
+        try:
+            return _sync_page_once(db, products, tiki_texts_by_id)
+        except IntegrityError:
+            db.rollback()
+            if attempt >= SYNC_PAGE_RETRIES:
+                raise
+            print(f"[Sentiment] Concurrent review insert, re-planning page (attempt {attempt})")
+            attempt += 1
+
+
+def _sync_page_once(
+    db: Session,
+    products: List[Products],
+    tiki_texts_by_id: Dict[int, Optional[List[str]]],
+) -> Dict[str, int]:
+    plans = [
+        _plan_sync(db, p, tiki_texts_by_id.get(p.Product_ID), complete=True)
+        for p in products
+    ]
+    texts = [t for plan in plans for _, t in plan["to_score"]]
+    scores = score_comments(texts, allow_heuristic=False) if texts else []
+    if scores is None:
+        # Model lỗi: không ghi điểm heuristic vào Reviews_Cache, cả trang chấm lại sau
+        return {"products": len(products), "updated": 0, "scored": 0, "model_unavailable": True}
+    offset = 0
+    for plan in plans:
+        n = len(plan["to_score"])
+        _apply_scores(plan, scores[offset:offset + n])
+        offset += n
+
+    dirty = [plan for plan in plans if not _plan_is_noop(plan)]
+    if dirty:
+        review_cache_crud.delete_ids(db, [i for plan in dirty for i in plan["deleted_ids"]])
+        review_cache_crud.add_many(db, [r for plan in dirty for r in plan["new_rows"]])
+        review_cache_crud.update_many(db, [r for plan in dirty for r in plan["changed_rows"]])
+        product_ids = [plan["product"].Product_ID for plan in dirty]
+        category_ids = [plan["product"].Category_ID for plan in dirty]
+        fallbacks = review_cache_crud.rating_only_averages(db, product_ids)
+
+        # Delta (không phải giá trị tuyệt đối từ ORM đã load trước lúc fetch review)
+        product_crud.apply_sentiment_deltas(
+            db,
+            [
+                {
+                    "Product_ID": plan["product"].Product_ID,
+                    "delta_sum": plan["delta_sum"],
+                    "delta_count": plan["delta_count"],
+                    "fallback": fallbacks.get(plan["product"].Product_ID),
+                }
+                for plan in dirty
+            ],
+            positive_min=POSITIVE_MIN,
+            neutral_min=NEUTRAL_MIN,
+        )
+        db.commit()
+        product_crud.invalidate_product_caches(db, product_ids, category_ids, product_feed=False)
+
+    return {"products": len(products), "updated": len(dirty), "scored": len(texts)}
 
 
 # ==========================================================
@@ -195,35 +272,9 @@ def update_product_sentiment(db: Session, product_id: int) -> Optional[float]:
     if not product:
         return None
 
-    comments = _collect_comments_for_product(db, product)
-    comments = [c for c in comments if c]
-
-    if not comments:
-        user_reviews = (
-            db.query(User_Reviews)
-            .filter(User_Reviews.Product_ID == product_id)
-            .all()
-        )
-        if not user_reviews:
-            update_sentiment_score_and_label(db, product_id, None, None)
-            return None
-
-        scores = []
-        for r in user_reviews:
-            rating = (r.Rating or 0)
-            s = (max(1, min(5, rating)) - 3) / 2.0
-            scores.append(s)
-
-        avg = sum(scores) / len(scores)
-        label = label_sentiment(avg)
-        update_sentiment_score_and_label(db, product_id, avg, label)
-        return avg
-
-    scores = _score_with_model(comments)
-    if scores is None:
-        scores = [analyze_comment(t) for t in comments]
+    tiki_texts: Optional[List[str]] = None
+    if product.External_ID is not None:
+        from .crawler_tiki_service import get_product_reviews
+        tiki_texts = get_product_reviews(int(product.External_ID)) or []
 
-    avg = float(np.mean(scores))
-    label = label_sentiment(avg)
-    update_sentiment_score_and_label(db, product_id, avg, label)
-    return avg
+    return sync_product_sentiment(db, product, tiki_texts)
@@ -2,7 +2,6 @@ from typing import Any, Dict, Optional
 
 from ..database import SessionLocal
 from ..rq_conn import auto_update_queue
-from ..services.auto_update_service import auto_update_products
 
 
 def enqueue_auto_update(
@@ -27,6 +26,8 @@ def run_auto_update(
     workers: int = 4,
 ) -> Dict[str, Any]:
     """Job body executed by the worker process."""
+    from ..services.auto_update_service import auto_update_products
+
     db = SessionLocal()
     try:
         return auto_update_products(
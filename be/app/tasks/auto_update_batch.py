@@ -2,7 +2,6 @@ from typing import Any, Dict, Optional, List
 
 from ..database import SessionLocal
 from ..rq_conn import auto_update_queue
-from ..services.auto_update_service import auto_update_products
 from ..crud import products as product_crud
 
 
@@ -43,6 +42,8 @@ def run_auto_update_subset(external_ids: list[int], workers: int = 4) -> Dict[st
     """
     Update a subset of products by External_ID list.
     """
+    from ..services.auto_update_service import auto_update_products
+
     db = SessionLocal()
     try:
         return auto_update_products(
@@ -0,0 +1,72 @@
+import time
+from typing import Any, Dict, Optional, Sequence
+
+from ..crud import category_stats as stats_crud
+from ..database import SessionLocal
+from ..rq_conn import crawl_queue, redis_conn
+from ..services import category_tree
+
+# ==========================================================
+# Category_Stats: tính lại theo danh mục bị đánh dấu
+# ==========================================================
+# Mọi ghi Products (tạo/sửa/xoá, sentiment, Is_Active, giá...) đi qua
+# crud.products.invalidate_product_caches → Category_ID cũ lẫn mới vào tập dirty
+# của category_tree. Job lấy tập đó, tính lại (1 GROUP BY / 1000 id) đúng các danh
+# mục này. Tính lại toàn bộ mỗi FULL_REFRESH_SECONDS chỉ là lưới an toàn (Redis
+# mất dữ liệu, ghi thẳng DB ngoài app).
+SCHEDULE_KEY = "category_stats:changed:scheduled"
+FULL_REFRESH_KEY = "category_stats:full:at"
+FULL_REFRESH_SECONDS = 24 * 3600
+
+
+def enqueue_category_stats_changed(debounce_seconds: int = 60) -> Optional[str]:
+    """Enqueue 1 job cho mọi thay đổi tới giờ; gọi dồn dập trong debounce_seconds chỉ ra 1 job."""
+    try:
+        if not redis_conn.set(SCHEDULE_KEY, 1, nx=True, ex=debounce_seconds):
+            return None
+    except Exception as exc:
+        print(f"[CategoryStats] Cannot schedule: {exc}")
+        return None
+    job = crawl_queue.enqueue(run_category_stats_changed, job_timeout=1800)
+    return job.id
+
+
+def run_category_stats_changed() -> Dict[str, Any]:
+    try:
+        category_ids = category_tree.take_stats_dirty()
+        last_full = float(redis_conn.get(FULL_REFRESH_KEY) or 0)
+    except Exception as exc:
+        print(f"[CategoryStats] Redis unavailable: {exc}")
+        return {"status": "redis_unavailable"}
+    if time.time() - last_full > FULL_REFRESH_SECONDS:
+        stats = run_category_stats_full()
+    else:
+        stats = _refresh_categories(category_ids)
+    # Chỉ bỏ tập processing sau khi commit: job lỗi thì lần sau tính lại các id này
+    category_tree.ack_stats_dirty()
+    return stats
+
+
+def _refresh_categories(category_ids: Sequence[int]) -> Dict[str, Any]:
+    if not category_ids:
+        return {"mode": "incremental", "categories": 0}
+    db = SessionLocal()
+    try:
+        written = stats_crud.replace(db, stats_crud.aggregate(db, category_ids), category_ids)
+        db.commit()
+    finally:
+        db.close()
+    category_tree.mark_stats_changed()
+    return {"mode": "incremental", "categories": written}
+
+
+def run_category_stats_full() -> Dict[str, Any]:
+    db = SessionLocal()
+    try:
+        written = stats_crud.replace(db, stats_crud.aggregate(db))
+        db.commit()
+    finally:
+        db.close()
+    redis_conn.set(FULL_REFRESH_KEY, time.time())
+    category_tree.mark_stats_changed()
+    return {"mode": "full", "categories": written}
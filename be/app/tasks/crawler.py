@@ -2,8 +2,11 @@ import os
 from typing import Any, Dict, List
 
 from ..database import SessionLocal
-from ..rq_conn import crawl_queue
-from ..services import crawler_tiki_service as tiki
+from ..rq_conn import crawl_queue, run_enqueue
+from .embeddings import enqueue_embed_changed
+
+# crawler_tiki_service kéo theo sentiment (torch/numpy), iCheck, OCR...
+# nên chỉ import trong job body: API process chỉ cần các hàm enqueue_*.
 
 
 def enqueue_crawl_keyword(keyword: str, limit: int = 10) -> str:
@@ -19,11 +22,15 @@ def enqueue_crawl_keyword(keyword: str, limit: int = 10) -> str:
 
 def run_crawl_keyword(keyword: str, limit: int = 10) -> List[Dict[str, Any]]:
     """Job body: reuse existing crawler logic with its own DB session."""
+    from ..services import crawler_tiki_service as tiki
+
     db = SessionLocal()
     try:
         return tiki.search_and_crawl_tiki_products_fast(db, keyword=keyword, limit=limit)
     finally:
         db.close()
+        # Sản phẩm mới/sửa → vector cho semantic search (debounce, 1 job cho nhiều crawl)
+        enqueue_embed_changed()
 
 
 def enqueue_crawl_by_id(product_id: int) -> str:
@@ -36,11 +43,14 @@ def enqueue_crawl_by_id(product_id: int) -> str:
 
 
 def run_crawl_by_id(product_id: int) -> Dict[str, Any] | None:
+    from ..services import crawler_tiki_service as tiki
+
     db = SessionLocal()
     try:
         return tiki.crawl_and_save_tiki_product(db, product_id)
     finally:
         db.close()
+        enqueue_embed_changed()
 
 
 def enqueue_crawl_barcode(barcode: str) -> str:
@@ -53,11 +63,14 @@ def enqueue_crawl_barcode(barcode: str) -> str:
 
 
 def run_crawl_barcode(barcode: str) -> List[Dict[str, Any]]:
+    from ..services import crawler_tiki_service as tiki
+
     db = SessionLocal()
     try:
         return tiki.crawl_by_barcode(db, barcode)
     finally:
         db.close()
+        enqueue_embed_changed()
 
 
 def enqueue_scan_image(tmp_path: str, filename: str | None = None) -> str:
@@ -71,6 +84,8 @@ def enqueue_scan_image(tmp_path: str, filename: str | None = None) -> str:
 
 
 def run_scan_image(tmp_path: str, filename: str | None = None) -> Dict[str, Any]:
+    from ..services import crawler_tiki_service as tiki
+
     db = SessionLocal()
     try:
         results = tiki.crawl_by_image(db, tmp_path)
@@ -87,6 +102,7 @@ def run_scan_image(tmp_path: str, filename: str | None = None) -> Dict[str, Any]
             except Exception:
                 pass
         db.close()
+        enqueue_embed_changed()
 
 
 def enqueue_scan_barcode_image(tmp_path: str) -> str:
@@ -100,6 +116,7 @@ def enqueue_scan_barcode_image(tmp_path: str) -> str:
 
 def run_scan_barcode_image(tmp_path: str) -> Dict[str, Any]:
     from ..services import barcode_service
+    from ..services import crawler_tiki_service as tiki
 
     db = SessionLocal()
     try:
@@ -122,3 +139,17 @@ def run_scan_barcode_image(tmp_path: str) -> Dict[str, Any]:
             except Exception:
                 pass
         db.close()
+        enqueue_embed_changed()
+
+
+# Bản async cho route async def: enqueue chạy ngoài event loop (rq_conn.run_enqueue)
+async def aenqueue_crawl_keyword(keyword: str, limit: int = 10) -> str:
+    return await run_enqueue(enqueue_crawl_keyword, keyword, limit=limit)
+
+
+async def aenqueue_scan_image(tmp_path: str, filename: str | None = None) -> str:
+    return await run_enqueue(enqueue_scan_image, tmp_path, filename=filename)
+
+
+async def aenqueue_scan_barcode_image(tmp_path: str) -> str:
+    return await run_enqueue(enqueue_scan_barcode_image, tmp_path)
@@ -0,0 +1,83 @@
+from typing import Any, Dict, Optional
+
+from ..database import SessionLocal
+from ..models.products import Products
+from ..rq_conn import crawl_queue, redis_conn
+from ..services import search_index
+
+# ==========================================================
+# Vector ngữ nghĩa sản phẩm: theo change feed của search index
+# ==========================================================
+# Mọi ghi Products đã đi qua search_index.mark_dirty → job này chỉ đọc feed từ
+# checkpoint (seq) của nó, encode các sản phẩm đổi text. Feed bị cắt qua
+# checkpoint (hoặc lần chạy đầu) thì quét toàn bộ – sản phẩm không đổi text bị
+# bỏ qua theo Text_Hash nên chỉ tốn đọc DB.
+# v2: text có thêm mô tả → key mới để lần chạy đầu sau deploy quét lại toàn bộ
+CHECKPOINT_KEY = "embed:feed:v2:seq"
+SCHEDULE_KEY = "embed:changed:scheduled"
+BACKFILL_PAGE_SIZE = 500
+
+
+def enqueue_embed_changed(debounce_seconds: int = 30) -> Optional[str]:
+    """Enqueue 1 job cho mọi thay đổi tới giờ; gọi dồn dập trong debounce_seconds chỉ ra 1 job."""
+    try:
+        if not redis_conn.set(SCHEDULE_KEY, 1, nx=True, ex=debounce_seconds):
+            return None
+    except Exception as exc:
+        print(f"[Embeddings] Cannot schedule: {exc}")
+        return None
+    job = crawl_queue.enqueue(run_embed_changed, job_timeout=3600)
+    return job.id
+
+
+def run_embed_changed() -> Dict[str, Any]:
+    from ..services import product_embedding_service
+
+    seq = search_index.current_seq()
+    if seq is None:
+        return {"status": "redis_unavailable"}
+    raw = redis_conn.get(CHECKPOINT_KEY)
+    ids = search_index.changed_since(int(raw), seq) if raw is not None else None
+    if ids is None:
+        stats = run_embed_backfill()
+    else:
+        db = SessionLocal()
+        try:
+            stats = product_embedding_service.embed_products(db, ids)
+        finally:
+            db.close()
+    if stats["failed"]:
+        # Giữ checkpoint cũ: lần chạy sau đọc lại đúng các Product_ID này
+        return {"status": "model_unavailable", "seq": int(raw) if raw is not None else None, **stats}
+    redis_conn.set(CHECKPOINT_KEY, seq)
+    return {"seq": seq, **stats}
+
+
+def run_embed_backfill(page_size: int = BACKFILL_PAGE_SIZE) -> Dict[str, Any]:
+    from ..services import product_embedding_service
+
+    db = SessionLocal()
+    totals = {"embedded": 0, "unchanged": 0, "failed": 0}
+    try:
+        after_id = 0
+        while True:
+            ids = [
+                int(pid) for (pid,) in db.query(Products.Product_ID)
+                .filter(Products.Product_ID > after_id)
+                .order_by(Products.Product_ID)
+                .limit(page_size)
+                .all()
+            ]
+            if not ids:
+                break
+            stats = product_embedding_service.embed_products(db, ids)
+            for k in totals:
+                totals[k] += stats[k]
+            if stats["failed"]:
+                print(f"[Embeddings] Backfill stopped after Product_ID={after_id}: model unavailable")
+                break
+            after_id = ids[-1]
+            print(f"[Embeddings] Backfill up to Product_ID={after_id}: {totals}")
+    finally:
+        db.close()
+    return totals
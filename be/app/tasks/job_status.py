@@ -16,4 +16,5 @@ def get_job_status(job_id: str) -> dict:
         "job_id": job_id,
         "status": job.get_status(),
         "result": job.result if job.is_finished else None,
+        "progress": job.meta.get("progress"),
     }
@@ -1,10 +1,16 @@
-from typing import Any, Dict, Optional
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+from rq import get_current_job
 
 from ..database import SessionLocal
-from ..rq_conn import crawl_queue
-from ..services import crawler_tiki_service as tiki
+from ..rq_conn import crawl_queue, redis_conn
+from ..services.http_async import bounded_gather
 from ..crud import products as product_crud
 
+BULK_CHECKPOINT_KEY = "sentiment:bulk:checkpoint"
+
 
 def enqueue_update_sentiment(product_id: int) -> str:
     job = crawl_queue.enqueue(
@@ -16,6 +22,8 @@ def enqueue_update_sentiment(product_id: int) -> str:
 
 
 def run_update_sentiment(product_id: int) -> Dict[str, Any]:
+    from ..services import crawler_tiki_service as tiki
+
     db = SessionLocal()
     try:
         product = product_crud.get_by_id(db, product_id)
@@ -25,3 +33,122 @@ def run_update_sentiment(product_id: int) -> Dict[str, Any]:
         return {"product_id": product_id, "external_id": product.External_ID, "sentiment_score": score}
     finally:
         db.close()
+
+
+# ============================================================
+# Bulk recompute: 1 job stream toàn bộ sản phẩm Tiki
+# ============================================================
+def enqueue_bulk_sentiment(page_size: int = 200, concurrency: int = 16, resume: bool = True) -> str:
+    job = crawl_queue.enqueue(
+        run_bulk_sentiment,
+        page_size=page_size,
+        concurrency=concurrency,
+        resume=resume,
+        job_timeout=6 * 3600,
+    )
+    return job.id
+
+
+async def _afetch_reviews(external_ids: List[int], concurrency: int) -> List[List[str]]:
+    from ..services import crawler_tiki_service as tiki
+
+    coros = [tiki.aget_product_reviews(eid, limit=50, retry=1) for eid in external_ids]
+    return await bounded_gather(coros, limit=concurrency)
+
+
+def _load_checkpoint() -> Dict[str, Any]:
+    try:
+        raw = redis_conn.get(BULK_CHECKPOINT_KEY)
+        return json.loads(raw) if raw else {}
+    except Exception:
+        return {}
+
+
+def _save_checkpoint(stats: Dict[str, Any]) -> None:
+    try:
+        redis_conn.set(BULK_CHECKPOINT_KEY, json.dumps(stats))
+    except Exception as exc:
+        print(f"[BulkSentiment] Cannot save checkpoint: {exc}")
+
+
+def run_bulk_sentiment(page_size: int = 200, concurrency: int = 16, resume: bool = True) -> Dict[str, Any]:
+    """Keyset pages → fetch review song song → chấm theo batch lớn → ghi set-based.
+
+    Checkpoint (Product_ID cuối đã xong) lưu trong Redis sau mỗi trang, job chạy lại
+    với resume=True sẽ tiếp tục từ đó. Throughput trả về trong kết quả + job.meta.
+    """
+    from ..services import crawler_tiki_service as tiki
+    from ..services.sentiment_service import sync_products_page
+
+    checkpoint = _load_checkpoint() if resume else {}
+    after_id = int(checkpoint.get("last_product_id") or 0)
+    stats: Dict[str, Any] = {
+        "last_product_id": after_id,
+        "products": int(checkpoint.get("products") or 0),
+        "updated": int(checkpoint.get("updated") or 0),
+        "reviews": int(checkpoint.get("reviews") or 0),
+        "scored": int(checkpoint.get("scored") or 0),
+    }
+    job = get_current_job()
+    start = time.perf_counter()
+    run_products = 0
+    run_reviews = 0
+
+    db = SessionLocal()
+    try:
+        while True:
+            products = product_crud.list_tiki_products_after(db, after_id=after_id, limit=page_size)
+            if not products:
+                break
+
+            external_ids = [int(p.External_ID) for p in products]
+            last_id = products[-1].Product_ID  # đọc trước commit (commit expire object)
+            reviews = tiki._run_coro_safely(_afetch_reviews(external_ids, concurrency))
+            texts_by_id: Dict[int, Optional[List[str]]] = {
+                p.Product_ID: (texts or []) for p, texts in zip(products, reviews)
+            }
+
+            page = sync_products_page(db, products, texts_by_id)
+            if page.get("model_unavailable"):
+                # Không lưu điểm heuristic: dừng ở checkpoint hiện tại, resume chạy lại trang này
+                print(f"[BulkSentiment] Model unavailable, stopped after Product_ID={after_id}")
+                stats["status"] = "model_unavailable"
+                stats["elapsed_sec"] = round(time.perf_counter() - start, 2)
+                return stats
+            n_reviews = sum(len(t or []) for t in reviews)
+
+            after_id = last_id
+            run_products += len(products)
+            run_reviews += n_reviews
+            elapsed = max(time.perf_counter() - start, 1e-9)
+            stats.update({
+                "last_product_id": after_id,
+                "products": stats["products"] + len(products),
+                "updated": stats["updated"] + page["updated"],
+                "reviews": stats["reviews"] + n_reviews,
+                "scored": stats["scored"] + page["scored"],
+                "products_per_sec": round(run_products / elapsed, 2),
+                "reviews_per_sec": round(run_reviews / elapsed, 2),
+            })
+            _save_checkpoint(stats)
+            if job is not None:
+                job.meta["progress"] = stats
+                job.save_meta()
+            print(
+                f"[BulkSentiment] up to Product_ID={after_id}: products={stats['products']} "
+                f"scored={stats['scored']} ({stats['products_per_sec']} products/s, "
+                f"{stats['reviews_per_sec']} reviews/s)"
+            )
+            # Giải phóng identity map giữa các trang để bộ nhớ không tăng theo số trang
+            db.expunge_all()
+    finally:
+        db.close()
+
+    # Chạy hết → xoá checkpoint để lần sau bắt đầu lại từ đầu
+    try:
+        redis_conn.delete(BULK_CHECKPOINT_KEY)
+    except Exception:
+        pass
+    stats["status"] = "finished"
+    stats["elapsed_sec"] = round(time.perf_counter() - start, 2)
+    return stats
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import base64
+import json
+from decimal import Decimal
+from typing import Any, Tuple
+
+# ==========================================================
+# Cursor phân trang keyset (opaque với client)
+# ==========================================================
+# Nội dung: sort đang dùng + sort key của dòng cuối + Product_ID (tie-breaker).
+# Client chỉ việc gửi lại next_cursor; đổi sort giữa chừng → cursor không hợp lệ.
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _dump_value(value: Any) -> Any:
+    if value is None:
+        return None
+    if isinstance(value, Decimal):
+        return {"d": str(value)}
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float)):
+        return value
+    return {"s": str(value)}
+
+
+def _load_value(raw: Any) -> Any:
+    if isinstance(raw, dict):
+        if "d" in raw:
+            return Decimal(raw["d"])
+        if "s" in raw:
+            return raw["s"]
+        raise InvalidCursor("bad cursor value")
+    return raw
+
+
+def encode_cursor(sort: str, key: Any, last_id: int) -> str:
+    payload = json.dumps({"s": sort, "k": _dump_value(key), "id": int(last_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[Any, int]:
+    """(sort key, Product_ID) của dòng cuối trang trước. InvalidCursor nếu hỏng/khác sort."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        key, last_id = _load_value(data.get("k")), int(data["id"])
+    except InvalidCursor:
+        raise
+    except Exception as exc:
+        raise InvalidCursor("malformed cursor") from exc
+    if data.get("s") != sort:
+        raise InvalidCursor("cursor was issued for a different sort")
+    return key, last_id
@@ -0,0 +1,141 @@
+"""Import-time audit + startup budget cho API process (`import app.main`).
+
+Chạy từ be/:
+    python -m scripts.audit_api_imports
+    python -m scripts.audit_api_imports --max-seconds 3 --max-rss-mb 250 --top 30
+
+Import app.main trong một subprocess sạch với `-X importtime`, in ra:
+  - top package theo self time (gộp theo package gốc) và top import theo cumulative
+  - thời gian import, peak RSS của process
+  - các module ML/CV/OCR bị kéo vào API (torch, cv2, pyzbar, google.generativeai...)
+Exit code 1 nếu có module cấm hoặc vượt budget thời gian/RSS.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+# Chỉ được import trong job body / code path cần chúng, không phải lúc API khởi động
+FORBIDDEN_MODULES = [
+    "torch",
+    "transformers",
+    "sentence_transformers",
+    "sklearn",
+    "onnxruntime",
+    "cv2",
+    "pyzbar",
+    "pytesseract",
+    "google.generativeai",
+    "app.services.crawler_tiki_service",
+    "app.services.sentiment_service",
+    "app.services.sentiment_model",
+    "app.services.barcode_service",
+    "app.services.auto_update_service",
+]
+
+DEFAULT_MAX_SECONDS = 4.0
+DEFAULT_MAX_RSS_MB = 300.0
+
+_PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import app.main  # noqa: F401
+elapsed = time.perf_counter() - t0
+rss_mb = None
+try:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+except ImportError:
+    try:
+        import psutil
+        rss_mb = psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+forbidden = json.loads(sys.argv[1])
+loaded = [m for m in forbidden if m in sys.modules]
+print("@@AUDIT@@" + json.dumps({"seconds": elapsed, "rss_mb": rss_mb, "loaded": loaded}))
+"""
+
+
+def _parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """[(module, depth, self_us, cumulative_us)] từ output của -X importtime."""
+    rows: List[Tuple[str, int, int, int]] = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        # "import time:       123 |        456 |     pkg.module"
+        try:
+            self_us, cum_us, name = line[len("import time:"):].split("|", 2)
+            self_us, cum_us = int(self_us), int(cum_us)
+        except ValueError:
+            continue
+        name = name[1:]  # bỏ 1 space sau "|", phần còn lại là indent theo độ sâu
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), depth, self_us, cum_us))
+    return rows
+
+
+def _print_report(rows: List[Tuple[str, int, int, int]], top: int) -> None:
+    by_root: Dict[str, int] = defaultdict(int)
+    for name, _, self_us, _ in rows:
+        by_root[name.split(".")[0]] += self_us
+
+    print(f"\n== Top {top} package theo self time (gộp theo package gốc) ==")
+    for root, us in sorted(by_root.items(), key=lambda kv: kv[1], reverse=True)[:top]:
+        print(f"{us / 1000:10.1f} ms  {root}")
+
+    print(f"\n== Top {top} import theo cumulative ==")
+    for name, depth, _, cum_us in sorted(rows, key=lambda r: r[3], reverse=True)[:top]:
+        print(f"{cum_us / 1000:10.1f} ms  {'  ' * min(depth, 6)}{name}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-seconds", type=float, default=DEFAULT_MAX_SECONDS)
+    parser.add_argument("--max-rss-mb", type=float, default=DEFAULT_MAX_RSS_MB)
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+
+    be_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE, json.dumps(FORBIDDEN_MODULES)],
+        cwd=be_dir,
+        capture_output=True,
+        text=True,
+    )
+    marker = next((l for l in proc.stdout.splitlines() if l.startswith("@@AUDIT@@")), None)
+    if proc.returncode != 0 or marker is None:
+        print(proc.stderr[-4000:])
+        print("[audit] import app.main FAILED")
+        return 1
+
+    result = json.loads(marker[len("@@AUDIT@@"):])
+    _print_report(_parse_importtime(proc.stderr), args.top)
+
+    rss = result["rss_mb"]
+    print(f"\nimport app.main: {result['seconds']:.2f}s (budget {args.max_seconds:.2f}s)")
+    print(f"peak RSS: {'n/a' if rss is None else f'{rss:.0f} MB'} (budget {args.max_rss_mb:.0f} MB)")
+
+    ok = True
+    if result["loaded"]:
+        print(f"FAIL: heavy modules imported by API: {', '.join(result['loaded'])}")
+        ok = False
+    if result["seconds"] > args.max_seconds:
+        print("FAIL: startup time over budget")
+        ok = False
+    if rss is not None and rss > args.max_rss_mb:
+        print("FAIL: RSS over budget")
+        ok = False
+    if ok:
+        print("OK")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
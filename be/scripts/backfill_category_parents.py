@@ -0,0 +1,57 @@
+"""Nối Parent_ID cho danh mục cũ mà danh mục cha chưa tồn tại (tạo cha còn thiếu).
+
+Migration Categories.Parent_ID backfill (app/migrations.py) đã nối các dòng có cha
+sẵn; script này xử lý phần còn lại. Chạy lại nhiều lần an toàn.
+
+Chạy từ be/:
+    python -m scripts.backfill_category_parents
+"""
+from __future__ import annotations
+
+import sys
+
+from app.crud import categories as cat_crud
+from app.database import SessionLocal
+from app.models.categories import Categories
+from app.services import category_index
+
+BATCH = 200
+
+
+def main() -> int:
+    db = SessionLocal()
+    linked = 0
+    try:
+        after_id = 0
+        while True:
+            rows = (
+                db.query(Categories)
+                .filter(
+                    Categories.Category_ID > after_id,
+                    Categories.Parent_ID.is_(None),
+                    Categories.Level_Count > 1,
+                )
+                .order_by(Categories.Category_ID)
+                .limit(BATCH)
+                .all()
+            )
+            if not rows:
+                break
+            for category in rows:
+                names = cat_crud.parent_names({
+                    f"Category_Lv{n}": getattr(category, f"Category_Lv{n}") for n in range(1, 6)
+                })
+                category.Parent_ID = cat_crud.get_or_create_parent(db, source=category.Source, names=names)
+                linked += category.Parent_ID is not None
+            after_id = rows[-1].Category_ID
+            db.commit()
+            print(f"[Categories] Linked {linked} categories (up to Category_ID={after_id})")
+    finally:
+        db.close()
+    category_index.mark_changed()
+    print(f"[Categories] Done: {linked} categories linked")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""Bộ nhớ + độ trễ lookup của autocomplete index trên dữ liệu tổng hợp (không cần DB).
+
+Chạy từ be/:
+    python -m scripts.bench_autocomplete
+    python -m scripts.bench_autocomplete --entries 1000000
+Exit code 1 nếu p99 lookup vượt MAX_P99_MS hoặc bộ nhớ/entry vượt MAX_BYTES_PER_ENTRY.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+
+from app.services import autocomplete_index as ac
+
+MAX_P99_MS = 1.0
+MAX_BYTES_PER_ENTRY = 160
+N_LOOKUPS = 20_000
+
+WORDS = [
+    "Nồi", "cơm", "điện", "Điện", "thoại", "Sữa", "rửa", "mặt", "Máy", "lọc", "không", "khí",
+    "Tai", "nghe", "bluetooth", "Bình", "giữ", "nhiệt", "inox", "Quạt", "đứng", "Bàn", "chải",
+    "đánh", "răng", "Kem", "chống", "nắng", "Áo", "thun", "nam", "nữ", "Giày", "thể", "thao",
+    "chính", "hãng", "cao", "cấp", "Sunhouse", "Kangaroo", "Vinamilk", "Xiaomi", "Samsung",
+    "500ml", "1.8L", "2024", "Pro", "Max", "Mini",
+]
+
+
+def _synthetic(n: int, seed: int = 7):
+    rnd = random.Random(seed)
+    entries = []
+    for pid in range(1, n + 1):
+        name = " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(4, 12))) + f" {pid}"
+        weight = ac._product_weight(int(rnd.paretovariate(1.2)))
+        entries.append((ac.normalize(name), name, ac.KIND_PRODUCT, weight, pid))
+    return entries
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=200_000)
+    args = parser.parse_args()
+
+    entries = _synthetic(args.entries)
+    tracemalloc.start()
+    start = time.perf_counter()
+    frozen = ac.build_from_entries(entries)
+    build_s = time.perf_counter() - start
+    del entries
+    mem, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    per_entry = mem / max(frozen.size, 1)
+
+    rnd = random.Random(11)
+    prefixes = []
+    for _ in range(N_LOOKUPS):
+        key = frozen.key_at(rnd.randrange(frozen.size))
+        prefixes.append(key[:rnd.randint(1, min(len(key), 12))])
+    timings = []
+    for p in prefixes:
+        t0 = time.perf_counter()
+        for i in frozen.lookup(p):
+            frozen.display_at(i)
+        timings.append((time.perf_counter() - t0) * 1000)
+    timings.sort()
+    p50, p99 = timings[len(timings) // 2], timings[int(len(timings) * 0.99)]
+
+    print(f"entries={frozen.size} build={build_s:.2f}s heavy_prefixes={len(frozen.top)}")
+    print(f"memory={mem / 1e6:.1f}MB ({per_entry:.0f} B/entry)")
+    print(f"lookup p50={p50:.3f}ms p99={p99:.3f}ms")
+
+    ok = p99 <= MAX_P99_MS and per_entry <= MAX_BYTES_PER_ENTRY
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""So sánh codec/nén của app.cache trên payload giống dữ liệu thật (không cần Redis/DB).
+
+Chạy từ be/:
+    python -m scripts.bench_cache_codec
+    python -m scripts.bench_cache_codec --iterations 2000
+Baseline "json-legacy" là cách ghi cũ (json.dumps(default=str)). Tổ hợp nào thiếu
+thư viện (msgpack, zstandard, lz4) được bỏ qua.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Tuple
+
+from app import cache
+
+WORDS = [
+    "Nồi", "cơm", "điện", "thoại", "Sữa", "rửa", "mặt", "Máy", "lọc", "không", "khí", "Tai",
+    "nghe", "bluetooth", "Bình", "giữ", "nhiệt", "inox", "Quạt", "đứng", "Kem", "chống", "nắng",
+    "chính", "hãng", "cao", "cấp", "Sunhouse", "Kangaroo", "Vinamilk", "Xiaomi", "500ml", "1.8L",
+]
+BRANDS = ["Sunhouse", "Kangaroo", "Vinamilk", "Xiaomi", "Samsung", "Lock&Lock", "Philips", "OEM"]
+
+
+def _name(rnd: random.Random, n: int) -> str:
+    return " ".join(rnd.choice(WORDS) for _ in range(n))
+
+
+def _product(rnd: random.Random, pid: int) -> Dict[str, Any]:
+    # Giống routes.products._serialize_product
+    return {
+        "Product_ID": pid,
+        "Product_Name": _name(rnd, rnd.randint(6, 14)),
+        "Brand": rnd.choice(BRANDS),
+        "Image_URL": f"https://salt.tikicdn.com/cache/280x280/ts/product/{pid:08x}.jpg",
+        "Product_URL": f"https://tiki.vn/p{pid}.html",
+        "Price": float(rnd.randint(50, 20_000) * 1000),
+        "Avg_Rating": round(rnd.uniform(3, 5), 1),
+        "Review_Count": rnd.randint(0, 5000),
+        "Positive_Percent": round(rnd.uniform(40, 100), 2),
+        "Sentiment_Score": round(rnd.uniform(0, 1), 4),
+        "Sentiment_Label": rnd.choice(["positive", "neutral", "negative"]),
+        "Origin": rnd.choice(["Việt Nam", "Trung Quốc", "Hàn Quốc"]),
+        "Brand_country": rnd.choice(["Việt Nam", "Hàn Quốc", "Nhật Bản"]),
+        "Source": "Tiki",
+    }
+
+
+def _search_page(rnd: random.Random) -> Dict[str, Any]:
+    results = [_product(rnd, rnd.randint(1, 10**7)) for _ in range(50)]
+    return {
+        "input_type": "local_product_search",
+        "query": "nồi cơm điện",
+        "refined_query": "nồi cơm điện",
+        "mode": "keyword",
+        "total": 1234,
+        "skip": 0,
+        "limit": 50,
+        "count": len(results),
+        "next_cursor": "eyJzIjoicmVsZXZhbmNlIiwiayI6MC45LCJpZCI6MTIzfQ",
+        "results": results,
+    }
+
+
+def _product_detail(rnd: random.Random) -> Dict[str, Any]:
+    data = _product(rnd, 4242)
+    data.update({
+        "Category_ID": 17,
+        "Price": Decimal("459000.00"),  # get_product_detail trả thẳng cột DECIMAL
+        "Description": " ".join(_name(rnd, 20) for _ in range(40)),
+        "Is_Authentic": True,
+        "Is_Active": True,
+        "Image_Full_URL": "https://salt.tikicdn.com/ts/product/full.jpg",
+    })
+    return data
+
+
+def _category_tree(rnd: random.Random) -> List[Dict[str, Any]]:
+    def level(depth: int, width: int) -> List[Dict[str, Any]]:
+        if depth == 0:
+            return []
+        return [
+            {"name": _name(rnd, rnd.randint(2, 4)), "children": level(depth - 1, max(width // 2, 2))}
+            for _ in range(rnd.randint(2, width))
+        ]
+
+    return level(5, 16)
+
+
+def _facets(rnd: random.Random) -> Dict[str, Any]:
+    return {
+        "total": 1234,
+        "brands": [{"value": b, "count": rnd.randint(1, 500)} for b in BRANDS * 4],
+        "price": [{"min": i * 100_000, "max": (i + 1) * 100_000, "count": rnd.randint(0, 300)} for i in range(8)],
+        "rating": [{"min": t, "count": rnd.randint(0, 900)} for t in (3, 3.5, 4, 4.5)],
+        "positive": [{"min": t, "count": rnd.randint(0, 900)} for t in (50, 70, 90)],
+        "vn_origin": 321,
+        "vn_brand": 210,
+    }
+
+
+def _envelope(value: Any) -> Dict[str, Any]:
+    # Dạng cache._write ghi khi có tag + stale-while-revalidate
+    return {"__tags__": {"catalog": 12}, "value": value, "__fresh__": time.time() + 3600}
+
+
+def _payloads() -> Dict[str, Any]:
+    rnd = random.Random(7)
+    return {
+        "search_page_50": _envelope(_search_page(rnd)),
+        "product_detail": _envelope(_product_detail(rnd)),
+        "category_tree": _envelope(_category_tree(rnd)),
+        "facets": _envelope(_facets(rnd)),
+        "risk": _envelope({"risk_score": 0.12, "reasons": ["ok"], "checked_at": datetime.utcnow() - timedelta(hours=1)}),
+    }
+
+
+def _combos() -> List[Tuple[str, Callable[[Any], bytes], Callable[[bytes], Any]]]:
+    combos = [(
+        "json-legacy",
+        lambda v: json.dumps(v, default=str).encode("utf-8"),
+        json.loads,
+    )]
+    for codec_name in ("orjson", "msgpack"):
+        for compression_name in ("none", "zstd", "lz4"):
+            codec, compressor = cache._resolve_writer(codec_name, compression_name)
+            if codec_name == "msgpack" and codec.id != cache._CODEC_MSGPACK:
+                continue
+            if compression_name != "none" and compressor is None:
+                continue
+
+            def dumps(v: Any, codec=codec, compressor=compressor) -> bytes:
+                body = codec.dumps(v)
+                return compressor.compress(body) if compressor else body
+
+            def loads(raw: bytes, codec=codec, compressor=compressor) -> Any:
+                return codec.loads(compressor.decompress(raw) if compressor else raw)
+
+            combos.append((f"{codec_name}+{compression_name}", dumps, loads))
+    return combos
+
+
+def _time_us(fn: Callable[[], Any], iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    payloads = _payloads()
+    combos = _combos()
+    print(f"{'payload':<16} {'codec':<16} {'bytes':>9} {'encode µs':>11} {'decode µs':>11}")
+    for payload_name, value in payloads.items():
+        for combo_name, dumps, loads in combos:
+            raw = dumps(value)
+            enc = _time_us(lambda: dumps(value), args.iterations)
+            dec = _time_us(lambda: loads(raw), args.iterations)
+            print(f"{payload_name:<16} {combo_name:<16} {len(raw):>9} {enc:>11.1f} {dec:>11.1f}")
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
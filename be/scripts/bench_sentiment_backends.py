@@ -0,0 +1,90 @@
+"""Parity + throughput: backend torch vs onnx int8 trên một tập review cố định.
+
+Chạy từ be/ (sau export_sentiment_onnx):
+    python -m scripts.bench_sentiment_backends
+Exit code 1 nếu score lệch quá MAX_SCORE_DIFF hoặc tỷ lệ khớp label < MIN_LABEL_AGREEMENT.
+"""
+from __future__ import annotations
+
+import sys
+import time
+
+import numpy as np
+
+from app.services import sentiment_model as ss
+
+MAX_SCORE_DIFF = 0.1
+MIN_LABEL_AGREEMENT = 0.95
+THROUGHPUT_REPEAT = 8
+
+CORPUS = [
+    "Sản phẩm rất tốt, đóng gói cẩn thận, giao hàng nhanh",
+    "Hàng đúng mô tả, dùng ổn trong tầm giá",
+    "Tuyệt vời, sẽ ủng hộ shop lần sau",
+    "Chất lượng kém, dùng 2 ngày đã hỏng",
+    "Hàng nhái, không giống hình, rất thất vọng",
+    "Giao hàng chậm nhưng sản phẩm ổn",
+    "Bình thường, không có gì đặc biệt",
+    "Máy chạy êm, pin trâu, rất hài lòng",
+    "Shop lừa đảo, gửi sai hàng không chịu đổi",
+    "Đẹp, chắc chắn, đáng tiền",
+    "Màu hơi khác ảnh một chút nhưng chấp nhận được",
+    "Bị lỗi ngay khi mở hộp, không dùng được",
+    "Nồi nấu cơm ngon, dễ vệ sinh",
+    "Tai nghe âm thanh rè, bass yếu",
+    "Đóng gói sơ sài, hộp bị móp",
+    "Sách in đẹp, giấy tốt, giao nhanh",
+    "Kem dưỡng thơm, thấm nhanh, da mềm hơn",
+    "Không đáng tiền, chất vải mỏng",
+    "Tạm được, giá hơi cao so với chất lượng",
+    "Quá tuyệt, mua lần thứ ba rồi vẫn ưng",
+    "Sản phẩm chính hãng, bảo hành đầy đủ",
+    "Giao thiếu phụ kiện, liên hệ shop không trả lời",
+    "Ổn",
+    "Tệ",
+    "Dùng được một tuần thì pin chai, rất thất vọng về chất lượng sản phẩm này",
+    "Mình đã dùng nhiều loại nhưng loại này là ưng ý nhất, mùi thơm nhẹ, không gây kích ứng",
+]
+
+
+def _run(backend: str):
+    ss.use_backend(backend)
+    model = ss._load_model()
+    if model is None or ss._BACKEND != backend:
+        raise SystemExit(f"backend {backend} không load được")
+    ss._ensure_anchor_embeddings()
+
+    scores = ss.score_comments_local(CORPUS)
+
+    # Throughput đo trực tiếp trên encoder (bỏ qua embedding cache)
+    texts = CORPUS * THROUGHPUT_REPEAT
+    start = time.perf_counter()
+    model.encode(texts, normalize_embeddings=True)
+    elapsed = time.perf_counter() - start
+    return np.array(scores), len(texts) / elapsed
+
+
+def main() -> int:
+    torch_scores, torch_tps = _run("torch")
+    onnx_scores, onnx_tps = _run("onnx")
+
+    diff = np.abs(torch_scores - onnx_scores)
+    labels_torch = [ss.label_sentiment(float(s)) for s in torch_scores]
+    labels_onnx = [ss.label_sentiment(float(s)) for s in onnx_scores]
+    agreement = float(np.mean([a == b for a, b in zip(labels_torch, labels_onnx)]))
+
+    print(f"score diff: max={diff.max():.4f} mean={diff.mean():.4f}")
+    print(f"label agreement: {agreement:.2%}")
+    for text, a, b in zip(CORPUS, labels_torch, labels_onnx):
+        if a != b:
+            print(f"  label mismatch: torch={a} onnx={b} :: {text}")
+    print(f"throughput torch: {torch_tps:.1f} texts/s")
+    print(f"throughput onnx : {onnx_tps:.1f} texts/s ({onnx_tps / torch_tps:.2f}x)")
+
+    ok = diff.max() <= MAX_SCORE_DIFF and agreement >= MIN_LABEL_AGREEMENT
+    print("PARITY OK" if ok else "PARITY FAILED")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
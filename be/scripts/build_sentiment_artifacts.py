@@ -0,0 +1,30 @@
+"""Build artifact anchor embeddings (.npy) cho backend sentiment hiện tại.
+
+Chạy từ be/ (Dockerfile worker chạy sẵn sau khi tải model; không cần .env):
+    python -m scripts.build_sentiment_artifacts
+Process mới sẽ memory-map các file này thay vì encode lại anchors.
+"""
+from __future__ import annotations
+
+import sys
+
+from app.services import sentiment_artifacts
+from app.services import sentiment_model as ss
+
+
+def main() -> int:
+    key = ss._anchor_artifact_key()
+    if sentiment_artifacts.load(ss._CACHE_FOLDER, key) is not None:
+        print(f"[Artifacts] Up to date: {sentiment_artifacts.artifact_dir(ss._CACHE_FOLDER, key)}")
+        return 0
+
+    pos, neg = ss._ensure_anchor_embeddings()
+    if pos is None or neg is None:
+        print("[Artifacts] Model unavailable, nothing written")
+        return 1
+    print(f"[Artifacts] Wrote {sentiment_artifacts.artifact_dir(ss._CACHE_FOLDER, ss._anchor_artifact_key())}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
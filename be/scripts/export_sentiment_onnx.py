@@ -0,0 +1,81 @@
+"""Export model sentiment (revision đã pin) sang ONNX + dynamic int8 quantization.
+
+Chạy từ be/:
+    python -m scripts.export_sentiment_onnx
+Sau đó bật backend bằng SENTIMENT_BACKEND=onnx.
+"""
+from __future__ import annotations
+
+import json
+import os
+
+import torch
+
+from app.services import sentiment_model as ss
+from app.services.onnx_encoder import FP32_FILE, INT8_FILE, POOLING_FILE, artifact_dir
+
+
+class _HiddenStates(torch.nn.Module):
+    """Bọc auto_model để ONNX chỉ có 1 output: last_hidden_state."""
+
+    def __init__(self, auto_model):
+        super().__init__()
+        self.auto_model = auto_model
+
+    def forward(self, input_ids, attention_mask):
+        return self.auto_model(input_ids=input_ids, attention_mask=attention_mask)[0]
+
+
+def main() -> None:
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    out_dir = artifact_dir(ss._CACHE_FOLDER, ss._MODEL_NAME, ss._MODEL_REVISION)
+    os.makedirs(out_dir, exist_ok=True)
+
+    st = SentenceTransformer(
+        ss._MODEL_NAME,
+        revision=ss._MODEL_REVISION,
+        trust_remote_code=True,
+        device="cpu",
+        cache_folder=ss._CACHE_FOLDER,
+    )
+    transformer, pooling = st[0], st[1]
+    transformer.tokenizer.save_pretrained(out_dir)
+    with open(os.path.join(out_dir, POOLING_FILE), "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "pooling_mode": pooling.get_pooling_mode_str(),
+                "max_seq_length": st.max_seq_length,
+                "model_name": ss._MODEL_NAME,
+                "revision": ss._MODEL_REVISION,
+            },
+            f,
+        )
+
+    sample = transformer.tokenizer(["xin chào"], return_tensors="pt")
+    module = _HiddenStates(transformer.auto_model).eval()
+    fp32_path = os.path.join(out_dir, FP32_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            module,
+            (sample["input_ids"], sample["attention_mask"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "seq"},
+                "attention_mask": {0: "batch", 1: "seq"},
+                "last_hidden_state": {0: "batch", 1: "seq"},
+            },
+            opset_version=17,
+        )
+    print(f"[ONNX] fp32 -> {fp32_path}")
+
+    int8_path = os.path.join(out_dir, INT8_FILE)
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    print(f"[ONNX] int8 -> {int8_path}")
+
+
+if __name__ == "__main__":
+    main()
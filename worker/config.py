@@ -7,5 +7,15 @@ class Settings(BaseSettings):
     redis_url: str = "redis://redis:6379/0"
     queues: list[str] = ["crawl", "auto_update"]
 
+    # "fork": rq.Worker, fork 1 child / job (model preload ở process cha)
+    # "simple": SimpleWorker, chạy job ngay trong process (không fork)
+    worker_mode: str = "fork"
+    # Load model sentiment trước khi nhận job (bỏ qua khi dùng inference service)
+    preload_sentiment_model: bool = True
+
+    # Sentiment inference service: gom batch theo kích thước hoặc cửa sổ thời gian
+    sentiment_batch_size: int = 256
+    sentiment_batch_window_ms: int = 50
+
 
 settings = Settings()
@@ -0,0 +1,139 @@
+import base64
+import json
+import time
+
+import numpy as np
+
+from worker.config import settings
+from app.rq_conn import redis_conn
+from app.services import sentiment_model
+from app.services.sentiment_client import REQUEST_QUEUE, REPLY_PREFIX, REPLY_TTL_SECONDS
+
+
+def _collect_batch() -> list[dict]:
+    """Chờ request đầu tiên rồi gom thêm cho tới khi đủ batch hoặc hết cửa sổ."""
+    first = redis_conn.brpop(REQUEST_QUEUE, timeout=5)
+    if first is None:
+        return []
+
+    batch = [json.loads(first[1])]
+    n_texts = len(batch[0].get("texts") or [])
+    deadline = time.monotonic() + settings.sentiment_batch_window_ms / 1000.0
+
+    while n_texts < settings.sentiment_batch_size:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        item = redis_conn.brpop(REQUEST_QUEUE, timeout=remaining)
+        if item is None:
+            break
+        req = json.loads(item[1])
+        batch.append(req)
+        n_texts += len(req.get("texts") or [])
+    return batch
+
+
+def _reply(batch: list[dict], scores: list[float] | None) -> None:
+    """scores=None → mọi request nhận {"scores": null} (client trả None, tự fallback)."""
+    pipe = redis_conn.pipeline(transaction=False)
+    offset = 0
+    for req in batch:
+        n = len(req.get("texts") or [])
+        key = REPLY_PREFIX + req["id"]
+        part = None if scores is None else scores[offset:offset + n]
+        pipe.lpush(key, json.dumps({"scores": part}))
+        pipe.expire(key, REPLY_TTL_SECONDS)
+        offset += n
+    pipe.execute()
+
+
+def _reply_vectors(batch: list[dict], vectors: np.ndarray | None) -> None:
+    """vectors=None → mọi request nhận {"vectors": null} (client trả None ngay, không chờ timeout).
+
+    Reply mang model_key của service: caller (API, embedding job) lưu/tra vector theo
+    key này thay vì đoán từ env của chính nó.
+    """
+    model_key = sentiment_model.embedding_model_key()
+    pipe = redis_conn.pipeline(transaction=False)
+    offset = 0
+    for req in batch:
+        n = len(req.get("texts") or [])
+        key = REPLY_PREFIX + req["id"]
+        if vectors is None:
+            payload = {"vectors": None}
+        else:
+            chunk = vectors[offset:offset + n].astype(np.float16)
+            payload = {
+                "vectors": base64.b64encode(chunk.tobytes()).decode("ascii"),
+                "dim": int(vectors.shape[1]),
+                "model_key": model_key,
+            }
+        pipe.lpush(key, json.dumps(payload))
+        pipe.expire(key, REPLY_TTL_SECONDS)
+        offset += n
+    pipe.execute()
+
+
+def _handle_scores(batch: list[dict]) -> None:
+    texts = [t for req in batch for t in (req.get("texts") or [])]
+    start = time.perf_counter()
+    try:
+        scores = sentiment_model.score_comments_local(texts, allow_heuristic=False) if texts else []
+    except Exception as exc:
+        # Không reply → client timeout và tự fallback local
+        print(f"[SENTIMENT] Batch failed: {exc}")
+        return
+    if scores is None:
+        # Model lỗi: reply rỗng để client fallback ngay, không trả điểm heuristic
+        print("[SENTIMENT] Batch failed: model unavailable")
+        _reply(batch, None)
+        return
+    _reply(batch, scores)
+    elapsed = time.perf_counter() - start
+    print(f"[SENTIMENT] {len(batch)} requests / {len(texts)} texts in {elapsed:.3f}s")
+
+
+def _handle_embeds(batch: list[dict], use_cache: bool) -> None:
+    texts = [t for req in batch for t in (req.get("texts") or [])]
+    start = time.perf_counter()
+    try:
+        vectors = sentiment_model.encode_texts_local(texts, use_cache=use_cache)
+    except Exception as exc:
+        print(f"[SENTIMENT] Embed batch failed: {exc}")
+        _reply_vectors(batch, None)
+        return
+    if vectors is None:
+        print("[SENTIMENT] Embed batch failed: model unavailable")
+        _reply_vectors(batch, None)
+        return
+    _reply_vectors(batch, vectors)
+    elapsed = time.perf_counter() - start
+    print(f"[SENTIMENT] {len(batch)} embed requests / {len(texts)} texts in {elapsed:.3f}s")
+
+
+def main():
+    print("[SENTIMENT] Connected to:", redis_conn)
+    print(
+        f"[SENTIMENT] batch_size={settings.sentiment_batch_size} "
+        f"window_ms={settings.sentiment_batch_window_ms}"
+    )
+    # Load model + anchors một lần, giữ thường trú cho mọi request
+    sentiment_model.score_comments_local(["khởi động"])
+    print("[SENTIMENT] Model ready")
+
+    while True:
+        batch = _collect_batch()
+        if not batch:
+            continue
+        score_batch = [req for req in batch if req.get("op", "score") == "score"]
+        embed_batch = [req for req in batch if req.get("op") == "embed"]
+        if score_batch:
+            _handle_scores(score_batch)
+        for use_cache in (True, False):
+            group = [req for req in embed_batch if bool(req.get("cache", True)) is use_cache]
+            if group:
+                _handle_embeds(group, use_cache)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,72 @@
+import gc
 import os
+import time
 
-if os.name == "nt":  
-    # Windows → dùng SimpleWorker
-    from rq import SimpleWorker as Worker
-else:
-    # Linux / Docker → dùng Worker bình thường (có fork)
-    from rq import Worker
+from rq import SimpleWorker, Worker
 
 from worker.config import settings
 from app.rq_conn import redis_conn
 
 
+def _use_simple_worker() -> bool:
+    # Windows không có fork → luôn SimpleWorker
+    return os.name == "nt" or settings.worker_mode.lower() == "simple"
+
+
+def _preload_sentiment(forking: bool) -> None:
+    """Load model + anchors ở process cha để mọi job fork ra dùng lại (copy-on-write)."""
+    from app.services import sentiment_client, sentiment_model
+
+    if not settings.preload_sentiment_model or sentiment_client.is_enabled():
+        print("[WORKER] Sentiment preload skipped")
+        return
+    if forking and sentiment_model._BACKEND == "onnx":
+        # Thread pool của onnxruntime không an toàn qua fork → dùng WORKER_MODE=simple
+        print("[WORKER] Sentiment preload skipped (onnx backend needs WORKER_MODE=simple)")
+        return
+
+    import torch
+
+    num_threads = torch.get_num_threads()
+    if forking:
+        # Chạy warm-up 1 luồng để process cha không tạo OpenMP pool
+        # (pool đã tạo trước fork có thể treo trong child), child tự khôi phục.
+        torch.set_num_threads(1)
+        os.register_at_fork(after_in_child=lambda: torch.set_num_threads(num_threads))
+
+    start = time.perf_counter()
+    ok = sentiment_model.preload()
+    print(f"[WORKER] Sentiment preload {'OK' if ok else 'FAILED'} in {time.perf_counter() - start:.1f}s")
+
+    # Đưa object đã load vào permanent generation: GC trong child không chạm
+    # tới chúng nên các trang bộ nhớ vẫn được chia sẻ.
+    gc.freeze()
+
+
+def _import_job_stack() -> None:
+    """API process import app.tasks.* không kéo crawler/ML stack (lazy trong job body).
+
+    Worker thì cần chúng cho mọi job: import sẵn ở parent để child fork ra không
+    phải import lại từng job.
+    """
+    start = time.perf_counter()
+    from app.services import auto_update_service, crawler_tiki_service  # noqa: F401
+
+    print(f"[WORKER] Job modules imported in {time.perf_counter() - start:.1f}s")
+
+
 def main():
+    simple = _use_simple_worker()
+    worker_cls = SimpleWorker if simple else Worker
+
     print("[WORKER] Connected to:", redis_conn)
     print("[WORKER] Queues:", settings.queues)
-    print(f"[WORKER] OS: {os.name} (using {'SimpleWorker' if os.name=='nt' else 'Worker'})")
+    print(f"[WORKER] OS: {os.name} (using {worker_cls.__name__})")
+
+    _import_job_stack()
+    _preload_sentiment(forking=not simple)
 
-    worker = Worker(settings.queues, connection=redis_conn)
+    worker = worker_cls(settings.queues, connection=redis_conn)
     worker.work()
 
 